@@ -0,0 +1,69 @@
+"""Import-time benchmark: keeps `import palettegenv2` and `import extract_mf_twister_colors` cheap.
+
+Each module is imported in a fresh interpreter (run from an empty temporary directory) several times.
+The best wall time is reported, and the run fails if it exceeds the budget, if numpy or PIL were really
+executed, or if the import wrote any files.
+
+    python benchmarks/bench_import.py [--repeat 7] [--max-ms 60]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["palettegenv2", "extract_mf_twister_colors"]
+# Submodules that only show up in sys.modules once the heavy package has actually been executed
+HEAVY_MARKERS = ["numpy._core", "PIL.Image"]
+
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {repo_dir!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {markers!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module, repeat):
+    """Import `module` in `repeat` fresh interpreters; returns (best seconds, heavy modules loaded, files written)."""
+    best = float("inf")
+    loaded = set()
+    written = set()
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as work_dir:
+            probe = _PROBE.format(repo_dir=REPO_DIR, module=module, markers=HEAVY_MARKERS)
+            output = subprocess.run([sys.executable, "-c", probe], cwd=work_dir, capture_output=True, text=True, check=True)
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            best = min(best, result["seconds"])
+            loaded.update(result["loaded"])
+            written.update(os.listdir(work_dir))
+    return best, sorted(loaded), sorted(written)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time of the palette generator modules.")
+    parser.add_argument("--repeat", type=int, default=7, help="Fresh interpreters per module (default: 7).")
+    parser.add_argument("--max-ms", type=float, default=60.0, help="Fail if any import takes longer (default: 60ms).")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in MODULES:
+        seconds, loaded, written = measure_import(module, args.repeat)
+        problems = []
+        if seconds * 1000 > args.max_ms:
+            problems.append(f"over {args.max_ms:g}ms budget")
+        if loaded:
+            problems.append(f"loaded {', '.join(loaded)}")
+        if written:
+            problems.append(f"wrote {', '.join(written)}")
+        failed = failed or bool(problems)
+        print(f"{module:<28} {seconds * 1000:7.2f} ms  {'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""Benchmark suite for palette generation, image output, filename allocation and color selection.
+
+    python benchmarks/bench_palettes.py --output benchmarks/baseline.json
+    python benchmarks/bench_palettes.py --compare benchmarks/baseline.json
+
+Every strategy in strategy_registry is timed for several grid sizes, one palette at a time
+and as a batch, reporting palettes/sec, microseconds per cell and peak allocated bytes per palette.
+Batch generation on square grids up to 64x64 checks that cost grows linearly with the cell count.
+Palette extraction from a 24-megapixel JPEG (from_image) is timed per grid size. Quality scoring (and the cost of oversampling), hsv_to_hex, create_palette_image (encode + save),
+save_palette_png, generate_unique_filename and select_distinct_colors (at several candidate-set sizes)
+are timed too. Results are written as JSON so
+two runs (e.g. two commits) can be compared; --compare flags anything slower than --threshold.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np  # noqa: E402
+
+import extract_mf_twister_colors  # noqa: E402
+import image_palette  # noqa: E402
+import palette_engine  # noqa: E402
+import palette_quality  # noqa: E402
+import palette_stream  # noqa: E402
+import palettegenv2  # noqa: E402
+import strategy_registry  # noqa: E402
+
+GRID_SIZES = [(9, 3), (16, 4), (32, 8), (64, 16)] # (cols, rows)
+SCALING_GRID_SIZES = [(8, 8), (16, 16), (32, 32), (64, 64)] # Square sheets for the linear-scaling check
+SCALING_BATCH_SIZE = 16
+MAX_SCALING_SLOPE = 1.15 # Log-log slope of time vs cells above this is reported as superlinear
+BATCH_SIZE = 256
+CANDIDATE_SIZES = [128, 4096, 65536, 1 << 20]
+DISTANCE_SPACES = ["rgb", "oklab"]
+PHOTO_SIZE = (6000, 4000) # 24 megapixels
+
+
+def time_call(function, min_time=0.2, rounds=3):
+    """Best per-call time over `rounds` rounds, each repeating `function` for at least `min_time` seconds."""
+    best = float("inf")
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            function()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / calls)
+    return best
+
+
+def peak_allocation(function):
+    """Peak bytes traced by tracemalloc during one call."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def quiet_in_temp_dir():
+    """Run in a throwaway CWD with stdout swallowed (counter database, saved PNGs, console dumps)."""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir, contextlib.redirect_stdout(io.StringIO()):
+        os.chdir(work_dir)
+        try:
+            yield work_dir
+        finally:
+            os.chdir(previous)
+
+
+def strategy_supported(strategy, grid_cols, grid_rows):
+    if strategy == "from_image": # Needs a reference image; timed by bench_image_extraction
+        return False
+    return strategy != "mf_twister" or palettegenv2.mf_twister_colors_loaded(grid_rows, grid_cols)
+
+
+def bench_strategies(min_time):
+    results = {}
+    for strategy in strategy_registry.names():
+        function = palettegenv2.get_strategy_function(strategy)
+        for grid_cols, grid_rows in GRID_SIZES:
+            if not strategy_supported(strategy, grid_cols, grid_rows):
+                continue
+            cells = grid_cols * grid_rows
+            hue_shifts = [0.0] * grid_rows
+            rng = random.Random(1)
+            row_shifts = palette_engine.draw_row_shifts(rng, grid_rows)
+            single = lambda: function(grid_rows, grid_cols, row_shifts, hue_shifts, rng)
+            seeds = list(range(BATCH_SIZE))
+            batch = lambda: palettegenv2.generate_palette_batch(grid_rows, grid_cols, strategy, hue_shifts, seeds)
+
+            single_seconds = time_call(single, min_time)
+            batch_seconds = time_call(batch, min_time) / BATCH_SIZE
+            results[f"strategy/{strategy}/{grid_cols}x{grid_rows}"] = {
+                "palettes_per_sec": 1 / single_seconds,
+                "us_per_cell": single_seconds * 1e6 / cells,
+                "peak_alloc_bytes": peak_allocation(single),
+                "batch_palettes_per_sec": 1 / batch_seconds,
+                "batch_us_per_cell": batch_seconds * 1e6 / cells,
+                "batch_peak_alloc_bytes_per_palette": peak_allocation(batch) / BATCH_SIZE,
+            }
+    return results
+
+
+def bench_scaling(min_time):
+    """Batch generation time per cell on square grids, plus the log-log slope of time vs cell count (1.0 is linear)."""
+    results = {}
+    for strategy in strategy_registry.names():
+        cells, seconds = [], []
+        for grid_cols, grid_rows in SCALING_GRID_SIZES:
+            if not strategy_supported(strategy, grid_cols, grid_rows):
+                continue
+            hue_shifts = [0.0] * grid_rows
+            seeds = list(range(SCALING_BATCH_SIZE))
+            batch = lambda: palettegenv2.generate_palette_batch(grid_rows, grid_cols, strategy, hue_shifts, seeds)
+            cells.append(grid_cols * grid_rows)
+            seconds.append(time_call(batch, min_time) / SCALING_BATCH_SIZE)
+            results[f"scaling/{strategy}/{grid_cols}x{grid_rows}"] = {"batch_us_per_cell": seconds[-1] * 1e6 / cells[-1]}
+        if len(cells) > 1:
+            slope = np.polyfit(np.log(cells), np.log(seconds), 1)[0]
+            results[f"scaling/{strategy}"] = {"time_vs_cells_slope": slope}
+    return results
+
+
+def report_scaling(results):
+    """Print every strategy whose time grows faster than linearly in cells; returns how many did."""
+    superlinear = 0
+    for name, metrics in results.items():
+        slope = metrics.get("time_vs_cells_slope")
+        if slope is not None and slope > MAX_SCALING_SLOPE:
+            superlinear += 1
+            print(f"{name:<52} time grows as cells^{slope:.2f}  << SUPERLINEAR")
+    return superlinear
+
+
+def bench_quality(min_time):
+    """Scoring throughput, and what --oversample costs end to end in the streaming generator."""
+    results = {}
+    for grid_cols, grid_rows in GRID_SIZES:
+        hue_shifts = [0.0] * grid_rows
+        stack, hsv = palettegenv2.generate_palette_batch(grid_rows, grid_cols, "tetradic", hue_shifts, list(range(BATCH_SIZE)), with_hsv=True)
+        seconds = time_call(lambda: palette_quality.score_palettes(stack, hsv), min_time) / BATCH_SIZE
+        metrics = {"score_palettes_per_sec": 1 / seconds}
+        for oversample in (1, 4):
+            stream = lambda: sum(1 for _ in palette_stream.generate_palettes("tetradic", grid_rows, grid_cols, range(BATCH_SIZE), hue_shifts, oversample=oversample))
+            metrics[f"oversample_{oversample}_palettes_per_sec"] = BATCH_SIZE / time_call(stream, min_time)
+        results[f"quality/tetradic/{grid_cols}x{grid_rows}"] = metrics
+    return results
+
+
+def synthetic_photo(path, size=PHOTO_SIZE):
+    """Write a smooth, noisy photo-like JPEG for the image extraction benchmark."""
+    from PIL import Image
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    pixels = np.stack([128 + 127 * np.sin(x / 700), 128 + 127 * np.cos(y / 500), 128 + 127 * np.sin((x + y) / 900)], axis=-1)
+    pixels += np.random.default_rng(0).normal(0, 12, pixels.shape).astype(np.float32)
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=90)
+
+
+def bench_image_extraction(min_time):
+    """from_image: decoding + downsampling a 24-megapixel JPEG, then k-means per grid size."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "photo.jpg")
+        synthetic_photo(path)
+        load_seconds = time_call(lambda: image_palette.load_pixels(path), min_time, rounds=1)
+        pixels = image_palette.load_pixels(path)
+    results = {"image/load_24mp_jpeg": {"seconds": load_seconds}}
+    for grid_cols, grid_rows in GRID_SIZES:
+        seconds = time_call(lambda: image_palette.extract_palette(pixels, grid_rows, grid_cols), min_time, rounds=1)
+        results[f"image/extract/{grid_cols}x{grid_rows}"] = {"seconds": seconds, "with_load_seconds": seconds + load_seconds}
+    return results
+
+
+def bench_conversions(min_time):
+    values = [(random.random(), random.random(), random.random()) for _ in range(1024)]
+    seconds = time_call(lambda: [palettegenv2.hsv_to_hex(h, s, v) for h, s, v in values], min_time) / len(values)
+    hsv = np.array(values).T
+    array_seconds = time_call(lambda: palette_engine.hsv_to_rgb8(*hsv), min_time) / len(values)
+    return {
+        "hsv_to_hex": {"us_per_call": seconds * 1e6},
+        "palette_engine.hsv_to_rgb8": {"us_per_cell": array_seconds * 1e6},
+    }
+
+
+def bench_output(min_time):
+    results = {}
+    original_choice = palettegenv2.get_save_location_choice
+    palettegenv2.get_save_location_choice = lambda: "script_folder" # No prompt; save into the temp CWD
+    try:
+        for grid_cols, grid_rows in GRID_SIZES:
+            rgb, _, _ = palettegenv2.generate_packed_palette(grid_rows, grid_cols, "tetradic", [0.0] * grid_rows, seed=1)
+            hex_codes = palette_engine.rgb8_to_hex_grid(np.frombuffer(rgb, dtype=np.uint8).reshape(grid_rows, grid_cols, 3))
+            size = f"{grid_cols}x{grid_rows}"
+            with quiet_in_temp_dir() as work_dir:
+                path = os.path.join(work_dir, "bench.png")
+                results[f"create_palette_image/packed/{size}"] = {
+                    "ms_per_call": time_call(lambda: palettegenv2.create_palette_image(rgb, "tetradic", grid_rows, grid_cols), min_time) * 1e3}
+                results[f"create_palette_image/hex/{size}"] = {
+                    "ms_per_call": time_call(lambda: palettegenv2.create_palette_image(hex_codes, "tetradic", grid_rows, grid_cols), min_time) * 1e3}
+                for use_pil in (False, True):
+                    results[f"save_palette_png/{'pil' if use_pil else 'direct'}/{size}"] = {
+                        "ms_per_call": time_call(lambda: palettegenv2.save_palette_png(rgb, grid_rows, grid_cols, path, use_pil), min_time) * 1e3}
+    finally:
+        palettegenv2.get_save_location_choice = original_choice
+
+    with quiet_in_temp_dir():
+        results["generate_unique_filename"] = {"us_per_call": time_call(lambda: palettegenv2.generate_unique_filename("tetradic"), min_time) * 1e6}
+    return results
+
+
+def bench_selection(candidate_sizes):
+    results = {}
+    generator = np.random.default_rng(0)
+    for size in candidate_sizes:
+        candidates = generator.integers(0, 256, (size, 3))
+        for space in DISTANCE_SPACES:
+            with contextlib.redirect_stdout(io.StringIO()):
+                random.seed(0)
+                start = time.perf_counter()
+                extract_mf_twister_colors.select_distinct_colors(candidates, 64, space)
+                seconds = time.perf_counter() - start
+            results[f"select_distinct_colors/{space}/{size}"] = {"ms_per_call": seconds * 1e3}
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print every metric next to the baseline; returns the number of regressions beyond `threshold`."""
+    regressions = 0
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not old:
+                continue
+            # Rates get better as they grow, everything else (time, bytes) as it shrinks
+            ratio = value / old if metric.endswith("per_sec") else old / value
+            flag = ""
+            if ratio < 1 - threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{name:<52} {metric:<36} {old:>14.2f} -> {value:>14.2f}  ({ratio:5.2f}x){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the palette generator.")
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    parser.add_argument("--compare", help="Compare against a previous results JSON file.")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown reported as a regression (default: 0.15).")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds each timing round runs for (default: 0.2).")
+    parser.add_argument("--quick", action="store_true", help="Skip the largest candidate set for select_distinct_colors.")
+    args = parser.parse_args(argv)
+
+    palettegenv2.get_mf_twister_packed() # Load outside the timed regions (silently skipped if missing)
+    results = {}
+    results.update(bench_strategies(args.min_time))
+    results.update(bench_scaling(args.min_time))
+    results.update(bench_quality(args.min_time))
+    results.update(bench_image_extraction(args.min_time))
+    results.update(bench_conversions(args.min_time))
+    results.update(bench_output(args.min_time))
+    results.update(bench_selection(CANDIDATE_SIZES[:-1] if args.quick else CANDIDATE_SIZES))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Comparing against {args.compare} (commit {baseline['meta'].get('commit')}):")
+        regressions = compare(results, baseline["results"], args.threshold)
+        print(f"{regressions} regression(s) beyond {args.threshold:.0%}.")
+    else:
+        for name, metrics in results.items():
+            print(f"{name:<52} " + "  ".join(f"{metric}={value:,.2f}" for metric, value in metrics.items()))
+
+    report_scaling(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
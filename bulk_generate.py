@@ -0,0 +1,273 @@
+"""Headless bulk palette generation.
+
+Example:
+    python bulk_generate.py --count 50000 --strategies tetradic,complementary --grid 16x4 --grid 9x3 --output ./out
+
+The requested palettes are split into chunked work units (one strategy and grid size each) and
+fanned out over a ProcessPoolExecutor. Every palette gets its own seed derived from the master seed and
+its index in the run (stored in the PNG metadata), so a run with the same --seed and options produces
+the same palettes regardless of --workers or --chunk-size.
+Filenames come from the shared counter allocator, so parallel runs never overwrite each other.
+Inside a worker, palettes stream through palette_stream: generation, PNG encoding and disk writes overlap
+(with --in-flight, several writes at once through palette_async_output).
+With PALETTE_PROFILE set (see instrumentation.py) the workers' stage timings are merged into the parent's report.
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import filename_allocator
+import instrumentation
+import palette_archive
+import palette_async_output
+import palette_dedup
+import palette_quality
+import palette_stream
+import palettegenv2
+import strategy_registry
+import twister_lut
+
+
+def parse_grid(text):
+    """Parse a 'COLSxROWS' grid size such as '16x4'."""
+    try:
+        grid_cols, grid_rows = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid grid size '{text}'. Use COLSxROWS, e.g. 16x4.")
+    if not (1 <= grid_cols <= palettegenv2.MAX_GRID_SIZE and 1 <= grid_rows <= palettegenv2.MAX_GRID_SIZE):
+        raise argparse.ArgumentTypeError(f"Invalid grid size '{text}'. Columns and rows must be between 1 and {palettegenv2.MAX_GRID_SIZE}.")
+    return grid_cols, grid_rows
+
+
+def parse_hue_shifts(text):
+    """Parse comma separated per-row hue shifts in degrees, each between 0 and 360."""
+    try:
+        shifts = [int(part) for part in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid hue shifts '{text}'. Use whole degrees separated by commas, e.g. 0,10,20,30.")
+    if not all(0 <= shift <= 360 for shift in shifts):
+        raise argparse.ArgumentTypeError(f"Invalid hue shifts '{text}'. Each shift must be between 0 and 360 degrees.")
+    return shifts
+
+
+def parse_strategies(text):
+    """Parse a comma separated strategy list ('all' selects every generated strategy)."""
+    if text == "all":
+        return palettegenv2.get_random_strategies()
+    strategies = [name.strip() for name in text.split(",") if name.strip()]
+    unknown = [name for name in strategies if strategy_registry.get(name) is None]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown strategies: {', '.join(unknown)}")
+    if "from_image" in strategies:
+        raise argparse.ArgumentTypeError("from_image needs a reference image; use the interactive generator for it.")
+    return strategies
+
+
+def build_work_units(count, strategies, grids, chunk_size, master_seed, extension=".png"):
+    """Spread `count` palettes evenly over every strategy/grid combination and cut them into chunks.
+
+    Palette number i of the run is generated from derive_seed(master_seed, i), so its colors depend only
+    on the master seed and its position, not on chunking or worker scheduling. Each unit reserves its
+    block of filename counters up front, in one locked allocator call.
+    """
+    combos = [(strategy, grid_cols, grid_rows) for strategy in strategies for grid_cols, grid_rows in grids]
+    units = []
+    palette_index = 0
+    for combo_index, (strategy, grid_cols, grid_rows) in enumerate(combos):
+        combo_count = count // len(combos) + (1 if combo_index < count % len(combos) else 0)
+        for start in range(0, combo_count, chunk_size):
+            unit_count = min(chunk_size, combo_count - start)
+            units.append({
+                "strategy": strategy,
+                "grid_cols": grid_cols,
+                "grid_rows": grid_rows,
+                "master_seed": master_seed,
+                "first_index": palette_index,
+                "count": unit_count,
+                "filenames": filename_allocator.allocate_filenames(strategy, unit_count, extension),
+            })
+            palette_index += unit_count
+    return units
+
+
+def unit_hue_shifts(hue_shifts_degrees, grid_rows):
+    """Per-row hue shifts (0-1 range) from the --hue-shifts degrees, padded with zeros to the grid height."""
+    return [shift / 360.0 for shift in (list(hue_shifts_degrees) + [0] * grid_rows)[:grid_rows]]
+
+
+def run_work_unit(unit, output_dir, hue_shifts_degrees, use_pil=False, dedup="exact", oversample=1, in_flight=None, twister_leds=False):
+    """Generate one chunk of palettes and write the ones not saved before as PNGs; returns the number of files written.
+
+    With `in_flight` set, up to that many PNGs are written concurrently through palette_async_output
+    instead of by a single writer thread.
+    """
+    grid_cols, grid_rows = unit["grid_cols"], unit["grid_rows"]
+    hue_shifts = unit_hue_shifts(hue_shifts_degrees, grid_rows)
+    indices = range(unit["first_index"], unit["first_index"] + unit["count"])
+    seeds = palette_stream.iter_seeds(unit["master_seed"], unit["first_index"], unit["count"])
+    # Yields nothing if the strategy cannot produce this grid (e.g. mf_twister without its JSON colors)
+    palettes = palette_stream.generate_palettes(unit["strategy"], grid_rows, grid_cols, seeds, hue_shifts, oversample=oversample, twister_leds=twister_leds)
+    extra_metadata = {"LED Snap": "mf_twister"} if twister_leds else {}
+    entries = zip(palettes, unit["filenames"], indices)
+
+    # Encoding and writing run on the writer thread(s) while the next batch is generated and checked
+    if in_flight:
+        writer = palette_async_output.BackgroundPaletteWriter(in_flight, workers=in_flight, use_pil=use_pil)
+    else:
+        writer = palette_stream.PaletteWriter(use_pil=use_pil)
+    with writer:
+        for batch in palette_stream.batched(entries, palette_stream.DEFAULT_BATCH_SIZE):
+            if dedup == "off":
+                fresh = [True] * len(batch)
+            else:
+                stack = np.frombuffer(b"".join(rgb for (_, rgb), _, _ in batch), dtype=np.uint8).reshape(-1, grid_rows, grid_cols, 3)
+                fresh = palette_dedup.claim_palettes(stack, unit["strategy"], [filename for _, filename, _ in batch], output_dir, near=dedup == "near")
+            for ((seed, rgb), filename, index), is_new in zip(batch, fresh):
+                if not is_new:
+                    continue
+                metadata = palettegenv2.palette_metadata(unit["strategy"], seed, grid_rows, grid_cols, hue_shifts,
+                                                         **{"Master Seed": unit["master_seed"], "Index": index}, **extra_metadata)
+                writer.submit(os.path.join(output_dir, filename), rgb, grid_rows, grid_cols, metadata)
+    return writer.written
+
+
+def run_profiled_work_unit(unit, output_dir, hue_shifts_degrees, use_pil=False, dedup="exact", oversample=1, in_flight=None, twister_leds=False):
+    """run_work_unit that also hands back this worker's stage timings; returns (files written, records)."""
+    with instrumentation.stage("work_unit"):
+        written = run_work_unit(unit, output_dir, hue_shifts_degrees, use_pil, dedup, oversample, in_flight, twister_leds)
+    return written, instrumentation.collect()
+
+
+def generate_unit_stack(unit, hue_shifts_degrees, oversample=1, twister_leds=False):
+    """Generate one chunk of palettes in memory; returns (uint8 stack or None, seeds)."""
+    grid_cols, grid_rows = unit["grid_cols"], unit["grid_rows"]
+    seeds = palette_stream.iter_seeds(unit["master_seed"], unit["first_index"], unit["count"])
+    palettes = list(palette_stream.generate_palettes(unit["strategy"], grid_rows, grid_cols, seeds,
+                                                     unit_hue_shifts(hue_shifts_degrees, grid_rows), oversample=oversample, twister_leds=twister_leds))
+    if not palettes:
+        return None, []
+    stack = np.frombuffer(b"".join(rgb for _, rgb in palettes), dtype=np.uint8).reshape(-1, grid_rows, grid_cols, 3)
+    return stack, [seed for seed, _ in palettes]
+
+
+def run_archive_batch(count, strategies, grid, archive_path, workers=None, chunk_size=500, master_seed=None, hue_shifts_degrees=(), dedup="exact", oversample=1, twister_leds=False):
+    """Generate palettes in parallel and append them to a single archive file; returns (palettes_written, elapsed_seconds).
+
+    Workers only generate; the parent appends each unit's records in run order, so the archive has one writer.
+    """
+    if master_seed is None:
+        master_seed = random.SystemRandom().randrange(2**32)
+    print(f"Master seed: {master_seed}")
+
+    grid_cols, grid_rows = grid
+    writer = palette_archive.ArchiveWriter(archive_path, grid_cols, grid_rows) # Fails before any counters are reserved
+    # Names the archive really holds; dedup claims under any other name were lost with an earlier archive or run
+    archive_names = set(palette_archive.PaletteArchive(archive_path).names()) if dedup != "off" else set()
+    units = build_work_units(count, strategies, [grid], chunk_size, master_seed, extension="")
+    written = 0
+    start_time = time.perf_counter()
+    with writer, ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(generate_unit_stack, unit, list(hue_shifts_degrees), oversample, twister_leds) for unit in units]
+        for unit, future in zip(units, futures):
+            stack, seeds = future.result()
+            if stack is None: # Strategy cannot produce this grid
+                continue
+            names = unit["filenames"]
+            if dedup != "off":
+                fresh = np.array(palette_dedup.claim_palettes(stack, unit["strategy"], names, archive_path, near=dedup == "near", live_names=archive_names))
+                stack, seeds, names = stack[fresh], np.asarray(seeds, dtype=np.uint64)[fresh], [name for name, is_new in zip(names, fresh) if is_new]
+            writer.append_batch(stack, unit["strategy"], seeds, names)
+            archive_names.update(names)
+            written += len(names)
+    return written, time.perf_counter() - start_time
+
+
+def run_batch(count, strategies, grids, output_dir, workers=None, chunk_size=500, master_seed=None, hue_shifts_degrees=(), use_pil=False, dedup="exact", oversample=1, in_flight=None, twister_leds=False):
+    """Generate palettes in parallel and return (palettes_written, elapsed_seconds)."""
+    if master_seed is None:
+        master_seed = random.SystemRandom().randrange(2**32)
+    print(f"Master seed: {master_seed}")
+
+    os.makedirs(output_dir, exist_ok=True) # Ensure folder exists
+    units = build_work_units(count, strategies, grids, chunk_size, master_seed)
+    written = 0
+    start_time = time.perf_counter()
+    task = run_profiled_work_unit if instrumentation.ENABLED else run_work_unit
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(task, unit, output_dir, list(hue_shifts_degrees), use_pil, dedup, oversample, in_flight, twister_leds) for unit in units]
+        for future in as_completed(futures):
+            if instrumentation.ENABLED:
+                unit_written, records = future.result()
+                instrumentation.merge(records)
+                written += unit_written
+            else:
+                written += future.result()
+    return written, time.perf_counter() - start_time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Bitwig color palettes in bulk without prompts.")
+    parser.add_argument("--count", type=int, required=True, help="Total number of palettes to generate.")
+    parser.add_argument("--strategies", type=parse_strategies, default="all",
+                        help="Comma separated strategy names, or 'all' (default).")
+    parser.add_argument("--grid", type=parse_grid, action="append", dest="grids",
+                        help="Grid size as COLSxROWS; repeat for several sizes (default: 16x4).")
+    parser.add_argument("--output", default=os.path.join(palettegenv2.BITWIG_PALETTE_DIR, palettegenv2.GENERATED_PALETTES_SUBFOLDER),
+                        help="Output directory (default: the generated_palettes subfolder of the Bitwig Color Palettes folder).")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Palettes per work unit (default: 500).")
+    parser.add_argument("--seed", type=int, default=None, help="Master seed for reproducible runs (default: random).")
+    parser.add_argument("--hue-shifts", type=parse_hue_shifts, default=[],
+                        help="Comma separated hue shift per row in degrees (0-360), e.g. 0,10,20,30; at most one per grid row.")
+    parser.add_argument("--pil", action="store_true", help="Encode PNGs through PIL instead of the built-in writer.")
+    parser.add_argument("--dedup", choices=palette_dedup.DEDUP_MODES, default="exact",
+                        help="Skip palettes already saved: 'exact' copies (default), also 'near' perceptual duplicates, or 'off'.")
+    parser.add_argument("--oversample", type=int, default=1,
+                        help=f"Generate this many candidates per palette and keep the best-scoring one (1-{palette_quality.MAX_OVERSAMPLE}; default: 1, no scoring).")
+    parser.add_argument("--in-flight", type=int, default=None,
+                        help="Write up to this many PNGs per worker concurrently (helps slow or network disks; default: one writer thread).")
+    parser.add_argument("--twister-leds", action="store_true",
+                        help="Snap every color to the nearest MIDI Fighter Twister LED color (see twister_lut.py).")
+    parser.add_argument("--archive", help="Append the palettes to this single archive file (.bwpal) instead of writing PNGs; takes one --grid.")
+    args = parser.parse_args(argv)
+
+    if args.count < 1 or args.chunk_size < 1 or args.oversample < 1 or (args.in_flight is not None and args.in_flight < 1):
+        parser.error("--count, --chunk-size, --oversample and --in-flight must be positive.")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be positive.")
+    if args.oversample > palette_quality.MAX_OVERSAMPLE:
+        parser.error(f"--oversample can be at most {palette_quality.MAX_OVERSAMPLE}.")
+    strategies = args.strategies if isinstance(args.strategies, list) else parse_strategies(args.strategies)
+    grids = args.grids or [(16, 4)]
+    too_small = [f"{grid_cols}x{grid_rows}" for grid_cols, grid_rows in grids if len(args.hue_shifts) > grid_rows]
+    if too_small:
+        parser.error(f"--hue-shifts gives {len(args.hue_shifts)} shifts, more than the rows of grid {', '.join(too_small)}.")
+    if args.twister_leds:
+        twister_lut.load_lut() # Build the table once here; the workers then only map the file
+
+    if args.archive:
+        if len(grids) != 1:
+            parser.error("--archive holds a single grid size; pass exactly one --grid.")
+        try:
+            written, elapsed = run_archive_batch(args.count, strategies, grids[0], args.archive, args.workers, args.chunk_size, args.seed, args.hue_shifts, args.dedup, args.oversample, args.twister_leds)
+        except palette_archive.ArchiveError as e:
+            parser.error(str(e))
+        destination = args.archive
+    else:
+        written, elapsed = run_batch(args.count, strategies, grids, args.output, args.workers, args.chunk_size, args.seed, args.hue_shifts, args.pil, args.dedup, args.oversample, args.in_flight, args.twister_leds)
+        destination = args.output
+    rate = written / elapsed if elapsed > 0 else float("inf")
+    print(f"Generated {written} palettes into {destination} in {elapsed:.2f}s ({rate:,.0f} palettes/sec).")
+    if args.oversample > 1:
+        print(f"Scored {args.count * args.oversample} candidates, keeping the best of every {args.oversample} "
+              f"({args.count * args.oversample / elapsed:,.0f} candidates/sec).")
+    if written < args.count:
+        print(f"Skipped {args.count - written} palettes (duplicates of saved palettes, or strategies unavailable for a grid size).")
+
+
+if __name__ == "__main__":
+    main()
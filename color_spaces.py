@@ -0,0 +1,129 @@
+"""Color space conversions and distance backends (RGB, OKLab, CIEDE2000) on NumPy arrays.
+
+Colors are converted to the target space once (`convert_colors`) and distances are then computed
+as whole matrices or against one color at a time. All distances are returned squared so callers can
+compare them without taking square roots; CIEDE2000 is returned as dE00 squared.
+"""
+import numpy as np
+
+DISTANCE_SPACES = ("rgb", "oklab", "ciede2000")
+
+# D65 reference white for CIELAB
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+_SRGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+
+# Linear sRGB -> LMS and LMS' -> OKLab (Bjorn Ottosson)
+_SRGB_TO_LMS = np.array([
+    [0.4122214708, 0.5363325363, 0.0514459929],
+    [0.2119034982, 0.6806995451, 0.1073969566],
+    [0.0883024619, 0.2817188376, 0.6299787005],
+])
+_LMS_TO_OKLAB = np.array([
+    [0.2104542553, 0.7936177850, -0.0040720468],
+    [1.9779984951, -2.4285922050, 0.4505937099],
+    [0.0259040371, 0.7827717662, -0.8086757660],
+])
+
+
+def srgb_to_linear(rgb8):
+    """Convert 0-255 sRGB values (..., 3) to linear-light floats in [0, 1]."""
+    srgb = np.asarray(rgb8, dtype=float) / 255.0
+    return np.where(srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+
+
+def rgb_to_oklab(rgb8):
+    """Convert 0-255 sRGB values (..., 3) to OKLab (L in [0, 1])."""
+    lms = srgb_to_linear(rgb8) @ _SRGB_TO_LMS.T
+    return np.cbrt(lms) @ _LMS_TO_OKLAB.T
+
+
+def rgb_to_lab(rgb8):
+    """Convert 0-255 sRGB values (..., 3) to CIELAB (D65, L in [0, 100])."""
+    xyz = (srgb_to_linear(rgb8) @ _SRGB_TO_XYZ.T) / _D65_WHITE
+    epsilon, kappa = 216 / 24389, 24389 / 27
+    f = np.where(xyz > epsilon, np.cbrt(xyz), (kappa * xyz + 16) / 116)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def convert_colors(colors_rgb, space="rgb"):
+    """Convert 0-255 RGB colors to the coordinates used by a distance backend, as a float (..., 3) array."""
+    if space == "rgb":
+        return np.asarray(colors_rgb, dtype=float)
+    if space == "oklab":
+        return rgb_to_oklab(colors_rgb)
+    if space == "ciede2000":
+        return rgb_to_lab(colors_rgb)
+    raise ValueError(f"Unknown color space '{space}'. Choose one of: {', '.join(DISTANCE_SPACES)}")
+
+
+def ciede2000(lab1, lab2):
+    """CIEDE2000 color difference between CIELAB arrays (broadcast against each other)."""
+    lab1, lab2 = np.asarray(lab1, dtype=float), np.asarray(lab2, dtype=float)
+    l1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    l2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    c_bar = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    g = 0.5 * (1 - np.sqrt(c_bar ** 7 / (c_bar ** 7 + 25.0 ** 7)))
+    a1p, a2p = (1 + g) * a1, (1 + g) * a2
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    chroma_zero = (c1p * c2p) == 0
+
+    delta_l = l2 - l1
+    delta_c = c2p - c1p
+    delta_h = h2p - h1p
+    delta_h = np.where(delta_h > 180, delta_h - 360, np.where(delta_h < -180, delta_h + 360, delta_h))
+    delta_h = np.where(chroma_zero, 0.0, delta_h)
+    delta_big_h = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(delta_h / 2))
+
+    l_bar = (l1 + l2) / 2
+    c_bar_p = (c1p + c2p) / 2
+    h_sum = h1p + h2p
+    h_bar = np.where(np.abs(h1p - h2p) <= 180, h_sum / 2, np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2))
+    h_bar = np.where(chroma_zero, h_sum, h_bar)
+
+    t = (1 - 0.17 * np.cos(np.radians(h_bar - 30)) + 0.24 * np.cos(np.radians(2 * h_bar))
+         + 0.32 * np.cos(np.radians(3 * h_bar + 6)) - 0.20 * np.cos(np.radians(4 * h_bar - 63)))
+    delta_theta = 30 * np.exp(-(((h_bar - 275) / 25) ** 2))
+    r_c = 2 * np.sqrt(c_bar_p ** 7 / (c_bar_p ** 7 + 25.0 ** 7))
+    s_l = 1 + 0.015 * (l_bar - 50) ** 2 / np.sqrt(20 + (l_bar - 50) ** 2)
+    s_c = 1 + 0.045 * c_bar_p
+    s_h = 1 + 0.015 * c_bar_p * t
+    r_t = -np.sin(np.radians(2 * delta_theta)) * r_c
+
+    dl, dc, dh = delta_l / s_l, delta_c / s_c, delta_big_h / s_h
+    return np.sqrt(np.maximum(dl ** 2 + dc ** 2 + dh ** 2 + r_t * dc * dh, 0.0))
+
+
+def squared_distance_matrix(points_a, points_b, space="rgb"):
+    """Squared distances between every converted color in points_a (n, 3) and points_b (m, 3) -> (n, m)."""
+    points_a, points_b = np.asarray(points_a, dtype=float), np.asarray(points_b, dtype=float)
+    if space == "ciede2000":
+        return ciede2000(points_a[:, None, :], points_b[None, :, :]) ** 2
+    # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, one matrix product instead of an (n, m, 3) difference array
+    squared = (points_a ** 2).sum(axis=1)[:, None] + (points_b ** 2).sum(axis=1)[None, :] - 2.0 * (points_a @ points_b.T)
+    return np.maximum(squared, 0.0)
+
+
+def squared_distances_to(points, point, space="rgb"):
+    """Squared distances from every converted color in points (n, 3) to a single converted color (3,) -> (n,)."""
+    points = np.asarray(points)
+    if not np.issubdtype(points.dtype, np.floating):
+        points = points.astype(float)
+    point = np.asarray(point, dtype=points.dtype) # Stay in the caller's precision (float32 for huge sets)
+    if space == "ciede2000":
+        return ciede2000(points, point[None, :]) ** 2
+    # Channel by channel, so column-major (order='F') inputs stream through contiguous memory
+    total = points[:, 0] - point[0]
+    total *= total
+    for channel in (1, 2):
+        difference = points[:, channel] - point[channel]
+        difference *= difference
+        total += difference
+    return total
@@ -0,0 +1,122 @@
+"""Color tables read from controller-script sources (Scala, Java, JavaScript, ...).
+
+Files are streamed line by line through one compiled scanner that recognizes:
+    Color.fromRGB255(r, g, b)     0-255 integers
+    Color.fromRGB(r, g, b)        0-1 floats (Java-style 0.5f suffixes allowed)
+    "#RRGGBB" / '#RRGGBB'         hex strings
+    0xRRGGBB                      six-digit hex integer literals, only with hex_literals=True (--hex-literals)
+in the order they appear. Bare hex literals are opt-in because scripts also use them for masks and
+constants (0xFFFFFF, 0x00FF00) that aren't colors; enable them for files whose color table is written that way. Directories are walked for SOURCE_EXTENSIONS files. Parsed files are memoized
+by mtime and size, so reloading a table only re-reads files that changed.
+
+    python controller_colors.py path/to/ControllerScript.java more/scripts/ --unique [--hex-literals]
+"""
+import argparse
+import os
+import re
+import sys
+
+SOURCE_EXTENSIONS = (".scala", ".java", ".js", ".ts", ".kt", ".groovy", ".py", ".txt")
+
+_NUMBER = r"\s*([0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)[fFdD]?\s*"
+_COLOR_ALTERNATIVES = (
+    r"fromRGB255\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)"
+    rf"|fromRGB\({_NUMBER},{_NUMBER},{_NUMBER}\)"
+    r"|[\"']#([0-9A-Fa-f]{6})[\"']"
+)
+COLOR_PATTERN = re.compile(_COLOR_ALTERNATIVES)
+HEX_LITERAL_COLOR_PATTERN = re.compile(_COLOR_ALTERNATIVES + r"|\b0[xX]([0-9A-Fa-f]{6})\b")
+
+_file_memo = {} # (abspath, hex_literals) -> (mtime_ns, size, colors)
+
+
+def _to_rgb(match):
+    """(r, g, b) 0-255 ints for one scanner match, or None if the values are out of range."""
+    groups = match.groups()
+    if groups[0] is not None:
+        color = tuple(int(value) for value in groups[0:3])
+    elif groups[3] is not None:
+        floats = [float(value) for value in groups[3:6]]
+        if not all(0.0 <= value <= 1.0 for value in floats):
+            return None
+        color = tuple(round(value * 255) for value in floats)
+    else:
+        digits = next(group for group in groups[6:] if group is not None)
+        color = (int(digits[0:2], 16), int(digits[2:4], 16), int(digits[4:6], 16))
+    return color if all(0 <= channel <= 255 for channel in color) else None
+
+
+def scan_lines(lines, hex_literals=False):
+    """Yield every color found in an iterable of source lines, in order (bare 0xRRGGBB literals only if hex_literals)."""
+    pattern = HEX_LITERAL_COLOR_PATTERN if hex_literals else COLOR_PATTERN
+    for line in lines:
+        for match in pattern.finditer(line):
+            color = _to_rgb(match)
+            if color is not None:
+                yield color
+
+
+def load_file(path, hex_literals=False):
+    """Colors in one source file, as a list of (r, g, b); re-read only when its mtime or size changed."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), hex_literals)
+    memo = _file_memo.get(key)
+    if memo and memo[:2] == (stat.st_mtime_ns, stat.st_size):
+        return memo[2]
+    with open(path, encoding="utf-8", errors="replace") as f:
+        colors = list(scan_lines(f, hex_literals))
+    _file_memo[key] = (stat.st_mtime_ns, stat.st_size, colors)
+    return colors
+
+
+def iter_source_files(sources):
+    """Files named in `sources`, with directories walked (sorted) for SOURCE_EXTENSIONS files."""
+    for source in sources:
+        if os.path.isdir(source):
+            for directory, subdirectories, filenames in os.walk(source):
+                subdirectories.sort()
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(SOURCE_EXTENSIONS):
+                        yield os.path.join(directory, filename)
+        else:
+            yield source
+
+
+def load_color_table(sources, unique=False, hex_literals=False):
+    """Colors from every file and directory in `sources`, as a list of (r, g, b) ready for select_distinct_colors.
+
+    The order follows the sources (and line order within each file); unique=True keeps only the first
+    occurrence of each color; hex_literals=True also reads bare 0xRRGGBB literals. Raises OSError for files that can't be read.
+    """
+    table = []
+    seen = set()
+    for path in iter_source_files(sources):
+        for color in load_file(path, hex_literals):
+            if unique:
+                if color in seen:
+                    continue
+                seen.add(color)
+            table.append(color)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the color table found in controller-script sources.")
+    parser.add_argument("sources", nargs="+", help="Source files or directories.")
+    parser.add_argument("--unique", action="store_true", help="Drop repeated colors.")
+    parser.add_argument("--hex-literals", action="store_true", help="Also read bare 0xRRGGBB literals (off by default: they are often masks, not colors).")
+    args = parser.parse_args(argv)
+
+    try:
+        table = load_color_table(args.sources, args.unique, args.hex_literals)
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+    for index, (r, g, b) in enumerate(table):
+        print(f"{index:4d}  #{r:02X}{g:02X}{b:02X}  ({r}, {g}, {b})")
+    print(f"{len(table)} colors.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
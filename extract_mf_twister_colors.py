@@ -1,6 +1,16 @@
-import re
+import argparse
 import random
-import json # To save the selected colors to a JSON file
+import sys
+
+from lazy_imports import lazy_module
+
+# Only executed on first use, so importing this module as a library stays cheap
+controller_colors = lazy_module("controller_colors")
+json = lazy_module("json") # To save the selected colors to a JSON file
+np = lazy_module("numpy")
+color_spaces = lazy_module("color_spaces")
+
+DISTANCE_SPACE = "oklab" # Perceptual space used to pick distinct LED colors ("rgb", "oklab" or "ciede2000")
 
 scala_code = """
 Color.fromRGB255(0, 0, 0), // 0
@@ -133,17 +143,24 @@ Color.fromRGB255(25, 0, 255), // 126 - Blue-ish
 Color.fromRGB255(240, 240, 225) // 127 - White ?
 """
 
-# Regex to extract RGB values
-rgb_pattern = re.compile(r"Color\.fromRGB255\((\d+),\s*(\d+),\s*(\d+)\)")
-scala_colors_rgb = []
+_scala_colors_rgb = None # Parsed on first use
 
-for line in scala_code.strip().split('\n'):
-    match = rgb_pattern.search(line)
-    if match:
-        r, g, b = map(int, match.groups())
-        scala_colors_rgb.append((r, g, b))
+def parse_scala_colors(code):
+    """Extract (r, g, b) tuples from Color.fromRGB255(...) and other color entries in Scala/Java source."""
+    return list(controller_colors.scan_lines(code.strip().split('\n')))
 
-print(f"Extracted {len(scala_colors_rgb)} RGB colors from Scala code.")
+def get_scala_colors_rgb():
+    """The 128 Twister colors from `scala_code`, parsed the first time they are requested."""
+    global _scala_colors_rgb
+    if _scala_colors_rgb is None:
+        _scala_colors_rgb = parse_scala_colors(scala_code)
+    return _scala_colors_rgb
+
+def __getattr__(name):
+    # `scala_colors_rgb` used to be computed at import time; keep it available as a lazy attribute
+    if name == "scala_colors_rgb":
+        return get_scala_colors_rgb()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def color_distance_rgb(color1_rgb, color2_rgb):
     """Calculates Euclidean distance between two RGB colors."""
@@ -151,37 +168,62 @@ def color_distance_rgb(color1_rgb, color2_rgb):
     r2, g2, b2 = color2_rgb
     return ((r1 - r2)**2 + (g1 - g2)**2 + (b1 - b2)**2)**0.5
 
-def select_distinct_colors(all_colors_rgb, num_to_select=64):
-    """Selects a set of maximally distinct colors, excluding or replacing black (0,0,0)."""
-    selected_colors = []
-    remaining_colors = list(all_colors_rgb)
+CONVERSION_CHUNK_SIZE = 1 << 20 # Colors converted per step, keeps temporaries small for huge candidate sets
+
+def convert_candidates(colors_rgb, space="rgb"):
+    """Convert an (n, 3) array of 0-255 colors to float32 coordinates in the distance space, chunk by chunk.
 
-    if not remaining_colors:
+    The result is column-major so per-channel distance passes read contiguous memory.
+    """
+    points = np.empty((len(colors_rgb), 3), dtype=np.float32, order="F")
+    for start in range(0, len(colors_rgb), CONVERSION_CHUNK_SIZE):
+        points[start:start + CONVERSION_CHUNK_SIZE] = color_spaces.convert_colors(colors_rgb[start:start + CONVERSION_CHUNK_SIZE], space)
+    return points
+
+def select_distinct_colors(all_colors_rgb, num_to_select=64, space="rgb"):
+    """Selects a set of maximally distinct colors, excluding or replacing black (0,0,0).
+
+    Greedy farthest-point sampling in `space` ("rgb", "oklab" or "ciede2000"). Each candidate keeps its
+    running squared distance to the nearest selected color, updated only against the newest pick, so
+    the whole selection is O(n*k). `all_colors_rgb` may be a list of tuples or an (n, 3) array.
+    """
+    colors = np.asarray(all_colors_rgb).reshape(-1, 3)
+    if len(colors) == 0:
         return []
 
+    points = convert_candidates(colors, space) # Convert to the distance space once
+    black_mask = ~colors.any(axis=1)
+    available = np.ones(len(colors), dtype=bool)
+    min_distance = np.full(len(colors), np.inf, dtype=np.float32) # Nearest selected color, per candidate
+    min_distance_without_black = None # Same, ignoring the black pick (only tracked once black is selected)
+    selected_indices = []
+
+    def add(index):
+        nonlocal min_distance_without_black
+        selected_indices.append(index)
+        available[index] = False
+        distances = color_spaces.squared_distances_to(points, points[index], space)
+        if black_mask[index] and min_distance_without_black is None:
+            min_distance_without_black = min_distance.copy()
+        elif min_distance_without_black is not None:
+            np.minimum(min_distance_without_black, distances, out=min_distance_without_black)
+        np.minimum(min_distance, distances, out=min_distance)
+        # Masked out for good: -inf survives every later np.minimum and never wins an argmax
+        min_distance[index] = -np.inf
+        if min_distance_without_black is not None:
+            min_distance_without_black[index] = -np.inf
+
+    def farthest(distances):
+        # First available candidate with the largest nearest-selected distance (original order breaks ties)
+        return int(np.argmax(distances))
+
     # 1. Select the first color randomly (or the first color in the list)
-    first_color_index = random.randint(0, len(remaining_colors) - 1)
-    selected_colors.append(remaining_colors.pop(first_color_index))
-
-    while len(selected_colors) < num_to_select and remaining_colors:
-        best_color = None
-        max_min_distance = -1
-
-        for color in remaining_colors:
-            min_distance = float('inf')
-            for selected_color in selected_colors:
-                distance = color_distance_rgb(color, selected_color)
-                min_distance = min(min_distance, distance)
-
-            if min_distance > max_min_distance:
-                max_min_distance = min_distance
-                best_color = color
-
-        if best_color:
-            selected_colors.append(best_color)
-            remaining_colors.remove(best_color)
-        else:
-            break
+    add(random.randint(0, len(colors) - 1))
+
+    while len(selected_indices) < num_to_select and available.any():
+        add(farthest(min_distance))
+
+    selected_colors = [tuple(int(channel) for channel in colors[index]) for index in selected_indices]
 
     # 2. Check for and replace Dark Gray/Black (0, 0, 0)
     black_rgb = (0, 0, 0)
@@ -190,26 +232,10 @@ def select_distinct_colors(all_colors_rgb, num_to_select=64):
         black_index = selected_colors.index(black_rgb)
         selected_colors.pop(black_index) # Remove black
 
-        if remaining_colors: # Try to find a replacement if there are still colors left
-            best_replacement_color = None
-            max_min_distance_replacement = -1
-
-            for color in remaining_colors:
-                min_distance_replacement = float('inf')
-                for selected_color in selected_colors: # Note: selected_colors now without black
-                    distance = color_distance_rgb(color, selected_color)
-                    min_distance_replacement = min(min_distance_replacement, distance)
-
-                if min_distance_replacement > max_min_distance_replacement:
-                    max_min_distance_replacement = min_distance_replacement
-                    best_replacement_color = color
-
-            if best_replacement_color:
-                selected_colors.insert(black_index, best_replacement_color) # Insert replacement at black's original position
-                remaining_colors.remove(best_replacement_color)
-                print(f"Replaced Dark Gray/Black with a new distinct color: {best_replacement_color}")
-            else:
-                print("Warning: No suitable replacement found for Dark Gray/Black.")
+        if available.any(): # Try to find a replacement if there are still colors left
+            best_replacement_color = tuple(int(channel) for channel in colors[farthest(min_distance_without_black)])
+            selected_colors.insert(black_index, best_replacement_color) # Insert replacement at black's original position
+            print(f"Replaced Dark Gray/Black with a new distinct color: {best_replacement_color}")
         else:
             print("Warning: No remaining colors to replace Dark Gray/Black.")
     else:
@@ -217,17 +243,42 @@ def select_distinct_colors(all_colors_rgb, num_to_select=64):
 
     return selected_colors
 
-distinct_colors = select_distinct_colors(scala_colors_rgb, num_to_select=64)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Select maximally distinct colors from a controller color table.")
+    parser.add_argument("sources", nargs="*",
+                        help="Controller-script files or directories to read the color table from (default: the built-in Twister table).")
+    parser.add_argument("--hex-literals", action="store_true",
+                        help="Also read bare 0xRRGGBB literals from the sources (off by default: they are often masks, not colors).")
+    parser.add_argument("--count", type=int, default=64, help="Number of colors to select (default: 64).")
+    parser.add_argument("--output", default="mf_twister_colors.json", help="JSON file to write (default: mf_twister_colors.json).")
+    args = parser.parse_args(argv)
+
+    if args.sources:
+        try:
+            source_colors_rgb = controller_colors.load_color_table(args.sources, unique=True, hex_literals=args.hex_literals)
+        except OSError as e:
+            print(f"Error reading color sources: {e}")
+            return 1
+        print(f"Extracted {len(source_colors_rgb)} distinct RGB colors from {', '.join(args.sources)}.")
+    else:
+        source_colors_rgb = get_scala_colors_rgb()
+        print(f"Extracted {len(source_colors_rgb)} RGB colors from Scala code.")
+
+    distinct_colors = select_distinct_colors(source_colors_rgb, num_to_select=args.count, space=DISTANCE_SPACE)
+
+    print(f"Selected {len(distinct_colors)} distinct RGB colors:")
+    for color in distinct_colors:
+        print(color)
 
-print(f"Selected {len(distinct_colors)} distinct RGB colors:")
-for color in distinct_colors:
-    print(color)
+    # --- Save the selected colors to a JSON file ---
+    output_file = args.output # Filename for saved colors
+    try:
+        with open(output_file, 'w') as f:
+            json.dump(distinct_colors, f, indent=4) # Save as JSON, nicely formatted
+        print(f"Saved selected distinct colors to: {output_file}")
+    except Exception as e:
+        print(f"Error saving olors to {output_file}: {e}")
+    return 0
 
-# --- Save the selected colors to a JSON file ---
-output_file = "mf_twister_colors.json" # Filename for saved colors
-try:
-    with open(output_file, 'w') as f:
-        json.dump(distinct_colors, f, indent=4) # Save as JSON, nicely formatted
-    print(f"Saved selected distinct colors to: {output_file}")
-except Exception as e:
-    print(f"Error saving olors to {output_file}: {e}")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Concurrent-safe counter allocator for palette filenames.
+
+All strategies share one small SQLite database instead of a `<strategy>_counter.txt` file each.
+Counter values are handed out in blocks inside a single `BEGIN IMMEDIATE` transaction, which takes
+SQLite's write lock, so two processes can never receive the same number.
+"""
+import os
+import sqlite3
+import threading
+
+COUNTER_DB_FILE = "palette_counters.sqlite3" # Lives in the CWD, like the old counter files did
+
+_local = threading.local() # Per-thread {(pid, db_path): connection}; connections are never shared across threads or a fork
+
+
+def _connect(db_path):
+    connections = _local.__dict__.setdefault("connections", {})
+    key = (os.getpid(), os.path.abspath(db_path))
+    connection = connections.get(key)
+    if connection is None:
+        # Autocommit mode so we control the transaction; wait up to 30s for another process holding the lock
+        connection = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        connection.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, next_value INTEGER NOT NULL)")
+        connections[key] = connection
+    return connection
+
+
+def _legacy_counter_file(name):
+    return f"{name}_counter.txt"
+
+
+def _read_legacy_counter(name):
+    """Return the value stored in an old `<name>_counter.txt` file, or 1 if there is none."""
+    try:
+        with open(_legacy_counter_file(name), "r") as f:
+            counter = int(f.read())
+    except FileNotFoundError:
+        return 1
+    except (ValueError, OSError):
+        counter = 1
+    return max(counter, 1)
+
+
+def allocate_counters(name, count=1, db_path=COUNTER_DB_FILE):
+    """Reserve `count` consecutive counter values for `name` and return the first one."""
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    connection = _connect(db_path)
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        row = connection.execute("SELECT next_value FROM counters WHERE name = ?", (name,)).fetchone()
+        first = row[0] if row else _read_legacy_counter(name) # Migrate an old counter file the first time
+        connection.execute("INSERT OR REPLACE INTO counters (name, next_value) VALUES (?, ?)", (name, first + count))
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    if row is None:
+        # Only now that the value is committed; once the row exists the old file is never read again
+        try:
+            os.remove(_legacy_counter_file(name))
+        except OSError:
+            pass
+    return first
+
+
+def palette_filename(strategy_safe_name, counter, extension=".png"):
+    """Build the '<strategy>_palette_<NNN>.png' filename for a counter value."""
+    return f"{strategy_safe_name}_palette_{str(counter).zfill(3)}{extension}"
+
+
+def allocate_filenames(strategy_name, count, extension=".png", db_path=COUNTER_DB_FILE):
+    """Reserve a block of `count` unique palette filenames for a strategy in one locked operation."""
+    strategy_safe_name = strategy_name.replace("_", "-").lower()
+    first = allocate_counters(strategy_safe_name, count, db_path)
+    return [palette_filename(strategy_safe_name, counter, extension) for counter in range(first, first + count)]
@@ -0,0 +1,115 @@
+"""Palettes extracted from reference images (album covers, screenshots, photos).
+
+The image is decoded at reduced size where the format allows it (JPEG draft mode) and downsampled once
+with PIL to at most SAMPLE_SIZE x SAMPLE_SIZE pixels. Pixels are merged into color bins weighted by count,
+then clustered with k-means in OKLab, one cluster per grid cell. Each cell gets the average sRGB color of
+its cluster; rows run from light to dark, and hue runs left to right within a row.
+"""
+import numpy as np
+
+import color_spaces
+
+SAMPLE_SIZE = 256 # Longest side of the downsampled image
+BIN_BITS = 5 # Pixels are clustered as 32x32x32 color bins, each weighted by its pixel count
+KMEANS_ITERATIONS = 30
+KMEANS_TOLERANCE = 1e-6 # Stop once no centroid moves further than this (squared OKLab distance)
+DISTANCE_CHUNK = 1 << 22 # Point-centroid distances computed at once
+
+
+def load_pixels(path, sample_size=SAMPLE_SIZE):
+    """Decode and downsample an image; returns its pixels as an (n, 3) uint8 array (OSError if unreadable)."""
+    from PIL import Image
+    with Image.open(path) as image:
+        image.draft("RGB", (sample_size, sample_size)) # JPEG decodes straight to 1/2..1/8 scale
+        image = image.convert("RGB")
+    image.thumbnail((sample_size, sample_size), Image.Resampling.BOX)
+    return np.asarray(image, dtype=np.uint8).reshape(-1, 3)
+
+
+def color_bins(pixels):
+    """Group pixels into BIN_BITS-per-channel color bins; returns (mean color of each bin as float, pixel count)."""
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    shift = 8 - BIN_BITS
+    keys = ((pixels[:, 0] >> shift).astype(np.uint32) << (2 * BIN_BITS)) | ((pixels[:, 1] >> shift).astype(np.uint32) << BIN_BITS) | (pixels[:, 2] >> shift)
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    sums = np.stack([np.bincount(inverse, weights=pixels[:, channel], minlength=len(counts)) for channel in range(3)], axis=1)
+    return sums / counts[:, None], counts
+
+
+def _nearest_centroids(points, centroids):
+    """Index of the nearest centroid for every point, computed DISTANCE_CHUNK matrix entries at a time."""
+    labels = np.empty(len(points), dtype=np.intp)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    chunk = max(1, DISTANCE_CHUNK // len(centroids))
+    for start in range(0, len(points), chunk):
+        # |p - c|^2 minus the |p|^2 term, which doesn't change the argmin
+        squared = points[start:start + chunk] @ centroids.T
+        squared *= -2.0
+        squared += centroid_norms
+        labels[start:start + chunk] = squared.argmin(axis=1)
+    return labels
+
+
+def _init_centroids(points, weights, k, generator):
+    """k-means++ seeding: each next centroid is a point drawn with probability weight * squared distance."""
+    channels = np.ascontiguousarray(points.T) # Per-channel arrays keep the k passes below cheap
+
+    def squared_distances_to(index):
+        return sum((channel - channel[index]) ** 2 for channel in channels)
+
+    chosen = [int(np.searchsorted(np.cumsum(weights), generator.random() * weights.sum()))]
+    closest = squared_distances_to(chosen[0])
+    for _ in range(1, k):
+        cumulative = np.cumsum(weights * closest)
+        if cumulative[-1] <= 0: # Every point coincides with a centroid already
+            break
+        chosen.append(min(int(np.searchsorted(cumulative, generator.random() * cumulative[-1], side="right")), len(points) - 1))
+        np.minimum(closest, squared_distances_to(chosen[-1]), out=closest)
+    return points[np.resize(chosen, k)]
+
+
+def kmeans(points, weights, k, generator, iterations=KMEANS_ITERATIONS):
+    """Weighted Lloyd's k-means on (n, d) float points; returns (centroids (k, d), labels (n,))."""
+    centroids = _init_centroids(points, weights, k, generator)
+    for _ in range(iterations):
+        labels = _nearest_centroids(points, centroids)
+        totals = np.bincount(labels, weights=weights, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=weights * points[:, axis], minlength=k) for axis in range(points.shape[1])], axis=1)
+        updated = centroids.copy()
+        filled = totals > 0 # An emptied cluster keeps its old centroid
+        updated[filled] = sums[filled] / totals[filled, None]
+        shift = ((updated - centroids) ** 2).sum(axis=1).max()
+        centroids = updated
+        if shift < KMEANS_TOLERANCE:
+            break
+    return centroids, _nearest_centroids(points, centroids)
+
+
+def layout_colors(colors, grid_rows, grid_cols):
+    """Arrange grid_rows * grid_cols uint8 colors light to dark by row, by hue within each row."""
+    oklab = color_spaces.rgb_to_oklab(colors)
+    order = np.argsort(-oklab[:, 0], kind="stable")
+    rows = order.reshape(grid_rows, grid_cols)
+    hues = np.arctan2(oklab[rows, 2], oklab[rows, 1])
+    rows = np.take_along_axis(rows, np.argsort(hues, axis=1, kind="stable"), axis=1)
+    return colors[rows]
+
+
+def extract_palette(pixels, grid_rows, grid_cols, seed=0):
+    """A (grid_rows, grid_cols, 3) uint8 palette of the image's dominant colors; `seed` drives the k-means seeding.
+
+    Images with fewer color bins than cells repeat their colors to fill the grid.
+    """
+    colors, counts = color_bins(pixels)
+    cells = grid_rows * grid_cols
+    weights = counts.astype(np.float64)
+    points = color_spaces.rgb_to_oklab(colors).astype(np.float32)
+    k = min(cells, len(colors))
+    _, labels = kmeans(points, weights, k, np.random.default_rng(seed))
+
+    # Average sRGB of each cluster's pixels, as the colors the image actually shows
+    totals = np.bincount(labels, weights=weights, minlength=k)
+    filled = totals > 0
+    means = np.stack([np.bincount(labels, weights=weights * colors[:, channel], minlength=k) for channel in range(3)], axis=1)
+    palette = np.rint(means[filled] / totals[filled, None]).astype(np.uint8)
+    return layout_colors(np.resize(palette, (cells, 3)), grid_rows, grid_cols)
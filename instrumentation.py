@@ -0,0 +1,164 @@
+"""Opt-in per-stage timings for the palette pipeline.
+
+Enable it with the PALETTE_PROFILE environment variable:
+
+    PALETTE_PROFILE=1 python palettegenv2.py                  # summary table on stderr at exit
+    PALETTE_PROFILE=trace.json python bulk_generate.py ...    # table plus a Chrome trace written to trace.json
+
+The trace opens in chrome://tracing or https://ui.perfetto.dev. Times are inclusive, so a stage that calls
+another instrumented stage also contains its time. When the variable is unset, `instrumented` returns
+functions unchanged and `stage` returns a shared no-op context, so the hot path pays nothing.
+"""
+import atexit
+import contextlib
+import functools
+import os
+import sys
+import threading
+import time
+
+PROFILE_ENV_VAR = "PALETTE_PROFILE"
+_setting = os.environ.get(PROFILE_ENV_VAR, "").strip()
+ENABLED = _setting not in ("", "0")
+TRACE_PATH = _setting if _setting.lower().endswith(".json") else None
+MAX_TRACE_EVENTS = 1_000_000 # Beyond this only the summary keeps counting
+
+_lock = threading.Lock()
+_stats = {} # stage name -> [calls, total_ns, min_ns, max_ns]
+_events = [] # Chrome trace "complete" events
+_dropped_events = 0
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def record(name, start_ns, end_ns):
+    """Add one timed call of stage `name`."""
+    global _dropped_events
+    duration = end_ns - start_ns
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            _stats[name] = [1, duration, duration, duration]
+        else:
+            stat[0] += 1
+            stat[1] += duration
+            stat[2] = min(stat[2], duration)
+            stat[3] = max(stat[3], duration)
+        if TRACE_PATH:
+            if len(_events) < MAX_TRACE_EVENTS:
+                _events.append({"name": name, "ph": "X", "ts": start_ns / 1000, "dur": duration / 1000,
+                                "pid": os.getpid(), "tid": threading.get_ident()})
+            else:
+                _dropped_events += 1
+
+
+def instrumented(name):
+    """Decorator timing every call of the function as stage `name` (returns the function itself when disabled)."""
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, start, time.perf_counter_ns())
+        return wrapper
+    return decorate
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.start, time.perf_counter_ns())
+
+
+def stage(name):
+    """Context manager timing a block as stage `name`."""
+    return _Stage(name) if ENABLED else _NULL_STAGE
+
+
+def collect():
+    """Return and clear this process's records, so a worker can hand them to its parent (see merge)."""
+    global _dropped_events
+    with _lock:
+        records = ({name: list(stat) for name, stat in _stats.items()}, list(_events), _dropped_events)
+        _stats.clear()
+        _events.clear()
+        _dropped_events = 0
+    return records
+
+
+def merge(records):
+    """Fold records returned by collect() in another process into this one."""
+    global _dropped_events
+    stats, events, dropped = records
+    with _lock:
+        for name, (calls, total, fastest, slowest) in stats.items():
+            stat = _stats.get(name)
+            if stat is None:
+                _stats[name] = [calls, total, fastest, slowest]
+            else:
+                stat[0] += calls
+                stat[1] += total
+                stat[2] = min(stat[2], fastest)
+                stat[3] = max(stat[3], slowest)
+        room = max(MAX_TRACE_EVENTS - len(_events), 0)
+        _events.extend(events[:room])
+        _dropped_events += dropped + max(len(events) - room, 0)
+
+
+def summary_table():
+    """Per-stage calls and timings, slowest total first."""
+    with _lock:
+        rows = sorted(_stats.items(), key=lambda item: item[1][1], reverse=True)
+    lines = [f"{'stage':<44} {'calls':>9} {'total ms':>11} {'mean us':>10} {'min us':>10} {'max us':>10}"]
+    for name, (calls, total, fastest, slowest) in rows:
+        lines.append(f"{name:<44} {calls:>9} {total / 1e6:>11.2f} {total / calls / 1e3:>10.1f} {fastest / 1e3:>10.1f} {slowest / 1e3:>10.1f}")
+    return "\n".join(lines) + "\n"
+
+
+def write_trace(path):
+    """Write the recorded calls as a Chrome trace JSON file."""
+    import json
+    with _lock:
+        trace = {"traceEvents": list(_events), "displayTimeUnit": "ms"}
+    with open(path, "w") as f:
+        json.dump(trace, f)
+
+
+def _reset_after_fork():
+    # A forked worker starts with a copy of the parent's records; drop them so merge() does not count them twice
+    global _lock, _dropped_events
+    _lock = threading.Lock()
+    _stats.clear()
+    _events.clear()
+    _dropped_events = 0
+
+
+def _dump_at_exit():
+    if not _stats:
+        return
+    sys.stderr.write("\nPalette pipeline timings:\n" + summary_table())
+    if TRACE_PATH:
+        try:
+            write_trace(TRACE_PATH)
+        except OSError as e:
+            sys.stderr.write(f"Could not write trace to {TRACE_PATH}: {e}\n")
+            return
+        dropped = f" ({_dropped_events} events dropped)" if _dropped_events else ""
+        sys.stderr.write(f"Chrome trace written to {TRACE_PATH}{dropped}\n")
+
+
+if ENABLED:
+    atexit.register(_dump_at_exit)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_reset_after_fork)
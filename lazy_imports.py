@@ -0,0 +1,47 @@
+"""Deferred module imports, so the scripts can be imported as libraries without paying for numpy/PIL up front."""
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+
+_import_lock = threading.RLock()
+
+
+class _LazyModule(types.ModuleType):
+    """Stand-in that imports the real module on first attribute access and forwards every lookup to it.
+
+    Unlike importlib.util.LazyLoader this is safe when several threads touch the module at once (the
+    strategy preview thread and the main thread do): the first import runs under a lock, and nobody sees
+    a half-executed module.
+    """
+
+    def _load(self):
+        module = self.__dict__.get("_lazy_target")
+        if module is None:
+            with _import_lock:
+                module = self.__dict__.get("_lazy_target")
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_target"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_module(name):
+    """Return module `name`, executing it only on first attribute access.
+
+    Already imported modules are returned as they are. Otherwise a stand-in is returned; sys.modules only
+    ever holds the real module, so plain `import name` statements elsewhere are unaffected.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    return _LazyModule(name)
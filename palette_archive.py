@@ -0,0 +1,230 @@
+"""Single-file palette archives (.bwpal): many palettes of one grid size as fixed-size records.
+
+Layout (little-endian):
+    header   magic b"BWPA", version (u8), grid_cols (u16), grid_rows (u16), record count (u64)
+    records  `count` records of RECORD_FIELDS followed by the row-major RGB cells (grid_rows * grid_cols * 3 bytes)
+
+Every record has the same size, so record i lives at a fixed offset and the whole file can be
+memory-mapped as one NumPy structured array; strategy, seed and name double as the index. Records are
+only ever appended, and the header count is updated when a writer closes, so an interrupted run
+leaves a valid archive with the records written before the last successful close.
+
+Command line:
+    python palette_archive.py info palettes.bwpal
+    python palette_archive.py list palettes.bwpal [--strategy tetradic]
+    python palette_archive.py export palettes.bwpal [--strategy tetradic] [--name NAME ...] [--index 3 ...] [--limit 20] [--output DIR]
+"""
+import argparse
+import os
+import struct
+import sys
+
+import numpy as np
+
+import palette_stream
+import palettegenv2
+
+ARCHIVE_EXTENSION = ".bwpal"
+ARCHIVE_MAGIC = b"BWPA"
+ARCHIVE_VERSION = 1
+_HEADER = struct.Struct("<4sBHHQ") # magic, version, grid_cols, grid_rows, record count
+STRATEGY_FIELD_SIZE = 32
+NAME_FIELD_SIZE = 48
+RECORD_FIELDS = [("strategy", f"S{STRATEGY_FIELD_SIZE}"), ("seed", "<u8"), ("name", f"S{NAME_FIELD_SIZE}")]
+
+
+class ArchiveError(ValueError):
+    """The file is not a palette archive, or does not match what the caller expects."""
+
+
+def record_dtype(grid_rows, grid_cols):
+    """Structured dtype of one archive record for the given grid size."""
+    return np.dtype(RECORD_FIELDS + [("rgb", "u1", (grid_rows, grid_cols, 3))])
+
+
+def _read_header(f, path):
+    data = f.read(_HEADER.size)
+    if len(data) < _HEADER.size:
+        raise ArchiveError(f"{path} is too short to be a palette archive.")
+    magic, version, grid_cols, grid_rows, count = _HEADER.unpack(data)
+    if magic != ARCHIVE_MAGIC:
+        raise ArchiveError(f"{path} is not a palette archive.")
+    if version != ARCHIVE_VERSION:
+        raise ArchiveError(f"{path} uses archive version {version}; only version {ARCHIVE_VERSION} is supported.")
+    return grid_cols, grid_rows, count
+
+
+def _encode_field(text, size, field):
+    encoded = text.encode("utf-8")
+    if len(encoded) > size:
+        raise ArchiveError(f"{field} '{text}' is longer than {size} bytes.")
+    return encoded
+
+
+class ArchiveWriter:
+    """Append palettes to an archive, creating it for the given grid size if it does not exist yet."""
+
+    def __init__(self, path, grid_cols, grid_rows):
+        self.path = path
+        self.grid_cols, self.grid_rows = grid_cols, grid_rows
+        self.dtype = record_dtype(grid_rows, grid_cols)
+        if os.path.exists(path):
+            self._file = open(path, "r+b")
+            existing_cols, existing_rows, self.count = _read_header(self._file, path)
+            if (existing_cols, existing_rows) != (grid_cols, grid_rows):
+                self._file.close()
+                raise ArchiveError(f"{path} holds {existing_cols}x{existing_rows} palettes, not {grid_cols}x{grid_rows}.")
+        else:
+            self._file = open(path, "w+b")
+            self.count = 0
+            self._write_header()
+        committed_size = _HEADER.size + self.count * self.dtype.itemsize
+        self._file.flush() # A new archive's header may still be buffered
+        size = os.fstat(self._file.fileno()).st_size
+        if size < committed_size: # Cut short or a corrupt header; extending it would commit zero-filled records
+            self._file.close()
+            raise ArchiveError(f"{path} is shorter than the {self.count} records its header lists; it is truncated or corrupt.")
+        if size > committed_size: # Drop anything past the last committed record (left by an interrupted writer)
+            self._file.truncate(committed_size)
+        self._file.seek(0, os.SEEK_END)
+
+    def _write_header(self):
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, self.grid_cols, self.grid_rows, self.count))
+
+    def append_batch(self, stack, strategy, seeds, names):
+        """Append a (n, grid_rows, grid_cols, 3) uint8 stack with its strategy, seeds and names in one write."""
+        records = np.zeros(len(seeds), dtype=self.dtype)
+        records["strategy"] = _encode_field(strategy, STRATEGY_FIELD_SIZE, "Strategy")
+        records["seed"] = seeds
+        records["name"] = [_encode_field(name, NAME_FIELD_SIZE, "Name") for name in names]
+        records["rgb"] = stack
+        self._file.write(records.tobytes())
+        self.count += len(records)
+
+    def append(self, rgb, strategy, seed, name):
+        """Append one palette given as packed RGB bytes."""
+        cells = np.frombuffer(bytes(rgb), dtype=np.uint8).reshape(1, self.grid_rows, self.grid_cols, 3)
+        self.append_batch(cells, strategy, [seed], [name])
+
+    def close(self):
+        """Commit the appended records by updating the header count."""
+        if self._file.closed:
+            return
+        self._file.flush()
+        self._write_header()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PaletteArchive:
+    """Read-only, memory-mapped view of an archive; `records` is a NumPy structured array."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.grid_cols, self.grid_rows, count = _read_header(f, path)
+        self.dtype = record_dtype(self.grid_rows, self.grid_cols)
+        if os.path.getsize(path) < _HEADER.size + count * self.dtype.itemsize:
+            raise ArchiveError(f"{path} is shorter than the {count} records its header lists; it is truncated or corrupt.")
+        if count == 0:
+            self.records = np.zeros(0, dtype=self.dtype)
+        else:
+            self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=_HEADER.size, shape=(count,))
+
+    def __len__(self):
+        return len(self.records)
+
+    def strategy(self, index):
+        return self.records["strategy"][index].decode("utf-8")
+
+    def name(self, index):
+        return self.records["name"][index].decode("utf-8")
+
+    def seed(self, index):
+        return int(self.records["seed"][index])
+
+    def names(self):
+        """Names of all records, in archive order."""
+        return [name.decode("utf-8") for name in self.records["name"]]
+
+    def rgb(self, index):
+        """Packed RGB bytes of record `index`."""
+        return self.records["rgb"][index].tobytes()
+
+    def select(self, strategy=None, names=None, indices=None, limit=None):
+        """Record indices matching every given filter, in archive order."""
+        mask = np.ones(len(self), dtype=bool)
+        if strategy is not None:
+            mask &= self.records["strategy"] == strategy.encode("utf-8")
+        if names:
+            mask &= np.isin(self.records["name"], [name.encode("utf-8") for name in names])
+        if indices:
+            selected = np.zeros(len(self), dtype=bool)
+            selected[[index for index in indices if 0 <= index < len(self)]] = True
+            mask &= selected
+        matches = np.flatnonzero(mask)
+        return matches[:limit] if limit is not None else matches
+
+
+def export_pngs(archive, indices, output_dir, use_pil=False):
+    """Write the chosen records to output_dir as '<name>.png' files; returns the number written."""
+    os.makedirs(output_dir, exist_ok=True) # Ensure folder exists
+    palettes = ((archive.seed(index), archive.rgb(index)) for index in indices)
+    filenames = [archive.name(index) + ".png" for index in indices]
+
+    def metadata_for(position, seed):
+        return palettegenv2.palette_metadata(archive.strategy(indices[position]), seed, archive.grid_rows, archive.grid_cols)
+
+    return palette_stream.write_palettes(palettes, filenames, output_dir, archive.grid_rows, archive.grid_cols, metadata_for, use_pil=use_pil)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect palette archives and export palettes from them as PNGs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info_parser = commands.add_parser("info", help="Show the grid size and palette counts per strategy.")
+    info_parser.add_argument("archive")
+    list_parser = commands.add_parser("list", help="List the palettes in an archive.")
+    export_parser = commands.add_parser("export", help="Write palettes from an archive as PNG files.")
+    for command_parser in (list_parser, export_parser):
+        command_parser.add_argument("archive")
+        command_parser.add_argument("--strategy", help="Only palettes generated with this strategy.")
+        command_parser.add_argument("--name", action="append", dest="names", help="Only this palette name (repeatable).")
+        command_parser.add_argument("--index", type=int, action="append", dest="indices", help="Only this record index (repeatable).")
+        command_parser.add_argument("--limit", type=int, default=None, help="At most this many palettes.")
+    export_parser.add_argument("--output", default=palettegenv2.BITWIG_PALETTE_DIR,
+                               help="Output directory (default: the Bitwig Color Palettes folder).")
+    export_parser.add_argument("--pil", action="store_true", help="Encode PNGs through PIL instead of the built-in writer.")
+    args = parser.parse_args(argv)
+
+    try:
+        archive = PaletteArchive(args.archive)
+    except (OSError, ArchiveError) as e:
+        print(f"Error opening archive: {e}")
+        return 1
+
+    if args.command == "info":
+        print(f"{args.archive}: {len(archive)} palettes of {archive.grid_cols}x{archive.grid_rows}")
+        strategies, counts = np.unique(archive.records["strategy"], return_counts=True)
+        for strategy, count in zip(strategies, counts):
+            print(f"  {strategy.decode('utf-8'):<28} {count}")
+        return 0
+
+    indices = archive.select(args.strategy, args.names, args.indices, args.limit)
+    if args.command == "list":
+        for index in indices:
+            print(f"{index:>8}  {archive.name(index):<40} {archive.strategy(index):<28} seed {archive.seed(index)}")
+        return 0
+
+    written = export_pngs(archive, list(indices), args.output, args.pil)
+    print(f"Exported {written} palettes to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""Asynchronous palette file output with a bounded number of writes in flight.
+
+AsyncPaletteWriter is the asyncio interface. PNG encoding and file writes run on a thread pool executor.
+`await writer.submit(...)` returns as soon as the write is scheduled, and only waits while max_in_flight
+writes are outstanding (back-pressure), so a slow or network-mounted disk holds generation back by at
+most that many palettes. Every target directory is created once, by the first write aimed at it.
+
+BackgroundPaletteWriter drives the same writer from synchronous code through an event loop on its own
+thread, with palette_stream.PaletteWriter's interface. OutputStats counts writes, failures, directories
+and the time producers spent waiting on back-pressure (also recorded as the "output.backpressure_wait"
+stage when PALETTE_PROFILE is set).
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+import palettegenv2
+
+DEFAULT_MAX_IN_FLIGHT = 16 # Writes scheduled but not finished before submit() starts waiting
+DEFAULT_WORKERS = 4 # Executor threads encoding and writing PNGs
+
+
+class OutputStats:
+    """Counters of one writer; back-pressure is how often, and how long, submit() had to wait for a free slot."""
+
+    def __init__(self):
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.directories = 0
+        self.peak_in_flight = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+        self.write_seconds = 0.0 # Summed over concurrent writes
+
+    def summary(self):
+        return (f"{self.written}/{self.submitted} palettes written ({self.failed} failed) into {self.directories} folder(s); "
+                f"peak {self.peak_in_flight} in flight, waited for the disk {self.backpressure_waits} time(s), "
+                f"{self.backpressure_seconds:.2f}s in total")
+
+
+class AsyncPaletteWriter:
+    """Schedule palette PNG writes on an executor, at most `max_in_flight` at a time.
+
+    Use as an async context manager; leaving the block waits for every scheduled write. The first failed
+    write is re-raised from the next submit() or drain(); stats.failed counts every failure.
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, workers=DEFAULT_WORKERS, use_pil=False):
+        self.use_pil = use_pil
+        self.stats = OutputStats()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="palette-output")
+        self._directories = {} # directory -> future of its makedirs call
+        self._pending = set()
+        self._error = None
+
+    @property
+    def written(self):
+        return self.stats.written
+
+    def _raise_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _ensure_directory(self, directory):
+        """Future that completes once `directory` exists; makedirs runs only for the first write into it."""
+        future = self._directories.get(directory)
+        if future is None:
+            makedirs = functools.partial(os.makedirs, directory, exist_ok=True)
+            future = self._directories[directory] = asyncio.get_running_loop().run_in_executor(self._executor, makedirs)
+            self.stats.directories += 1
+        return future
+
+    async def _write(self, filepath, rgb, grid_rows, grid_cols, metadata, release):
+        try:
+            await self._ensure_directory(os.path.dirname(filepath) or os.curdir)
+            start = time.perf_counter()
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, palettegenv2.save_palette_png, rgb, grid_rows, grid_cols, filepath, self.use_pil, metadata)
+            self.stats.write_seconds += time.perf_counter() - start
+            self.stats.written += 1
+        except Exception as e:
+            self.stats.failed += 1
+            if self._error is None:
+                self._error = e
+        finally:
+            self._in_flight -= 1
+            release()
+
+    def _record_wait(self, start_ns, end_ns):
+        self.stats.backpressure_waits += 1
+        self.stats.backpressure_seconds += (end_ns - start_ns) / 1e9
+        if instrumentation.ENABLED:
+            instrumentation.record("output.backpressure_wait", start_ns, end_ns)
+
+    def _schedule(self, filepath, rgb, grid_rows, grid_cols, metadata, release):
+        """Start one write on the running loop; `release` frees its in-flight slot once it is done."""
+        self._in_flight += 1
+        self.stats.submitted += 1
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, self._in_flight)
+        task = asyncio.create_task(self._write(filepath, rgb, grid_rows, grid_cols, metadata, release))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def submit(self, filepath, rgb, grid_rows, grid_cols, metadata=None):
+        """Schedule one palette for writing; waits only while max_in_flight writes are outstanding."""
+        self._raise_error()
+        if self._slots.locked():
+            start = time.perf_counter_ns()
+            await self._slots.acquire()
+            self._record_wait(start, time.perf_counter_ns())
+        else:
+            await self._slots.acquire()
+        self._schedule(filepath, rgb, grid_rows, grid_cols, metadata, self._slots.release)
+        await asyncio.sleep(0) # Let the write start before the caller produces the next palette
+
+    async def drain(self):
+        """Wait until every scheduled palette is written."""
+        while self._pending:
+            await asyncio.gather(*self._pending)
+        self._raise_error()
+
+    async def aclose(self):
+        """drain(), then stop the executor."""
+        try:
+            await self.drain()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+
+class BackgroundPaletteWriter:
+    """AsyncPaletteWriter for synchronous callers, running on an event loop in a background thread.
+
+    Same interface as palette_stream.PaletteWriter: submit() blocks only under back-pressure, close()
+    (or leaving the `with` block) waits for every write, and failed writes are re-raised. The in-flight
+    limit is a thread semaphore on the caller's side, so a submit() that doesn't wait never waits for
+    the loop thread either.
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, workers=DEFAULT_WORKERS, use_pil=False):
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="palette-output-loop", daemon=True)
+        self._thread.start()
+        self._writer = self._call(self._create(max_in_flight, workers, use_pil))
+
+    async def _create(self, max_in_flight, workers, use_pil):
+        return AsyncPaletteWriter(max_in_flight, workers, use_pil) # Built on the loop it will run on
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    @property
+    def stats(self):
+        return self._writer.stats
+
+    @property
+    def written(self):
+        return self._writer.written
+
+    def submit(self, filepath, rgb, grid_rows, grid_cols, metadata=None):
+        """Schedule one palette for writing; blocks while max_in_flight writes are outstanding."""
+        self._writer._raise_error()
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter_ns()
+            self._slots.acquire()
+            self._writer._record_wait(start, time.perf_counter_ns())
+        self._loop.call_soon_threadsafe(self._writer._schedule, filepath, rgb, grid_rows, grid_cols, metadata, self._slots.release)
+
+    def drain(self):
+        """Wait until every scheduled palette is written."""
+        self._call(self._writer.drain())
+
+    def close(self):
+        """Wait for every write, then stop the event loop thread."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._call(self._writer.aclose())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+async def write_palettes(palettes, filenames, output_dir, grid_rows, grid_cols, metadata_for=None,
+                         max_in_flight=DEFAULT_MAX_IN_FLIGHT, workers=DEFAULT_WORKERS, use_pil=False):
+    """Async counterpart of palette_stream.write_palettes; returns the writer's OutputStats."""
+    async with AsyncPaletteWriter(max_in_flight, workers, use_pil) as writer:
+        for position, ((seed, rgb), filename) in enumerate(zip(palettes, filenames)):
+            metadata = metadata_for(position, seed) if metadata_for else None
+            await writer.submit(os.path.join(output_dir, filename), rgb, grid_rows, grid_cols, metadata)
+    return writer.stats
@@ -0,0 +1,137 @@
+"""Persistent duplicate index for saved palettes.
+
+Every saved palette is recorded by a hash of its exact content (grid size + RGB cells) and by a
+perceptual signature: its cells converted to OKLab and quantized to NEAR_DUPLICATE_STEP. Palettes whose
+cells all land in the same OKLab buckets share a signature, which catches near-identical output such as
+repeated gray ramps. This is exact-bucket matching, not a distance threshold: two palettes that differ by
+far less than NEAR_DUPLICATE_STEP but straddle a bucket boundary in any cell get different signatures and
+are not reported. (Checking neighbouring buckets would mean 3^(3 * cells) signatures per palette.) Use
+palette_search for true distance queries. Claims run inside one `BEGIN IMMEDIATE` transaction, so parallel workers never save
+the same palette twice. The index lives in the CWD next to the filename counters.
+
+Records are scoped to the folder (or archive) a palette was saved into, so the same palette can still be
+saved somewhere else. A record whose file no longer exists is stale: it is dropped on lookup instead of
+blocking the palette forever. Bulk runs claim palettes before writing them, so a missing file only makes a
+record stale once the claim is CLAIM_GRACE_SECONDS old. Archive records aren't files: there the caller passes
+the names the archive really holds, and a record under any other name (lost to an interrupted writer, or to
+a deleted or replaced archive) is stale at once.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import color_spaces
+
+DEDUP_DB_FILE = "palette_hashes.sqlite3"
+NEAR_DUPLICATE_STEP = 0.02 # OKLab bucket size, roughly one just-noticeable difference
+DEDUP_MODES = ("off", "exact", "near")
+CLAIM_GRACE_SECONDS = 600 # A claimed palette's file may be missing this long (still being written) before the claim lapses
+
+_local = threading.local() # Per-thread {(pid, db_path): connection}; connections are never shared across threads or a fork
+
+
+def _connect(db_path):
+    connections = _local.__dict__.setdefault("connections", {})
+    key = (os.getpid(), os.path.abspath(db_path))
+    connection = connections.get(key)
+    if connection is None:
+        connection = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        # The older folder-less `palettes` table, if present, is no longer consulted
+        connection.execute("CREATE TABLE IF NOT EXISTS saved_palettes (folder TEXT NOT NULL, hash BLOB NOT NULL, signature BLOB NOT NULL,"
+                           " strategy TEXT, name TEXT, claimed_at REAL NOT NULL, PRIMARY KEY (folder, hash))")
+        connection.execute("CREATE INDEX IF NOT EXISTS saved_palettes_signature ON saved_palettes (folder, signature)")
+        connections[key] = connection
+    return connection
+
+
+def _as_stack(palettes, grid_rows, grid_cols):
+    """Accept a (n, grid_rows, grid_cols, 3) uint8 stack or packed RGB bytes of one palette."""
+    if isinstance(palettes, (bytes, bytearray, memoryview)):
+        return np.frombuffer(bytes(palettes), dtype=np.uint8).reshape(1, grid_rows, grid_cols, 3)
+    return np.asarray(palettes, dtype=np.uint8)
+
+
+def content_hashes(stack):
+    """Exact content hash of each palette in a (n, grid_rows, grid_cols, 3) uint8 stack."""
+    grid_rows, grid_cols = stack.shape[1:3]
+    prefix = f"{grid_cols}x{grid_rows}:".encode()
+    return [hashlib.blake2b(prefix + palette.tobytes(), digest_size=16).digest() for palette in stack]
+
+
+def perceptual_signatures(stack):
+    """Hash of each palette's cells floored to NEAR_DUPLICATE_STEP OKLab buckets; equal only when every cell lands in the same bucket."""
+    grid_rows, grid_cols = stack.shape[1:3]
+    prefix = f"{grid_cols}x{grid_rows}:".encode()
+    buckets = np.floor(color_spaces.rgb_to_oklab(stack) / NEAR_DUPLICATE_STEP).astype(np.int16)
+    return [hashlib.blake2b(prefix + palette.tobytes(), digest_size=16).digest() for palette in buckets]
+
+
+def folder_key(folder):
+    """How a destination folder (or archive path) is stored in the index."""
+    return os.path.realpath(folder)
+
+
+def _find(connection, folder, digest, signature, near, grace, live_names=None, claimed=()):
+    """Name of a live record in `folder` matching the palette, or None; stale records found on the way are deleted.
+
+    A record is stale when its file is missing and it is older than `grace` seconds. With `live_names` given,
+    it is stale unless its name is in `live_names` or `claimed` instead.
+    """
+    if near:
+        rows = connection.execute("SELECT hash, name, claimed_at FROM saved_palettes WHERE folder = ? AND (hash = ? OR signature = ?)",
+                                  (folder, digest, signature)).fetchall()
+    else:
+        rows = connection.execute("SELECT hash, name, claimed_at FROM saved_palettes WHERE folder = ? AND hash = ?", (folder, digest)).fetchall()
+    for recorded_hash, name, claimed_at in rows:
+        if live_names is not None:
+            if name in live_names or name in claimed:
+                return name
+        elif time.time() - claimed_at < grace or os.path.exists(os.path.join(folder, name)):
+            return name
+        connection.execute("DELETE FROM saved_palettes WHERE folder = ? AND hash = ?", (folder, recorded_hash))
+    return None
+
+
+def claim_palettes(stack, strategy, names, folder, near=False, live_names=None, db_path=DEDUP_DB_FILE):
+    """Record every palette of a uint8 stack not yet saved in `folder`; returns one flag per palette (True = new, save it).
+
+    Duplicates inside the batch itself are caught too: only the first copy is claimed. When `folder` is an
+    archive, pass the names of the records it holds as `live_names`; claims under other names then lapse.
+    """
+    stack = np.asarray(stack, dtype=np.uint8)
+    digests, signatures = content_hashes(stack), perceptual_signatures(stack)
+    folder = folder_key(folder)
+    connection = _connect(db_path)
+    fresh, claimed = [], set()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        for digest, signature, name in zip(digests, signatures, names):
+            is_new = _find(connection, folder, digest, signature, near, CLAIM_GRACE_SECONDS, live_names, claimed) is None
+            if is_new:
+                claimed.add(name)
+                connection.execute("INSERT OR REPLACE INTO saved_palettes (folder, hash, signature, strategy, name, claimed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                                   (folder, digest, signature, strategy, name, time.time()))
+            fresh.append(is_new)
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    return fresh
+
+
+def find_duplicate(rgb, grid_rows, grid_cols, folder, near=False, db_path=DEDUP_DB_FILE):
+    """Name under which this palette (packed RGB bytes) is already saved in `folder`, or None."""
+    stack = _as_stack(rgb, grid_rows, grid_cols)
+    # Palettes are recorded only after their file is written, so a missing file is stale right away
+    return _find(_connect(db_path), folder_key(folder), content_hashes(stack)[0], perceptual_signatures(stack)[0], near, 0)
+
+
+def record_palette(rgb, grid_rows, grid_cols, strategy, name, folder, db_path=DEDUP_DB_FILE):
+    """Record a palette (packed RGB bytes) that was saved as `name` in `folder`; call it once the file is written."""
+    stack = _as_stack(rgb, grid_rows, grid_cols)
+    _connect(db_path).execute("INSERT OR REPLACE INTO saved_palettes (folder, hash, signature, strategy, name, claimed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                              (folder_key(folder), content_hashes(stack)[0], perceptual_signatures(stack)[0], strategy, name, time.time()))
@@ -0,0 +1,388 @@
+"""Vectorized palette engine: builds whole hue/saturation/value grids and converts them in one array pass.
+
+Every strategy draws its random numbers from the supplied rng in exactly the order the original
+cell-by-cell loops did (column-major, saturation before value), so a given seed produces the same
+colors as before. Only the math after the draws is done on arrays.
+"""
+import hashlib
+import os
+import random
+
+import numpy as np
+
+
+def new_seed():
+    """Fresh random 64-bit seed from the OS (never touches the global random module)."""
+    return int.from_bytes(os.urandom(8), "big")
+
+
+def derive_seed(master_seed, index):
+    """Derive an independent 64-bit seed for stream `index` from a master seed (stable across runs and platforms)."""
+    digest = hashlib.blake2b(f"{master_seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _column_draws(rng, grid_rows, grid_cols, per_column, per_cell):
+    """Draw random numbers in the legacy loop order: per column, `per_column` values then `per_cell` values per row.
+
+    Returns (column_values, cell_values) shaped (per_column, grid_cols) and (per_cell, grid_rows, grid_cols).
+    """
+    draw = rng.random
+    values = np.array([draw() for _ in range(grid_cols * (per_column + grid_rows * per_cell))], dtype=float)
+    values = values.reshape(grid_cols, per_column + grid_rows * per_cell)
+    column_values = values[:, :per_column].T
+    cell_values = values[:, per_column:].reshape(grid_cols, grid_rows, per_cell).transpose(2, 1, 0)
+    return column_values, cell_values
+
+
+def _cell_draws(rng, grid_rows, grid_cols, per_cell=2):
+    """Draw `per_cell` random numbers per cell in legacy order, shaped (per_cell, grid_rows, grid_cols)."""
+    return _column_draws(rng, grid_rows, grid_cols, 0, per_cell)[1]
+
+
+def _tile(values, count):
+    """Repeat `values` cyclically to exactly `count` items."""
+    return (list(values) * (count // max(len(values), 1) + 1))[:count]
+
+
+def _legacy_row_position(grid_rows):
+    """Position of each row on the original 4-row layout (0-3): rows map 1:1 up to 4 rows, taller grids spread over it."""
+    if grid_rows <= 4:
+        return np.arange(grid_rows, dtype=float)
+    return np.arange(grid_rows) * (3.0 / (grid_rows - 1))
+
+
+def _row_index(grid_rows):
+    """Row numbers as a (grid_rows, 1) column for broadcasting against (grid_rows, grid_cols) grids."""
+    return np.arange(grid_rows)[:, None]
+
+
+def _shift_hues(base_hues, row_shifts, hue_shifts, grid_rows, row_shift_scale=None):
+    """Apply row-specific and user hue shifts to per-column base hues -> (grid_rows, grid_cols)."""
+    base_hues = np.asarray(base_hues, dtype=float)[None, :]
+    row_shifts = np.asarray(row_shifts[:grid_rows], dtype=float)[:, None]
+    hue_shifts = np.asarray(hue_shifts[:grid_rows], dtype=float)[:, None]
+    if row_shift_scale is not None:
+        row_shifts = row_shifts * row_shift_scale
+    return (base_hues + row_shifts + hue_shifts) % 1.0
+
+
+# uniform() range of the hue shift of rows 0-3 in the original 4-row layout
+ROW_SHIFT_RANGES = np.array([
+    (0.0, 0.0),   # First row has no shift
+    (0.02, 0.06), # Second row shifts slightly (reduced shift)
+    (0.04, 0.10), # Third row shifts more (adjusted range)
+    (0.06, 0.14), # Fourth row shifts even more (new row)
+])
+
+
+def draw_row_shifts(rng, grid_rows):
+    """Draw the per-row hue shifts used by every strategy (same draws as the original generator up to 4 rows).
+
+    Taller grids interpolate the ranges, ramping up to the fourth row's shift instead of wrapping around the wheel.
+    """
+    positions = _legacy_row_position(grid_rows)
+    layout = np.arange(len(ROW_SHIFT_RANGES))
+    lows = np.interp(positions, layout, ROW_SHIFT_RANGES[:, 0])
+    highs = np.interp(positions, layout, ROW_SHIFT_RANGES[:, 1])
+    row_shifts = [0.0] + [rng.uniform(float(low), float(high)) for low, high in zip(lows[1:], highs[1:])]
+
+    # Randomize shift direction
+    if rng.choice([True, False]):
+        for i in range(1, grid_rows): # Apply to all shift rows
+            row_shifts[i] *= -1
+    return row_shifts
+
+
+def distinct_hues_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Distinct hues with lightness variations by row."""
+    base_hues = [(i / grid_cols + rng.random() * 0.03) % 1.0 for i in range(grid_cols)]
+    rng.shuffle(base_hues)  # Shuffle for unpredictability
+    jitter = _cell_draws(rng, grid_rows, grid_cols)
+    row = _row_index(grid_rows)
+
+    hue = _shift_hues(base_hues, row_shifts, hue_shifts, grid_rows)
+    saturation = 0.3 + row * (0.6 / grid_rows) + jitter[0] * 0.15
+    value = 0.9 - row * (0.5 / grid_rows) + jitter[1] * 0.1
+    return hue, saturation, value
+
+
+def split_complementary_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Base hue with its split complements."""
+    base_hue = rng.random()
+    complement1 = (base_hue + 0.5 - 0.05) % 1.0
+    complement2 = (base_hue + 0.5 + 0.05) % 1.0
+    hues = [base_hue] * (grid_cols // 4 + 2) + [
+        (base_hue + 0.02) % 1.0,
+        (base_hue - 0.02) % 1.0,
+        complement1,
+        (complement1 + 0.03) % 1.0,
+        complement2,
+        (complement2 - 0.03) % 1.0,
+        (complement1 - 0.03) % 1.0,
+        (complement2 + 0.03) % 1.0,
+        base_hue,
+        complement1,
+        complement2
+    ]
+    hues = _tile(hues, grid_cols) # Repeat the hue set across wide grids
+    rng.shuffle(hues)
+    jitter = _cell_draws(rng, grid_rows, grid_cols)
+    row = _row_index(grid_rows)
+
+    hue = _shift_hues(hues, row_shifts, hue_shifts, grid_rows)
+    saturation = 0.4 + row * (0.5 / grid_rows) + jitter[0] * 0.1
+    value = 0.9 - row * (0.5 / grid_rows) + jitter[1] * 0.1
+    return hue, saturation, value
+
+
+def triadic_variations_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Three main hues with variations."""
+    hue1 = rng.random()
+    hue2 = (hue1 + 0.33) % 1.0
+    hue3 = (hue1 + 0.66) % 1.0
+
+    hue_variations = []
+    for hue in [hue1, hue2, hue3]:
+        hue_variations.extend([
+            hue,
+            (hue + 0.02) % 1.0,
+            (hue - 0.02) % 1.0,
+            (hue + 0.04) % 1.0,
+            (hue - 0.04) % 1.0
+        ])
+    hue_variations = _tile(hue_variations, grid_cols) # Repeat the variations across wide grids
+    rng.shuffle(hue_variations)
+    jitter = _cell_draws(rng, grid_rows, grid_cols)
+    row = _row_index(grid_rows)
+
+    hue = _shift_hues(hue_variations, row_shifts, hue_shifts, grid_rows)
+    saturation = 0.4 + row * (0.5 / grid_rows) + jitter[0] * 0.15
+    value = 0.9 - row * (0.5 / grid_rows) + jitter[1] * 0.1
+    return hue, saturation, value
+
+
+def analogous_extended_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Hues spread over a slice of the color wheel."""
+    start_hue = rng.random()
+    hue_range = 0.4  # Slightly wider range for grid_cols columns
+    jitter = _cell_draws(rng, grid_rows, grid_cols)
+    row = _row_index(grid_rows)
+
+    hue_offset = (np.arange(grid_cols) / grid_cols) * hue_range
+    base_hues = (start_hue + hue_offset) % 1.0
+    hue = _shift_hues(base_hues, row_shifts, hue_shifts, grid_rows)
+    saturation = 0.5 + row * (0.4 / grid_rows) + jitter[0] * 0.15
+    value = 0.9 - row * (0.5 / grid_rows) + jitter[1] * 0.1
+    return hue, saturation, value
+
+
+def monochromatic_columns_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Each column is monochromatic, with different hues across columns."""
+    base_hues, jitter = _column_draws(rng, grid_rows, grid_cols, 1, 2)
+    row = _row_index(grid_rows)
+
+    hue = _shift_hues(base_hues[0], row_shifts, hue_shifts, grid_rows)
+    saturation = 0.3 + row * (0.6 / grid_rows) + jitter[0] * 0.1
+    value = 0.95 - row * (0.6 / grid_rows) + jitter[1] * 0.1
+    return hue, saturation, value
+
+
+def warm_cool_contrast_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Mix of warm (reds, oranges, yellows) and cool (blues, greens, purples) columns."""
+    warm_hues = [rng.uniform(0.95, 0.15) for _ in range(grid_cols // 2 + 1)]
+    cool_hues = [rng.uniform(0.4, 0.7) for _ in range(grid_cols - (grid_cols // 2 + 1))]
+    all_hues = warm_hues + cool_hues
+    rng.shuffle(all_hues)
+    jitter = _cell_draws(rng, grid_rows, grid_cols)
+    row = _row_index(grid_rows)
+
+    hue = _shift_hues(all_hues, row_shifts, hue_shifts, grid_rows)
+    saturation = 0.5 + row * (0.4 / grid_rows) + jitter[0] * 0.1
+    value = 0.9 - row * (0.5 / grid_rows) + jitter[1] * 0.1
+    return hue, saturation, value
+
+
+def pastel_dark_contrast_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """First half of the rows pastel, last half deep/dark."""
+    hues = [rng.random() for _ in range(grid_cols)]
+    jitter = _cell_draws(rng, grid_rows, grid_cols)
+    pastel = _row_index(grid_rows) <= grid_rows // 2 - 1
+
+    hue = _shift_hues(hues, row_shifts, hue_shifts, grid_rows)
+    # Pastels (high value, low saturation) vs deep/dark (high saturation, low value)
+    saturation = np.where(pastel, 0.2 + jitter[0] * 0.2, 0.7 + jitter[0] * 0.2)
+    value = np.where(pastel, 0.9 + jitter[1] * 0.1, 0.4 + jitter[1] * 0.2)
+    return hue, saturation, value
+
+
+# (saturation_low, saturation_high, value_low, value_high) for the rows of the original 4-row layout;
+# taller grids interpolate between them, so the light-to-deep ramp always spans the whole grid
+HARMONY_ROW_BANDS = np.array([
+    (0.2, 0.5, 0.85, 1.0),  # Top row: lighter
+    (0.4, 0.7, 0.7, 0.9),   # Second row: medium light
+    (0.6, 0.9, 0.55, 0.75), # Third row: medium dark
+    (0.8, 1.0, 0.4, 0.6),   # Bottom row: deeper
+])
+
+
+def _harmony_bands(grid_rows):
+    """HARMONY_ROW_BANDS for each row of the grid -> (grid_rows, 4)."""
+    positions = _legacy_row_position(grid_rows)
+    layout = np.arange(len(HARMONY_ROW_BANDS))
+    return np.stack([np.interp(positions, layout, HARMONY_ROW_BANDS[:, column]) for column in range(4)], axis=1)
+
+
+def random_with_harmony_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Random hue per column with a light-to-deep pattern down the rows."""
+    base_hues, jitter = _column_draws(rng, grid_rows, grid_cols, 1, 2)
+    bands = _harmony_bands(grid_rows)[:, :, None]
+    saturation_low, saturation_high, value_low, value_high = bands.transpose(1, 0, 2)
+
+    hue = _shift_hues(base_hues[0], row_shifts, hue_shifts, grid_rows)
+    # Same arithmetic as random.uniform(a, b): a + (b - a) * random()
+    saturation = saturation_low + (saturation_high - saturation_low) * jitter[0]
+    value = value_low + (value_high - value_low) * jitter[1]
+    return hue, saturation, value
+
+
+def complementary_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Base hue and its complement, split evenly across columns."""
+    base_hue = rng.random()
+    complement_hue = (base_hue + 0.5) % 1.0
+    hues = [base_hue] * (grid_cols // 2) + [complement_hue] * (grid_cols - (grid_cols // 2))
+    rng.shuffle(hues)
+    jitter = _cell_draws(rng, grid_rows, grid_cols)
+    row = _row_index(grid_rows)
+
+    hue = _shift_hues(hues, row_shifts, hue_shifts, grid_rows)
+    saturation = 0.4 + row * (0.5 / grid_rows) + jitter[0] * 0.1
+    value = 0.85 - row * (0.5 / grid_rows) + jitter[1] * 0.1
+    return hue, saturation, value
+
+
+def shades_of_gray_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Slightly tinted grays, brightening left to right and top to bottom."""
+    base_hue = rng.uniform(0, 1) # slight tint
+    jitter = _cell_draws(rng, grid_rows, grid_cols, per_cell=1)
+    row = _row_index(grid_rows)
+    col = np.arange(grid_cols)[None, :]
+
+    hue = _shift_hues([base_hue] * grid_cols, row_shifts, hue_shifts, grid_rows, row_shift_scale=0.5)
+    saturation = 0.03 + jitter[0] * 0.03 # Very low saturation
+    value = 0.15 + (col / grid_cols) * 0.7 + (row / grid_rows) * 0.15
+    return hue, saturation, value
+
+
+def tetradic_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Four hues 90 degrees apart."""
+    base_hue = rng.random()
+    hue2 = (base_hue + 0.25) % 1.0
+    hue3 = (base_hue + 0.5) % 1.0
+    hue4 = (base_hue + 0.75) % 1.0
+    hues = [base_hue] * (grid_cols // 4 + 1) + [hue2] * (grid_cols // 4) + [hue3] * (grid_cols // 4) + [hue4] * (grid_cols - 3*(grid_cols // 4 + 1))
+    hues = _tile(hues, grid_cols)
+    rng.shuffle(hues)
+    jitter = _cell_draws(rng, grid_rows, grid_cols)
+    row = _row_index(grid_rows)
+
+    hue = _shift_hues(hues, row_shifts, hue_shifts, grid_rows)
+    saturation = 0.4 + row * (0.5 / grid_rows) + jitter[0] * 0.1
+    value = 0.85 - row * (0.5 / grid_rows) + jitter[1] * 0.1
+    return hue, saturation, value
+
+
+def rainbow_desaturated_rows_hsv(rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Rainbow across the columns, losing saturation with each row (no randomness, no row shifts)."""
+    row = _row_index(grid_rows)
+    base_hues = np.arange(grid_cols) / float(grid_cols) # Hue from 0 to 1 across columns (rainbow)
+
+    hue = _shift_hues(base_hues, [0.0] * grid_rows, hue_shifts, grid_rows)
+    saturation = np.broadcast_to(1.0 - (row * (0.6 / grid_rows)), (grid_rows, grid_cols))
+    value = np.full((grid_rows, grid_cols), 0.9) # Constant value (brightness)
+    return hue, saturation, value
+
+
+def rgb_to_hsv(r, g, b):
+    """Array version of colorsys.rgb_to_hsv (same operations, same results)."""
+    r, g, b = np.broadcast_arrays(np.asarray(r, dtype=float), np.asarray(g, dtype=float), np.asarray(b, dtype=float))
+    maxc = np.maximum(np.maximum(r, g), b)
+    minc = np.minimum(np.minimum(r, g), b)
+    rangec = maxc - minc
+    v = maxc
+    gray = minc == maxc
+    safe_max = np.where(gray, 1.0, maxc)
+    safe_range = np.where(gray, 1.0, rangec)
+    s = np.where(gray, 0.0, rangec / safe_max)
+    rc = (maxc - r) / safe_range
+    gc = (maxc - g) / safe_range
+    bc = (maxc - b) / safe_range
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = np.where(gray, 0.0, (h / 6.0) % 1.0)
+    return h, s, v
+
+
+def hsv_to_rgb(h, s, v):
+    """Array version of colorsys.hsv_to_rgb; returns an array shaped (..., 3) of floats."""
+    h, s, v = np.broadcast_arrays(np.asarray(h, dtype=float), np.asarray(s, dtype=float), np.asarray(v, dtype=float))
+    i = (h * 6.0).astype(np.int64) # int() truncation, hues are in [0, 1)
+    f = (h * 6.0) - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = np.where(s == 0.0, 0, i % 6)[None]
+    t = np.where(s == 0.0, v, t)
+    p = np.where(s == 0.0, v, p)
+
+    # Sector table from colorsys: 0 -> (v, t, p), 1 -> (q, v, p), ... 5 -> (v, p, q)
+    r = np.take_along_axis(np.stack([v, q, p, p, t, v]), i, axis=0)[0]
+    g = np.take_along_axis(np.stack([t, v, v, q, p, p]), i, axis=0)[0]
+    b = np.take_along_axis(np.stack([p, p, t, v, v, q]), i, axis=0)[0]
+    return np.stack([r, g, b], axis=-1)
+
+
+def hsv_to_rgb8(h, s, v):
+    """Convert HSV arrays to uint8 RGB (..., 3), truncating like int(x * 255) and clipping out-of-gamut values."""
+    rgb = (hsv_to_rgb(h, s, v) * 255).astype(np.int64)
+    return np.clip(rgb, 0, 255).astype(np.uint8)
+
+
+def rgb8_to_hex_grid(rgb):
+    """Turn a (rows, cols, 3) uint8 array into the nested list of '#RRGGBB' strings used by the UI."""
+    rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+    grid_rows, grid_cols = rgb.shape[:2]
+    digits = rgb.tobytes().hex().upper()
+    codes = ["#" + digits[i:i + 6] for i in range(0, len(digits), 6)]
+    return [codes[row * grid_cols:(row + 1) * grid_cols] for row in range(grid_rows)]
+
+
+def pack_hex_grid(hex_codes):
+    """Pack a nested list of '#RRGGBB' strings into row-major RGB bytes."""
+    return bytes.fromhex("".join(hex_code[1:7] for row_codes in hex_codes for hex_code in row_codes))
+
+
+def generate_rgb(builder, rng, grid_rows, grid_cols, row_shifts, hue_shifts):
+    """Run one HSV builder and return its palette as a (grid_rows, grid_cols, 3) uint8 array."""
+    return hsv_to_rgb8(*builder(rng, grid_rows, grid_cols, row_shifts, hue_shifts))
+
+
+def generate_hsv_batch(builder, seeds, grid_rows, grid_cols, hue_shifts):
+    """Raw (3, len(seeds), grid_rows, grid_cols) HSV of one palette per seed, before any out-of-range values are clipped.
+
+    Every palette draws from its own random.Random(seed) stream (row shifts, then the strategy), so a
+    palette depends only on its seed, never on batch order or which worker produced it.
+    """
+    hsv = np.empty((3, len(seeds), grid_rows, grid_cols))
+    for index, seed in enumerate(seeds):
+        rng = random.Random(seed)
+        row_shifts = draw_row_shifts(rng, grid_rows)
+        hsv[:, index] = builder(rng, grid_rows, grid_cols, row_shifts, hue_shifts)
+    return hsv
+
+
+def generate_rgb_batch(builder, seeds, grid_rows, grid_cols, hue_shifts):
+    """Generate one palette per seed with one builder; returns a (len(seeds), grid_rows, grid_cols, 3) uint8 stack.
+
+    The HSV -> RGB conversion runs once for the whole stack.
+    """
+    return hsv_to_rgb8(*generate_hsv_batch(builder, seeds, grid_rows, grid_cols, hue_shifts))
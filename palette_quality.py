@@ -0,0 +1,93 @@
+"""Vectorized quality metrics for batches of palettes, used to oversample and keep the best candidates.
+
+Metrics, one value per palette:
+    min_distance           smallest OKLab distance between any two cells (near-identical cells score ~0)
+    min_neighbor_distance  smallest OKLab distance between horizontally or vertically adjacent cells
+    contrast               OKLab lightness range (max L - min L)
+    clipped_cells          cells whose raw saturation or value fell outside 0-1 and were clipped
+The score is a weighted sum of them (SCORE_WEIGHTS); clipped cells count as a fraction of the grid.
+"""
+import numpy as np
+
+import color_spaces
+
+SCORE_WEIGHTS = {
+    "min_distance": 1.0,
+    "min_neighbor_distance": 0.5,
+    "contrast": 0.25,
+    "clipped_cells": -0.1, # Per fraction of the grid that was clipped
+}
+MAX_OVERSAMPLE = 64 # Most candidates scored per palette; the gain flattens out long before this
+PAIR_CHUNK_CELLS = 1 << 22 # Pairwise distance matrix entries computed at once (n * cells * cells)
+
+
+def _min_pair_distances(oklab):
+    """Smallest distance between two different cells of each palette; oklab is (n, cells, 3)."""
+    n, cells = oklab.shape[:2]
+    if cells < 2:
+        return np.zeros(n)
+    result = np.empty(n)
+    chunk = max(1, PAIR_CHUNK_CELLS // (cells * cells))
+    diagonal = np.arange(cells)
+    for start in range(0, n, chunk):
+        points = oklab[start:start + chunk].astype(np.float32)
+        squared_norms = (points ** 2).sum(axis=2)
+        # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, as one batched matrix product per chunk, updated in place
+        squared = points @ points.transpose(0, 2, 1)
+        squared *= -2.0
+        squared += squared_norms[:, :, None]
+        squared += squared_norms[:, None, :]
+        squared[:, diagonal, diagonal] = np.inf
+        result[start:start + chunk] = np.sqrt(np.maximum(squared.min(axis=(1, 2)), 0.0))
+    return result
+
+
+def _min_neighbor_distances(oklab_grid):
+    """Smallest distance between adjacent cells of each palette; oklab_grid is (n, rows, cols, 3)."""
+    n = len(oklab_grid)
+    candidates = [np.full(n, np.inf)]
+    if oklab_grid.shape[2] > 1:
+        candidates.append(np.linalg.norm(np.diff(oklab_grid, axis=2), axis=3).min(axis=(1, 2)))
+    if oklab_grid.shape[1] > 1:
+        candidates.append(np.linalg.norm(np.diff(oklab_grid, axis=1), axis=3).min(axis=(1, 2)))
+    minimum = np.min(candidates, axis=0)
+    return np.where(np.isinf(minimum), 0.0, minimum)
+
+
+def score_palettes(stack, hsv=None):
+    """Quality metrics for a (n, grid_rows, grid_cols, 3) uint8 stack; returns {metric: (n,) array}.
+
+    `hsv` is the raw (3, n, grid_rows, grid_cols) HSV the stack was converted from; without it no clipping is counted.
+    """
+    stack = np.asarray(stack, dtype=np.uint8)
+    n, grid_rows, grid_cols = stack.shape[:3]
+    oklab_grid = color_spaces.rgb_to_oklab(stack)
+    lightness = oklab_grid[..., 0].reshape(n, -1)
+    if hsv is None:
+        clipped = np.zeros(n, dtype=np.int64)
+    else:
+        saturation, value = hsv[1], hsv[2]
+        out_of_range = (saturation < 0) | (saturation > 1) | (value < 0) | (value > 1)
+        clipped = out_of_range.reshape(n, -1).sum(axis=1)
+    return {
+        "min_distance": _min_pair_distances(oklab_grid.reshape(n, -1, 3)),
+        "min_neighbor_distance": _min_neighbor_distances(oklab_grid),
+        "contrast": lightness.max(axis=1) - lightness.min(axis=1),
+        "clipped_cells": clipped,
+    }
+
+
+def quality_score(metrics, grid_cells, weights=None):
+    """Combine score_palettes() metrics into one (n,) score; higher is better."""
+    weights = weights or SCORE_WEIGHTS
+    score = np.zeros(len(metrics["min_distance"]))
+    for metric, weight in weights.items():
+        values = metrics[metric] / grid_cells if metric == "clipped_cells" else metrics[metric]
+        score += weight * values
+    return score
+
+
+def best_of_groups(scores, group_size):
+    """Index of the best-scoring palette in each consecutive group of `group_size` candidates."""
+    groups = np.asarray(scores).reshape(-1, group_size)
+    return np.arange(len(groups)) * group_size + groups.argmax(axis=1)
@@ -0,0 +1,261 @@
+"""Near-duplicate search across a palette library.
+
+Each palette becomes a feature vector: its cells in OKLab, concatenated row by row and scaled by
+1/sqrt(cells), so the distance between two palettes is the RMS per-cell OKLab distance (0.02 is about
+one just-noticeable difference on every cell). Only palettes of the same grid size are comparable, so an
+index covers one grid size.
+
+The index projects every vector onto its top principal components. Projection onto orthonormal axes
+never increases a distance, so projected distances are lower bounds of the real ones:
+  * epsilon queries binary-search a sorted first component, filter the survivors by projected distance
+    and verify the few that remain against the full vectors;
+  * k-nearest queries visit palettes in order of their lower bound and stop as soon as the next bound
+    exceeds the k-th best exact distance.
+Both return exact results. Indexes are saved as a directory of .npy files and memory-mapped on load.
+
+    python palette_search.py build library.idx ~/Documents/Bitwig\\ Studio/Color\\ Palettes palettes.bwpal [--grid 16x4]
+    python palette_search.py query library.idx --png some_palette.png --k 10
+    python palette_search.py query library.idx --archive palettes.bwpal --name tetradic_palette_012 --epsilon 0.03
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+import color_spaces
+import palette_archive
+
+INDEX_VERSION = 1
+PROJECTION_DIMS = 16 # Principal components kept for the lower-bound filter
+PCA_SAMPLE_SIZE = 20000 # Palettes used to fit the projection
+KNN_BLOCK_SIZE = 256 # Candidates verified per step of a k-nearest query
+BOUND_SLACK = 1e-4 # float32 rounding margin on lower bounds, so exact matches are never filtered out
+
+
+def palette_features(stack):
+    """Feature vectors (n, cells * 3) float32 for a (n, grid_rows, grid_cols, 3) uint8 stack."""
+    stack = np.asarray(stack, dtype=np.uint8)
+    cells = stack.shape[1] * stack.shape[2]
+    oklab = color_spaces.rgb_to_oklab(stack.reshape(len(stack), cells, 3))
+    return (oklab.reshape(len(stack), cells * 3) / np.sqrt(cells)).astype(np.float32)
+
+
+def _png_rgb(path, grid_rows, grid_cols):
+    """Packed RGB bytes of a palette PNG, or None if it is unreadable or has another grid size."""
+    from PIL import Image
+    try:
+        with Image.open(path) as image:
+            if image.size != (grid_cols, grid_rows):
+                return None
+            return image.convert("RGB").tobytes()
+    except OSError:
+        return None
+
+
+def iter_library(sources, grid_rows, grid_cols, batch_size=4096):
+    """Yield (names, uint8 stack) batches of grid_cols x grid_rows palettes from archives, PNG files and folders of PNGs."""
+    names, palettes = [], []
+    for source in sources:
+        if source.endswith(palette_archive.ARCHIVE_EXTENSION):
+            archive = palette_archive.PaletteArchive(source)
+            if (archive.grid_cols, archive.grid_rows) != (grid_cols, grid_rows):
+                continue
+            for start in range(0, len(archive), batch_size):
+                records = archive.records[start:start + batch_size]
+                yield [name.decode("utf-8") for name in records["name"]], np.array(records["rgb"])
+            continue
+        if os.path.isdir(source):
+            paths = sorted(entry.path for entry in os.scandir(source) if entry.is_file() and entry.name.lower().endswith(".png"))
+        else:
+            paths = [source]
+        for path in paths:
+            rgb = _png_rgb(path, grid_rows, grid_cols)
+            if rgb is None:
+                continue
+            names.append(os.path.basename(path))
+            palettes.append(rgb)
+            if len(palettes) == batch_size:
+                yield names, np.frombuffer(b"".join(palettes), dtype=np.uint8).reshape(-1, grid_rows, grid_cols, 3)
+                names, palettes = [], []
+    if palettes:
+        yield names, np.frombuffer(b"".join(palettes), dtype=np.uint8).reshape(-1, grid_rows, grid_cols, 3)
+
+
+def _blocks_by_bound(bounds, head_size):
+    """Yield indices in increasing order of `bounds`, KNN_BLOCK_SIZE at a time.
+
+    Only the `head_size` smallest bounds are sorted up front; the rest is sorted only if a query gets that far.
+    """
+    if head_size < len(bounds):
+        head = np.argpartition(bounds, head_size - 1)[:head_size]
+        rest = np.ones(len(bounds), dtype=bool)
+        rest[head] = False
+        parts = [head, np.flatnonzero(rest)] # Every bound in `rest` is >= every bound in `head`
+    else:
+        parts = [np.arange(len(bounds))]
+    for part in parts:
+        part = part[np.argsort(bounds[part], kind="stable")]
+        for start in range(0, len(part), KNN_BLOCK_SIZE):
+            yield part[start:start + KNN_BLOCK_SIZE]
+
+
+class PaletteIndex:
+    """Exact epsilon and k-nearest search over palette feature vectors."""
+
+    def __init__(self, grid_cols, grid_rows, names, features, mean, components, projected, order):
+        self.grid_cols, self.grid_rows = grid_cols, grid_rows
+        self.names = names
+        self.features = features # (n, D) float32
+        self.mean = mean # (D,)
+        self.components = components # (D, k) orthonormal columns
+        self.projected = projected # (n, k) float32
+        self.order = order # Palette indices sorted by the first component
+        self.first_component = projected[order, 0] if len(order) else np.zeros(0, dtype=np.float32)
+
+    @classmethod
+    def build(cls, grid_cols, grid_rows, names, features, dims=PROJECTION_DIMS, seed=0):
+        """Fit the projection on (a sample of) the features and index them."""
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        sample = features
+        if len(features) > PCA_SAMPLE_SIZE:
+            sample = features[np.random.default_rng(seed).choice(len(features), PCA_SAMPLE_SIZE, replace=False)]
+        mean = sample.mean(axis=0)
+        dims = max(1, min(dims, features.shape[1], len(sample)))
+        _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        components = np.ascontiguousarray(vt[:dims].T, dtype=np.float32)
+        projected = (features - mean) @ components
+        order = np.argsort(projected[:, 0], kind="stable")
+        return cls(grid_cols, grid_rows, list(names), features, mean.astype(np.float32), components, projected, order)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _query_vectors(self, rgb):
+        query = palette_features(np.frombuffer(bytes(rgb), dtype=np.uint8).reshape(1, self.grid_rows, self.grid_cols, 3))[0]
+        return query, (query - self.mean) @ self.components
+
+    def within(self, rgb, epsilon):
+        """All (name, distance) pairs within `epsilon` of a palette (packed RGB bytes), closest first."""
+        query, query_projected = self._query_vectors(rgb)
+        reach = epsilon + BOUND_SLACK
+        low = np.searchsorted(self.first_component, query_projected[0] - reach, side="left")
+        high = np.searchsorted(self.first_component, query_projected[0] + reach, side="right")
+        candidates = self.order[low:high]
+        bounds = np.linalg.norm(self.projected[candidates] - query_projected, axis=1)
+        candidates = candidates[bounds <= reach]
+        distances = np.linalg.norm(self.features[candidates] - query, axis=1)
+        keep = distances <= epsilon
+        candidates, distances = candidates[keep], distances[keep]
+        ranking = np.argsort(distances, kind="stable")
+        return [(self.names[candidates[i]], float(distances[i])) for i in ranking]
+
+    def nearest(self, rgb, k=10):
+        """The k closest (name, distance) pairs to a palette (packed RGB bytes), closest first; k must be at least 1."""
+        if k < 1:
+            raise ValueError(f"k must be at least 1, not {k}.")
+        query, query_projected = self._query_vectors(rgb)
+        bounds = np.linalg.norm(self.projected - query_projected, axis=1)
+        best_indices = np.zeros(0, dtype=np.int64)
+        best_distances = np.zeros(0, dtype=np.float32)
+        for block in _blocks_by_bound(bounds, max(4 * k, 4 * KNN_BLOCK_SIZE)):
+            if len(best_distances) == k and bounds[block[0]] > best_distances[-1] + BOUND_SLACK:
+                break # Every remaining palette is at least this far away
+            best_indices = np.concatenate([best_indices, block])
+            best_distances = np.concatenate([best_distances, np.linalg.norm(self.features[block] - query, axis=1)])
+            keep = np.argsort(best_distances, kind="stable")[:k]
+            best_indices, best_distances = best_indices[keep], best_distances[keep]
+        return [(self.names[index], float(distance)) for index, distance in zip(best_indices, best_distances)]
+
+    def save(self, index_dir):
+        """Write the index as a directory of .npy arrays plus meta.json."""
+        os.makedirs(index_dir, exist_ok=True)
+        for name in ("features", "mean", "components", "projected", "order"):
+            np.save(os.path.join(index_dir, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(index_dir, "meta.json"), "w") as f:
+            json.dump({"version": INDEX_VERSION, "grid": [self.grid_cols, self.grid_rows], "names": self.names}, f)
+
+    @classmethod
+    def load(cls, index_dir):
+        """Open a saved index; the large arrays are memory-mapped rather than read."""
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"{index_dir} was built by another version of palette_search; rebuild it.")
+        arrays = {name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+                  for name in ("features", "mean", "components", "projected", "order")}
+        grid_cols, grid_rows = meta["grid"]
+        return cls(grid_cols, grid_rows, meta["names"], arrays["features"], np.array(arrays["mean"]),
+                   np.array(arrays["components"]), arrays["projected"], arrays["order"])
+
+
+def build_index(sources, grid_rows, grid_cols, dims=PROJECTION_DIMS):
+    """Index every grid_cols x grid_rows palette found in `sources`."""
+    names, features = [], []
+    for batch_names, stack in iter_library(sources, grid_rows, grid_cols):
+        names.extend(batch_names)
+        features.append(palette_features(stack))
+    if not names:
+        raise ValueError(f"No {grid_cols}x{grid_rows} palettes found.")
+    return PaletteIndex.build(grid_cols, grid_rows, names, np.concatenate(features), dims)
+
+
+def _parse_grid(text):
+    try:
+        grid_cols, grid_rows = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid grid size '{text}'. Use COLSxROWS, e.g. 16x4.")
+    return grid_cols, grid_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find similar palettes across a palette library.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Index the palettes in PNG folders, PNG files and .bwpal archives.")
+    build_parser.add_argument("index", help="Index directory to write.")
+    build_parser.add_argument("sources", nargs="+")
+    build_parser.add_argument("--grid", type=_parse_grid, default=(16, 4), help="Grid size to index as COLSxROWS (default: 16x4).")
+    query_parser = commands.add_parser("query", help="Find palettes similar to one palette.")
+    query_parser.add_argument("index")
+    query_parser.add_argument("--png", help="Query with this palette PNG.")
+    query_parser.add_argument("--archive", help="Query with a palette from this archive (with --name).")
+    query_parser.add_argument("--name", help="Name of the palette in --archive.")
+    query_parser.add_argument("--epsilon", type=float, help="Return every palette within this RMS OKLab distance.")
+    query_parser.add_argument("--k", type=int, default=10, help="Return the k most similar palettes (default: 10).")
+    args = parser.parse_args(argv)
+    if args.command == "query" and args.k < 1:
+        parser.error("--k must be at least 1.")
+
+    if args.command == "build":
+        grid_cols, grid_rows = args.grid
+        try:
+            index = build_index(args.sources, grid_rows, grid_cols)
+        except (OSError, ValueError) as e:
+            print(f"Error building index: {e}")
+            return 1
+        index.save(args.index)
+        print(f"Indexed {len(index)} palettes of {grid_cols}x{grid_rows} into {args.index}")
+        return 0
+
+    index = PaletteIndex.load(args.index)
+    if args.png:
+        rgb = _png_rgb(args.png, index.grid_rows, index.grid_cols)
+    elif args.archive and args.name:
+        archive = palette_archive.PaletteArchive(args.archive)
+        matches = archive.select(names=[args.name])
+        rgb = archive.rgb(matches[0]) if len(matches) and (archive.grid_cols, archive.grid_rows) == (index.grid_cols, index.grid_rows) else None
+    else:
+        parser.error("Pass --png, or --archive with --name.")
+    if rgb is None:
+        print(f"The query palette was not found or is not {index.grid_cols}x{index.grid_rows}.")
+        return 1
+
+    results = index.within(rgb, args.epsilon) if args.epsilon is not None else index.nearest(rgb, args.k)
+    for name, distance in results:
+        print(f"{distance:10.5f}  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
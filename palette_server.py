@@ -0,0 +1,317 @@
+"""Long-running local palette service, so scripts don't pay interpreter, numpy and mf_twister startup per call.
+
+    python palette_server.py --port 8765
+    curl -s localhost:8765/generate -H 'Content-Type: application/json' -d '{"strategy": "tetradic", "grid": "16x4", "seed": 7, "count": 100}' -o palettes.rgb
+
+Endpoints:
+    GET  /health       {"status": "ok", "requests": <served so far>}
+    GET  /strategies   {"strategies": [...], "max_grid_size": 64}
+    POST /generate     JSON request, fields:
+        strategy     required, any registered strategy name (including plugins) except from_image
+        grid         "COLSxROWS" (default "16x4")
+        seed         master seed, 0 to 2**64 - 1 (default random); palette i is derive_seed(seed, first_index + i), as in bulk_generate
+        first_index  index of the first palette (default 0)
+        count        number of palettes, 1 to MAX_REQUEST_PALETTES (count * cells at most MAX_JSON_CELLS for "json")
+        hue_shifts   per-row hue shifts in degrees, 0 to 360, at most one per row (default none)
+        oversample   candidates per palette, keeping the best-scoring one, 1 to palette_quality.MAX_OVERSAMPLE (default 1)
+        twister_leds true to snap every color to the nearest MIDI Fighter Twister LED color (default false)
+        output       "packed" (default): raw RGB bytes, count * rows * cols * 3, row-major, streamed as generated
+                     "json": {"palettes": [{"seed": ..., "colors": ["#rrggbb", ...]}, ...]}
+                     "files": PNGs written like bulk_generate, {"written": ..., "skipped": ..., "output_dir": ...}
+        output_dir   for "files": a folder inside the Bitwig Color Palettes folder, absolute or relative to it
+                     (default: the generated_palettes subfolder)
+        dedup        for "files": "exact" (default), "near" or "off"
+The request must be sent with Content-Type: application/json. Browsers can't send that cross-site without a
+CORS preflight, so a web page can't drive the server. Successful /generate responses carry X-Master-Seed and X-Palette-Grid headers. Errors are JSON {"error": ...} (status 400 for bad requests).
+Integer fields must be JSON integers and twister_leds a JSON boolean; 7.9, "7" and "false" are rejected rather than
+coerced. If generation fails partway through a packed response, the connection is closed after a short body.
+
+Requests are served on their own threads. Strategies, the mf_twister table and the SQLite connections
+(one per thread) stay loaded between requests; the counter and duplicate databases live in the server's CWD.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import bulk_generate
+import filename_allocator
+import instrumentation
+import palette_dedup
+import palette_engine
+import palette_quality
+import palette_stream
+import palettegenv2
+import strategy_registry
+import twister_lut
+
+DEFAULT_HOST = "127.0.0.1" # Local use only; there is no authentication
+DEFAULT_PORT = 8765
+MAX_REQUEST_PALETTES = 100000
+MAX_REQUEST_BYTES = 64 * 1024 # Largest accepted request body
+MAX_JSON_CELLS = 1 << 20 # count * cells limit for "json" output, which is built in memory
+MAX_SEED = 2**64 - 1
+OUTPUT_FORMATS = ("packed", "json", "files")
+
+
+class RequestError(ValueError):
+    """A malformed or unsupported generation request; reported to the client as a 400."""
+
+
+def _integer(payload, field, default):
+    """payload[field] as an int (`default` if absent); floats, numeric strings and booleans are rejected."""
+    value = payload.get(field, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise RequestError(f"{field} must be an integer.")
+    return value
+
+
+def parse_request(payload):
+    """Validate a /generate request body (a dict) and fill in defaults; raises RequestError."""
+    if not isinstance(payload, dict):
+        raise RequestError("Request body must be a JSON object.")
+    strategy = payload.get("strategy")
+    if not isinstance(strategy, str) or strategy_registry.get(strategy) is None:
+        raise RequestError(f"Unknown strategy {strategy!r}.")
+    if strategy == "from_image":
+        raise RequestError("from_image needs a reference image and is only available in the interactive generator.")
+    grid = palettegenv2.parse_grid_size(str(payload.get("grid", "16x4")))
+    if grid is None:
+        raise RequestError(f"Invalid grid {payload.get('grid')!r}. Use COLSxROWS, at most {palettegenv2.MAX_GRID_SIZE}x{palettegenv2.MAX_GRID_SIZE}.")
+    grid_cols, grid_rows = grid
+    if strategy == "mf_twister" and not palettegenv2.mf_twister_colors_loaded(grid_rows, grid_cols):
+        raise RequestError(f"mf_twister colors are not available for a {grid_cols}x{grid_rows} grid.")
+
+    seed = payload.get("seed")
+    request = {
+        "strategy": strategy,
+        "grid_cols": grid_cols,
+        "grid_rows": grid_rows,
+        "master_seed": random.SystemRandom().randrange(2**32) if seed is None else _integer(payload, "seed", None),
+        "first_index": _integer(payload, "first_index", 0),
+        "count": _integer(payload, "count", 1),
+        "oversample": _integer(payload, "oversample", 1),
+        "twister_leds": payload.get("twister_leds", False),
+    }
+    if not isinstance(request["twister_leds"], bool):
+        raise RequestError("twister_leds must be true or false.")
+    hue_shifts_degrees = payload.get("hue_shifts", [])
+    if not isinstance(hue_shifts_degrees, list) or not all(isinstance(shift, (int, float)) and not isinstance(shift, bool) for shift in hue_shifts_degrees):
+        raise RequestError("hue_shifts must be a list of numbers.")
+    if not 1 <= request["count"] <= MAX_REQUEST_PALETTES:
+        raise RequestError(f"count must be between 1 and {MAX_REQUEST_PALETTES}.")
+    if not 0 <= request["master_seed"] <= MAX_SEED:
+        raise RequestError(f"seed must be between 0 and {MAX_SEED}.")
+    if request["first_index"] < 0:
+        raise RequestError("first_index must be >= 0.")
+    if not 1 <= request["oversample"] <= palette_quality.MAX_OVERSAMPLE:
+        raise RequestError(f"oversample must be between 1 and {palette_quality.MAX_OVERSAMPLE}.")
+    if len(hue_shifts_degrees) > grid_rows or not all(0 <= shift <= 360 for shift in hue_shifts_degrees):
+        raise RequestError(f"hue_shifts must hold at most {grid_rows} values between 0 and 360.")
+    request["hue_shifts"] = bulk_generate.unit_hue_shifts([float(shift) for shift in hue_shifts_degrees], grid_rows)
+
+    request["output"] = payload.get("output", "packed")
+    if request["output"] not in OUTPUT_FORMATS:
+        raise RequestError(f"output must be one of {', '.join(OUTPUT_FORMATS)}.")
+    if request["output"] == "json" and request["count"] * grid_rows * grid_cols > MAX_JSON_CELLS:
+        raise RequestError(f"json output is limited to {MAX_JSON_CELLS} cells (count * columns * rows); use packed output for more.")
+    request["output_dir"] = resolve_output_dir(payload.get("output_dir"))
+    request["dedup"] = payload.get("dedup", "exact")
+    if request["dedup"] not in palette_dedup.DEDUP_MODES:
+        raise RequestError(f"dedup must be one of {', '.join(palette_dedup.DEDUP_MODES)}.")
+    return request
+
+
+def resolve_output_dir(output_dir):
+    """Resolve a requested output folder; it must lie inside the Bitwig Color Palettes folder (RequestError otherwise)."""
+    base = os.path.realpath(palettegenv2.BITWIG_PALETTE_DIR)
+    if not output_dir:
+        return os.path.join(base, palettegenv2.GENERATED_PALETTES_SUBFOLDER)
+    if not isinstance(output_dir, str):
+        raise RequestError("output_dir must be a string.")
+    resolved = os.path.realpath(os.path.join(base, os.path.expanduser(output_dir)))
+    if os.path.commonpath([base, resolved]) != base:
+        raise RequestError(f"output_dir must be inside {palettegenv2.BITWIG_PALETTE_DIR}.")
+    return resolved
+
+
+def generate(request):
+    """Yield (seed, packed RGB bytes) for a parsed request."""
+    seeds = palette_stream.iter_seeds(request["master_seed"], request["first_index"], request["count"])
+    return palette_stream.generate_palettes(request["strategy"], request["grid_rows"], request["grid_cols"], seeds,
+                                            request["hue_shifts"], oversample=request["oversample"], twister_leds=request["twister_leds"])
+
+
+def write_files(request):
+    """Generate a request's palettes as PNGs through bulk_generate's work unit; returns the number written."""
+    os.makedirs(request["output_dir"], exist_ok=True)
+    unit = {
+        "strategy": request["strategy"],
+        "grid_cols": request["grid_cols"],
+        "grid_rows": request["grid_rows"],
+        "master_seed": request["master_seed"],
+        "first_index": request["first_index"],
+        "count": request["count"],
+        "filenames": filename_allocator.allocate_filenames(request["strategy"], request["count"]),
+    }
+    hue_shifts_degrees = [shift * 360.0 for shift in request["hue_shifts"]]
+    return bulk_generate.run_work_unit(unit, request["output_dir"], hue_shifts_degrees, dedup=request["dedup"],
+                                       oversample=request["oversample"], twister_leds=request["twister_leds"])
+
+
+class PaletteRequestHandler(BaseHTTPRequestHandler):
+    server_version = "PaletteServer/1.0"
+    protocol_version = "HTTP/1.1" # Keep-alive, so a script can send many requests over one connection
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def log_error(self, format, *args):
+        super().log_message(format, *args) # Errors are logged even without --verbose
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.count_request()
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok", "requests": self.server.requests_served})
+        elif self.path == "/strategies":
+            self.send_json(200, {"strategies": [name for name in strategy_registry.names() if name != "from_image"], "max_grid_size": palettegenv2.MAX_GRID_SIZE})
+        else:
+            self.send_json(404, {"error": f"No such endpoint: {self.path}"})
+
+    def do_POST(self):
+        self.server.count_request()
+        if self.path != "/generate":
+            self.close_connection = True
+            self.send_json(404, {"error": f"No such endpoint: {self.path}"})
+            return
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self.close_connection = True
+            self.send_json(415, {"error": "Requests must be sent with Content-Type: application/json."})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if not 0 < length <= MAX_REQUEST_BYTES:
+                raise RequestError(f"Request body must be between 1 and {MAX_REQUEST_BYTES} bytes.")
+            try:
+                payload = json.loads(self.rfile.read(length))
+            except ValueError:
+                raise RequestError("Request body is not valid JSON.")
+            request = parse_request(payload)
+        except RequestError as e:
+            self.close_connection = True # The body may not have been read
+            self.send_json(400, {"error": str(e)})
+            return
+
+        headers = {"X-Master-Seed": str(request["master_seed"]), "X-Palette-Grid": f"{request['grid_cols']}x{request['grid_rows']}"}
+        with instrumentation.stage(f"server.{request['output']}"):
+            if request["output"] == "files":
+                try:
+                    written = write_files(request)
+                except OSError as e:
+                    self.send_json(500, {"error": f"Could not write palettes: {e}"}, headers)
+                    return
+                self.send_json(200, {"written": written, "skipped": request["count"] - written, "output_dir": request["output_dir"],
+                                     "master_seed": request["master_seed"]}, headers)
+            elif request["output"] == "json":
+                palettes = [{"seed": seed, "colors": [f"#{rgb[i:i + 3].hex().upper()}" for i in range(0, len(rgb), 3)]}
+                            for seed, rgb in generate(request)]
+                self.send_json(200, {"master_seed": request["master_seed"], "palettes": palettes}, headers)
+            else:
+                self.send_packed(request, headers)
+
+    def send_packed(self, request, headers):
+        """Stream the packed palettes batch by batch; the length is known up front, so nothing is buffered.
+
+        The first batch is generated before the status line, so a request that fails outright gets a 500. A
+        failure later on closes the connection, leaving a body shorter than its Content-Length.
+        """
+        batches = palette_stream.batched(generate(request), palette_stream.DEFAULT_BATCH_SIZE)
+        try:
+            first_batch = next(batches, [])
+        except Exception as e:
+            self.close_connection = True
+            self.send_json(500, {"error": f"Could not generate palettes: {e}"}, headers)
+            return
+        length = request["count"] * request["grid_rows"] * request["grid_cols"] * 3
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        sent = 0
+        try:
+            for batch in itertools.chain([first_batch], batches):
+                data = b"".join(rgb for _, rgb in batch)
+                self.wfile.write(data)
+                sent += len(data)
+        except Exception as e:
+            self.log_error("Packed response cut off after %d of %d bytes: %r", sent, length, e)
+            self.close_connection = True # The client sees a short body instead of waiting for the rest
+
+
+class PaletteServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that counts the requests it has served."""
+    daemon_threads = True
+
+    def __init__(self, address, verbose=False):
+        super().__init__(address, PaletteRequestHandler)
+        self.verbose = verbose
+        self.requests_served = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests_served += 1
+
+
+def warm_up():
+    """Load everything a first request would otherwise pay for: numpy, the engine, the mf_twister table and LED LUT."""
+    palettegenv2.get_mf_twister_packed()
+    for strategy in palettegenv2.get_random_strategies():
+        palettegenv2.generate_palette_batch(4, 16, strategy, [0.0] * 4, [0])
+    palette_engine.derive_seed(0, 0)
+    twister_lut.load_lut()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve palette generation over HTTP on this machine.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to bind (default: {DEFAULT_HOST}).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT}).")
+    parser.add_argument("--verbose", action="store_true", help="Log every request to stderr.")
+    args = parser.parse_args(argv)
+
+    warm_up()
+    try:
+        server = PaletteServer((args.host, args.port), args.verbose)
+    except OSError as e:
+        print(f"Error: cannot listen on {args.host}:{args.port}: {e}")
+        return 1
+    print(f"Serving palettes on http://{args.host}:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Streaming palette pipeline: seed -> strategy -> pack -> encode -> write.
+
+Palettes are generated lazily in small batches and handed to a PaletteWriter, whose thread encodes and
+writes PNGs while the next batch is generated. The writer's queue is bounded, so memory stays flat no
+matter how many palettes a run produces, and generation pauses whenever the disk falls behind.
+Nothing is printed per palette.
+"""
+import itertools
+import os
+import queue
+import threading
+
+import numpy as np
+
+import palette_engine
+import palette_quality
+import palettegenv2
+import twister_lut
+
+DEFAULT_BATCH_SIZE = 256 # Palettes generated per array pass
+DEFAULT_QUEUE_SIZE = 64 # Palettes waiting for the writer thread
+
+_STOP = object()
+
+
+def iter_seeds(master_seed, first_index=0, count=None):
+    """Per-palette seeds derived from `master_seed`, starting at `first_index` (endless if count is None)."""
+    indices = itertools.count(first_index) if count is None else range(first_index, first_index + count)
+    for index in indices:
+        yield palette_engine.derive_seed(master_seed, index)
+
+
+def batched(iterable, size):
+    """Yield lists of up to `size` items from `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def candidate_seeds(seed, oversample):
+    """Seeds of the `oversample` candidates a palette is picked from; the first is the palette's own seed."""
+    return [seed] + [palette_engine.derive_seed(seed, candidate) for candidate in range(1, oversample)]
+
+
+def generate_palettes(strategy, grid_rows, grid_cols, seeds, hue_shifts=None, batch_size=DEFAULT_BATCH_SIZE, oversample=1, twister_leds=False):
+    """Yield (seed, packed RGB bytes) for every seed, generating `batch_size` palettes at a time.
+
+    With oversample > 1 each seed stands for `oversample` candidates (see candidate_seeds); the one with
+    the best palette_quality score is yielded under its own seed, so it can still be regenerated.
+    twister_leds=True snaps every color to the nearest MIDI Fighter Twister LED color (see twister_lut).
+    Stops early (after yielding nothing) if the strategy cannot produce this grid.
+    """
+    hue_shifts = hue_shifts if hue_shifts is not None else [0.0] * grid_rows
+    for batch in batched(seeds, max(1, batch_size // oversample)):
+        if oversample > 1:
+            batch = [candidate for seed in batch for candidate in candidate_seeds(seed, oversample)]
+            stack, hsv = palettegenv2.generate_palette_batch(grid_rows, grid_cols, strategy, hue_shifts, batch, with_hsv=True)
+            if stack is None:
+                return
+            scores = palette_quality.quality_score(palette_quality.score_palettes(stack, hsv), grid_rows * grid_cols)
+            chosen = palette_quality.best_of_groups(scores, oversample)
+            batch, stack = np.asarray(batch, dtype=object)[chosen], stack[chosen]
+        else:
+            stack = palettegenv2.generate_palette_batch(grid_rows, grid_cols, strategy, hue_shifts, batch)
+            if stack is None:
+                return
+        if twister_leds:
+            stack = twister_lut.snap_to_leds(stack)
+        for seed, rgb in zip(batch, stack):
+            yield seed, rgb.tobytes()
+
+
+class PaletteWriter:
+    """Encode and write palette PNGs on a background thread, fed through a bounded queue.
+
+    Use as a context manager; leaving the block waits for every queued palette to be written.
+    An error in the writer thread is re-raised from the next submit() or from close().
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, use_pil=False):
+        self.use_pil = use_pil
+        self.written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="palette-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self._error is not None:
+                continue # Keep draining so submit() never blocks forever
+            filepath, rgb, grid_rows, grid_cols, metadata = item
+            try:
+                palettegenv2.save_palette_png(rgb, grid_rows, grid_cols, filepath, self.use_pil, metadata)
+                self.written += 1
+            except Exception as e:
+                self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, filepath, rgb, grid_rows, grid_cols, metadata=None):
+        """Queue one palette for writing; blocks while the queue is full."""
+        self._raise_error()
+        self._queue.put((filepath, rgb, grid_rows, grid_cols, metadata))
+
+    def close(self):
+        """Wait until every queued palette is written."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_palettes(palettes, filenames, output_dir, grid_rows, grid_cols, metadata_for=None,
+                   queue_size=DEFAULT_QUEUE_SIZE, use_pil=False):
+    """Write (seed, rgb) palettes to output_dir under the given filenames; returns the number written.
+
+    `metadata_for(position, seed)` builds the PNG text metadata of each palette (none if omitted).
+    """
+    with PaletteWriter(queue_size, use_pil) as writer:
+        for position, ((seed, rgb), filename) in enumerate(zip(palettes, filenames)):
+            metadata = metadata_for(position, seed) if metadata_for else None
+            writer.submit(os.path.join(output_dir, filename), rgb, grid_rows, grid_cols, metadata)
+    return writer.written
@@ -0,0 +1,236 @@
+"""Incremental sync of a palette library into the Bitwig Color Palettes folder.
+
+The library is any mix of .bwpal archives and folders of palette PNGs. The target folder keeps a
+manifest (MANIFEST_FILE) with the content hash, size and mtime of every PNG the sync wrote. A sync:
+    1. scans the target once with os.scandir; a file whose size and mtime still match its manifest entry
+       is trusted without being opened,
+    2. hashes the library: archive records straight from the memory map, PNG files only when their own
+       size or mtime changed since the last sync (the source stat is cached in the manifest too),
+    3. writes only the palettes that are new or whose hash changed, and with --prune removes the files the
+       manifest owns that are no longer in the library. Files the sync never wrote are left alone: a library
+       palette whose name is taken by such a file is reported as a conflict and not written.
+Pruning refuses to run when the library is empty or would remove most of the synced palettes (a mistyped
+source looks exactly like that) unless --force is given.
+Updating a large library therefore costs one directory scan plus work proportional to the changes.
+
+    python palette_sync.py palettes.bwpal more_palettes/ [--target DIR] [--prune [--force]] [--dry-run]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import palette_archive
+import palette_stream
+import palettegenv2
+
+MANIFEST_FILE = ".palette_sync_manifest.json"
+MANIFEST_VERSION = 1
+HASH_CHUNK = 1 << 20 # Bytes read per step when hashing a source PNG
+MAX_PRUNE_FRACTION = 0.5 # --prune removing more than this share of the synced palettes needs --force
+
+
+class SyncError(ValueError):
+    """A source is missing or unusable, or the sync would remove too much without --force."""
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def scan_pngs(folder):
+    """{file name: (size, mtime_ns)} for the PNGs directly inside `folder` ({} if it doesn't exist)."""
+    try:
+        entries = os.scandir(folder)
+    except FileNotFoundError:
+        return {}
+    files = {}
+    with entries:
+        for entry in entries:
+            if entry.name.lower().endswith(".png") and entry.is_file():
+                stat = entry.stat() # Cached by the DirEntry; free on Windows, one stat call elsewhere
+                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def load_manifest(target):
+    """The target folder's manifest as {file name: entry}; empty if missing or unreadable."""
+    try:
+        with open(os.path.join(target, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def save_manifest(target, files):
+    """Write the manifest atomically, so an interrupted sync never leaves a half-written one."""
+    path = os.path.join(target, MANIFEST_FILE)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": files}, f, separators=(",", ":"), sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def _hash_file(path):
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def check_sources(sources):
+    """Raise SyncError unless every source is an existing folder, .png file or .bwpal file."""
+    for source in sources:
+        if os.path.isdir(source):
+            continue
+        if not os.path.isfile(source):
+            raise SyncError(f"Source '{source}' does not exist.")
+        if not source.lower().endswith((".png", palette_archive.ARCHIVE_EXTENSION)):
+            raise SyncError(f"Source '{source}' is not a folder, a .png file or a {palette_archive.ARCHIVE_EXTENSION} archive.")
+
+
+def library_palettes(sources, manifest):
+    """{file name: source} for every palette in the library; the first source to use a name wins.
+
+    A source is ("archive", archive, index, hash) or ("png", path, (size, mtime_ns), hash).
+    """
+    check_sources(sources)
+    palettes = {}
+    for source in sources:
+        if source.lower().endswith(palette_archive.ARCHIVE_EXTENSION):
+            archive = palette_archive.PaletteArchive(source)
+            prefix = f"{archive.grid_cols}x{archive.grid_rows}:".encode()
+            records = archive.records
+            for index in range(len(archive)):
+                record = records[index]
+                name = record["name"].decode("utf-8") + ".png"
+                if name not in palettes:
+                    # Strategy and seed end up in the PNG metadata, so they are part of the content
+                    data = prefix + record["strategy"] + b":" + str(int(record["seed"])).encode() + b":" + record["rgb"].tobytes()
+                    palettes[name] = ("archive", archive, index, _digest(data))
+            continue
+        folder, names = (source, None) if os.path.isdir(source) else (os.path.dirname(source) or ".", {os.path.basename(source)})
+        for name, stat in sorted(scan_pngs(folder).items()):
+            if name in palettes or (names is not None and name not in names):
+                continue
+            path = os.path.join(folder, name)
+            entry = manifest.get(name)
+            if entry and entry.get("source") == [path, *stat]:
+                digest = entry["hash"] # Unchanged since the last sync: no need to read it
+            else:
+                digest = _hash_file(path)
+            palettes[name] = ("png", path, stat, digest)
+    return palettes
+
+
+def plan_sync(palettes, current, manifest):
+    """Split the sync into (names to write, names already up to date, orphaned names the manifest owns,
+    conflicting names: library palettes whose name is taken by a file the sync didn't write)."""
+    to_write, unchanged, conflicts = [], [], []
+    for name, source in palettes.items():
+        entry = manifest.get(name)
+        if entry is None and name in current:
+            conflicts.append(name)
+            continue
+        up_to_date = entry is not None and entry["hash"] == source[3] and current.get(name) == (entry["size"], entry["mtime_ns"])
+        (unchanged if up_to_date else to_write).append(name)
+    orphans = sorted(name for name in manifest if name not in palettes and name in current)
+    return sorted(to_write), unchanged, orphans, sorted(conflicts)
+
+
+def _write_archive_palettes(archive, names_and_indices, target, use_pil):
+    """Export the chosen archive records to `target` under the given file names."""
+    indices = [index for _, index in names_and_indices]
+    palettes = ((archive.seed(index), archive.rgb(index)) for index in indices)
+
+    def metadata_for(position, seed):
+        return palettegenv2.palette_metadata(archive.strategy(indices[position]), seed, archive.grid_rows, archive.grid_cols)
+
+    palette_stream.write_palettes(palettes, [name for name, _ in names_and_indices], target, archive.grid_rows, archive.grid_cols,
+                                  metadata_for, use_pil=use_pil)
+
+
+def sync(sources, target, prune=False, dry_run=False, use_pil=False, force=False):
+    """Bring `target` in line with the library; returns a dict of counts (written, unchanged, removed, orphans)
+    plus the list of conflicting names. Raises SyncError for bad sources and for unsafe prunes without `force`."""
+    manifest = load_manifest(target)
+    current = scan_pngs(target)
+    palettes = library_palettes(sources, manifest)
+    to_write, unchanged, orphans, conflicts = plan_sync(palettes, current, manifest)
+    if prune and orphans and not force:
+        if not palettes:
+            raise SyncError(f"The library is empty; refusing to remove all {len(orphans)} synced palettes (use --force).")
+        if len(orphans) > MAX_PRUNE_FRACTION * len(manifest):
+            raise SyncError(f"Pruning would remove {len(orphans)} of {len(manifest)} synced palettes; refusing without --force.")
+    result = {"written": len(to_write), "unchanged": len(unchanged), "removed": 0, "orphans": len(orphans), "conflicts": conflicts}
+    if dry_run:
+        return result
+
+    os.makedirs(target, exist_ok=True) # Ensure folder exists
+    by_archive = {}
+    for name in to_write:
+        kind, origin, detail, _ = palettes[name]
+        if kind == "archive":
+            by_archive.setdefault(id(origin), (origin, []))[1].append((name, detail))
+        else:
+            shutil.copyfile(origin, os.path.join(target, name))
+    for archive, names_and_indices in by_archive.values():
+        _write_archive_palettes(archive, names_and_indices, target, use_pil)
+
+    files = {name: manifest[name] for name in unchanged}
+    for name in to_write:
+        kind, origin, detail, digest = palettes[name]
+        stat = os.stat(os.path.join(target, name))
+        files[name] = {"hash": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                       "source": [origin, *detail] if kind == "png" else None}
+    for name in orphans:
+        if prune:
+            try:
+                os.remove(os.path.join(target, name))
+                result["removed"] += 1
+            except FileNotFoundError:
+                pass
+        else:
+            files[name] = manifest[name] # Still ours; a later --prune removes it
+    save_manifest(target, files)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync palette archives and PNG folders into the Bitwig Color Palettes folder.")
+    parser.add_argument("sources", nargs="+", help=".bwpal archives, folders of PNGs or single PNG files.")
+    parser.add_argument("--target", default=os.path.join(palettegenv2.BITWIG_PALETTE_DIR, palettegenv2.GENERATED_PALETTES_SUBFOLDER),
+                        help="Folder to sync into (default: the generated_palettes subfolder of the Bitwig Color Palettes folder).")
+    parser.add_argument("--prune", action="store_true", help="Remove previously synced palettes that are no longer in the library.")
+    parser.add_argument("--force", action="store_true", help="Allow --prune to remove most or all of the synced palettes.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change.")
+    parser.add_argument("--pil", action="store_true", help="Encode PNGs through PIL instead of the built-in writer.")
+    args = parser.parse_args(argv)
+
+    try:
+        result = sync(args.sources, args.target, args.prune, args.dry_run, args.pil, args.force)
+    except (OSError, palette_archive.ArchiveError, SyncError) as e:
+        print(f"Error: {e}")
+        return 1
+    verb = "Would write" if args.dry_run else "Wrote"
+    print(f"{verb} {result['written']} palettes, {result['unchanged']} unchanged, in {args.target}")
+    if result["conflicts"]:
+        print(f"Skipped {len(result['conflicts'])} palettes whose names are taken by files the sync didn't write:")
+        for name in result["conflicts"]:
+            print(f"  {name}")
+    if result["orphans"]:
+        if args.prune and not args.dry_run:
+            print(f"Removed {result['removed']} palettes that are no longer in the library.")
+        else:
+            print(f"{result['orphans']} synced palettes are no longer in the library (use --prune to remove them).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,62 @@
 
 # --- START OF FILE Bitwig Color Palette Generator.py ---
-from PIL import Image
 import random
 import os
 import datetime
 import colorsys
 
 from typing import List
-import json
+import sys
+import threading
+
+import instrumentation
+from instrumentation import instrumented
+from lazy_imports import lazy_module
+
+# Heavy or rarely needed modules are only executed on first use, keeping `import palettegenv2` cheap
+np = lazy_module("numpy")
+json = lazy_module("json")
+sqlite3 = lazy_module("sqlite3")
+concurrent_futures = lazy_module("concurrent.futures")
+filename_allocator = lazy_module("filename_allocator")
+palette_engine = lazy_module("palette_engine")
+palette_dedup = lazy_module("palette_dedup")
+image_palette = lazy_module("image_palette")
+strategy_registry = lazy_module("strategy_registry")
+png_writer = lazy_module("png_writer")
+twister_palette_cache = lazy_module("twister_palette_cache")
 
 # Dynamically determine the user's Documents directory and Bitwig path
 USER_DOCUMENTS = os.path.expanduser("~/Documents")
 BITWIG_PALETTE_DIR = os.path.join(USER_DOCUMENTS, "Bitwig Studio", "Color Palettes")
 GENERATED_PALETTES_SUBFOLDER = "generated_palettes" # Define subfolder name
+PREFETCH_PREVIEWS = True # Render strategy previews in a background thread while prompts are open
+SKIP_DUPLICATE_PALETTES = False # Opt-in: don't save a palette identical to one already saved in the chosen folder (see palette_dedup)
+MAX_GRID_SIZE = 64 # Largest number of columns or rows for custom grid sizes
+PREVIEW_MAX_COLS, PREVIEW_MAX_ROWS = 32, 8 # Menu previews of bigger grids show only this top-left corner
 
 MF_TWISTER_COLORS_JSON_FILE = "mf_twister_colors.json" # Filename of JSON file
-distinct_colors = [] # Initialize as empty list
-try:
-    with open(MF_TWISTER_COLORS_JSON_FILE, 'r') as f:
-        distinct_colors = json.load(f)
-except FileNotFoundError:
-    print(f"Warning: {MF_TWISTER_COLORS_JSON_FILE} not found. 'mf_twister' strategy will use default colors or might not work.")
-except json.JSONDecodeError:
-    print(f"Error decoding JSON from {MF_TWISTER_COLORS_JSON_FILE}. File might be corrupted.")
-except Exception as e:
-    print(f"Error loading colors from {MF_TWISTER_COLORS_JSON_FILE}: {e}")
+_reference_image = None # (path, downsampled pixels) the from_image strategy extracts from (see set_reference_image)
+_mf_twister_packed = None # Compiled colors as packed RGB bytes, loaded on first use (see twister_palette_cache)
+_mf_twister_lock = threading.Lock()
+
+def get_mf_twister_packed():
+    """Load the compiled mf_twister colors the first time they are needed (b"" if they are unavailable)."""
+    global _mf_twister_packed
+    with _mf_twister_lock:
+        if _mf_twister_packed is None:
+            _mf_twister_packed = b""
+            try:
+                _mf_twister_packed = twister_palette_cache.load_packed_colors(MF_TWISTER_COLORS_JSON_FILE)
+            except FileNotFoundError:
+                print(f"Warning: {MF_TWISTER_COLORS_JSON_FILE} not found. 'mf_twister' strategy will use default colors or might not work.")
+            except json.JSONDecodeError:
+                print(f"Error decoding JSON from {MF_TWISTER_COLORS_JSON_FILE}. File might be corrupted.")
+            except ValueError as e:
+                print(f"Invalid colors in {MF_TWISTER_COLORS_JSON_FILE}: {e}")
+            except Exception as e:
+                print(f"Error loading colors from {MF_TWISTER_COLORS_JSON_FILE}: {e}")
+        return _mf_twister_packed
 
 def validate_hex_color(color):
     """Validate if the input is a proper hex color code."""
@@ -55,6 +87,15 @@ def hsv_to_hex(h, s, v):
     b = int(b * 255)
     return f"#{r:02X}{g:02X}{b:02X}"
 
+def get_reference_image_input():
+    """Ask for a reference image for the from_image strategy until one loads; returns False if left empty."""
+    while True:
+        path = input("Path to a reference image (album cover, screenshot, photo; empty to go back): ").strip().strip("'\"")
+        if not path:
+            return False
+        if set_reference_image(os.path.expanduser(path)):
+            return True
+
 def get_hue_shifts_input(num_rows):
     """Asks user if they want to shift hues per row and gets shift values in degrees."""
     hue_shifts_degrees = [0] * num_rows # Default no shift
@@ -89,359 +130,174 @@ def create_empty_palette(grid_rows, grid_cols) -> List[List[str]]:
         ["" for _ in range(grid_cols)] for _ in range(grid_rows)
     ]
 
-def distinct_hues_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using distinct hues strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    # distinct hues with lightness variations by row
-    base_hues = [(i / grid_cols + random.random() * 0.03) % 1.0 for i in range(grid_cols)] # Adjusted for grid_cols
-    random.shuffle(base_hues)  # Shuffle for unpredictability
-
-    for col in range(grid_cols):
-        base_hue = base_hues[col]
-        for row in range(grid_rows):
-            # Apply row-specific hue shift and user hue shift
-            shifted_hue = (base_hue + row_shifts[row] + hue_shifts[row]) % 1.0
-
-            # Vary saturation and value by row
-            saturation = 0.3 + row * (0.6 / grid_rows) + random.random() * 0.15 # Adjusted saturation range and row scaling
-            value = 0.9 - row * (0.5 / grid_rows) + random.random() * 0.1 # Adjusted value range and row scaling
-
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
-
-def split_complementary_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using split complementary strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    base_hue = random.random()
-    complement1 = (base_hue + 0.5 - 0.05) % 1.0
-    complement2 = (base_hue + 0.5 + 0.05) % 1.0
-    hues = [base_hue] * (grid_cols // 4 + 2) + [ # Increased base hue count, adjusted for grid_cols
-        (base_hue + 0.02) % 1.0,
-        (base_hue - 0.02) % 1.0,
-        complement1,
-        (complement1 + 0.03) % 1.0,
-        complement2,
-        (complement2 - 0.03) % 1.0,
-        (complement1 - 0.03) % 1.0, # Added more variations to fill grid_cols
-        (complement2 + 0.03) % 1.0,
-        base_hue, # Re-add base hue for more cols
-        complement1, # Re-add complements
-        complement2
-    ]
-    while len(hues) < grid_cols: # Ensure enough hues for grid_cols
-        hues.extend(hues[:])
-    hues = hues[:grid_cols]
-    random.shuffle(hues)
-    for col in range(grid_cols):
-        for row in range(grid_rows):
-            # Apply row-specific hue shift and user hue shift
-            shifted_hue = (hues[col % len(hues)] + row_shifts[row] + hue_shifts[row]) % 1.0 # Use modulo for hue selection
-
-            saturation = 0.4 + row * (0.5 / grid_rows) + random.random() * 0.1 # Adjusted saturation range and row scaling
-            value = 0.9 - row * (0.5 / grid_rows) + random.random() * 0.1 # Adjusted value range and row scaling
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
-
-def triadic_variations_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using triadic variations strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    hue1 = random.random()
-    hue2 = (hue1 + 0.33) % 1.0
-    hue3 = (hue1 + 0.66) % 1.0
-
-    # Create variations of each hue, more variations for grid_cols
-    hue_variations = []
-    for hue in [hue1, hue2, hue3]:
-        hue_variations.extend([
-            hue,
-            (hue + 0.02) % 1.0,
-            (hue - 0.02) % 1.0,
-            (hue + 0.04) % 1.0, # Added more variations
-            (hue - 0.04) % 1.0
-        ])
-    while len(hue_variations) < grid_cols: # Ensure enough hues for grid_cols
-        hue_variations.extend(hue_variations[:]) # Duplicate to fill if needed
-    hue_variations = hue_variations[:grid_cols] # Trim to grid_cols
-
-    random.shuffle(hue_variations)
-
-    for col in range(grid_cols):
-        for row in range(grid_rows):
-            # Apply row-specific hue shift and user hue shift
-            shifted_hue = (hue_variations[col] + row_shifts[row] + hue_shifts[row]) % 1.0
-
-            # Vary saturation and value differently for each row
-            saturation = 0.4 + row * (0.5 / grid_rows) + random.random() * 0.15 # Adjusted saturation range and row scaling
-            value = 0.9 - row * (0.5 / grid_rows) + random.random() * 0.1 # Adjusted value range and row scaling
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
-
-def analogous_extended_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using analogous extended strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    start_hue = random.random()
-    hue_range = 0.4  # Slightly wider range for grid_cols columns
-
-    for col in range(grid_cols):
-        hue_offset = (col / grid_cols) * hue_range
-        base_hue = (start_hue + hue_offset) % 1.0
-
-        # Vary saturation and value for each row
-        for row in range(grid_rows):
-            # Apply row-specific hue shift and user hue shift
-            shifted_hue = (base_hue + row_shifts[row] + hue_shifts[row]) % 1.0
-
-            saturation = 0.5 + row * (0.4 / grid_rows) + random.random() * 0.15 # Adjusted saturation range and row scaling
-            value = 0.9 - row * (0.5 / grid_rows) + random.random() * 0.1 # Adjusted value range and row scaling
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
-
-def monochromatic_columns_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using monochromatic columns strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    for col in range(grid_cols):
-        base_hue = random.random()
-
-        # Create shades in the column with hue shifts
-        for row in range(grid_rows):
-            # Apply row-specific hue shift and user hue shift
-            shifted_hue = (base_hue + row_shifts[row] + hue_shifts[row]) % 1.0
-
-            saturation = 0.3 + row * (0.6 / grid_rows) + random.random() * 0.1 # Adjusted saturation range and row scaling
-            value = 0.95 - row * (0.6 / grid_rows) + random.random() * 0.1 # Adjusted value range and row scaling
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
+def _engine_palette(builder, grid_rows, grid_cols, row_shifts, hue_shifts, rng) -> List[List[str]]:
+    """Run a vectorized strategy from palette_engine with the given rng and return its hex grid."""
+    rgb = palette_engine.generate_rgb(builder, rng, grid_rows, grid_cols, row_shifts, hue_shifts)
+    with instrumentation.stage("hex_format"):
+        return palette_engine.rgb8_to_hex_grid(rgb)
 
-def warm_cool_contrast_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using warm cool contrast strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    warm_hues = [random.uniform(0.95, 0.15) for _ in range(grid_cols // 2 + 1)]  # Increased warm hues, adjusted for grid_cols
-    cool_hues = [random.uniform(0.4, 0.7) for _ in range(grid_cols - (grid_cols // 2 + 1))]    # Increased cool hues, adjusted for grid_cols
-
-    all_hues = warm_hues + cool_hues
-    random.shuffle(all_hues)
-
-    for col in range(grid_cols):
-        base_hue = all_hues[col]
-
-        # Create variations by row with hue shifts
-        for row in range(grid_rows):
-            # Apply row-specific hue shift and user hue shift
-            shifted_hue = (base_hue + row_shifts[row] + hue_shifts[row]) % 1.0
+def mf_twister_colors_loaded(grid_rows, grid_cols):
+    """Check that the JSON colors were loaded and cover the whole grid."""
+    color_count = len(get_mf_twister_packed()) // 3
+    return color_count in twister_palette_cache.VALID_COLOR_COUNTS and color_count >= grid_rows * grid_cols
 
-            saturation = 0.5 + row * (0.4 / grid_rows) + random.random() * 0.1 # Adjusted saturation range and row scaling
-            value = 0.9 - row * (0.5 / grid_rows) + random.random() * 0.1 # Adjusted value range and row scaling
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
+def mf_twister_rgb(grid_rows, grid_cols):
+    """The precompiled mf_twister colors laid out column by column, as a (grid_rows, grid_cols, 3) uint8 array."""
+    return twister_palette_cache.layout_grid(get_mf_twister_packed(), grid_rows, grid_cols)
 
-def pastel_dark_contrast_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using pastel dark contrast strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    hues = [random.random() for _ in range(grid_cols)]
-
-    for col in range(grid_cols):
-        for row in range(grid_rows):
-            # Apply row-specific hue shift and user hue shift
-            shifted_hue = (hues[col] + row_shifts[row] + hue_shifts[row]) % 1.0
-
-            if row <= grid_rows // 2 -1 : # First half rows pastel
-                # Pastels (high value, low saturation)
-                saturation = 0.2 + random.random() * 0.2
-                value = 0.9 + random.random() * 0.1
-            else: # Last half rows deep/dark
-                # Deep/dark (high saturation, low value)
-                saturation = 0.7 + random.random() * 0.2
-                value = 0.4 + random.random() * 0.2
-
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
-
-def random_with_harmony_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using random with harmony strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    for col in range(grid_cols):
-        # Pick a random hue for each column
-        base_hue = random.random()
-
-        for row in range(grid_rows):
-            # Apply row-specific hue shift and user hue shift
-            shifted_hue = (base_hue + row_shifts[row] + hue_shifts[row]) % 1.0
-
-            # Pattern for saturation and value across rows
-            if row == 0: # Top row: lighter
-                saturation = random.uniform(0.2, 0.5)
-                value = random.uniform(0.85, 1.0)
-            elif row == 1: # Second row: medium light
-                saturation = random.uniform(0.4, 0.7)
-                value = random.uniform(0.7, 0.9)
-            elif grid_rows >= 3 and row == 2: # Third row: medium dark
-                saturation = random.uniform(0.6, 0.9)
-                value = random.uniform(0.55, 0.75)
-            elif grid_rows >= 4 and row == 3: # Bottom row: deeper
-                saturation = random.uniform(0.8, 1.0)
-                value = random.uniform(0.4, 0.6)
-            else: # For more rows, fall back to medium
-                saturation = random.uniform(0.5, 0.8)
-                value = random.uniform(0.6, 0.8)
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
-
-def complementary_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using complementary strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    base_hue = random.random()
-    complement_hue = (base_hue + 0.5) % 1.0
-    hues = [base_hue] * (grid_cols // 2) + [complement_hue] * (grid_cols - (grid_cols // 2)) # Equal number of base and complement, adjusted for grid_cols
-    random.shuffle(hues)
-
-    for col in range(grid_cols):
-        base_hue = hues[col]
-        for row in range(grid_rows):
-            shifted_hue = (base_hue + row_shifts[row] + hue_shifts[row]) % 1.0
-            saturation = 0.4 + row * (0.5 / grid_rows) + random.random() * 0.1 # Adjusted saturation range and row scaling
-            value = 0.85 - row * (0.5 / grid_rows) + random.random() * 0.1 # Adjusted value range and row scaling
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
-
-def shades_of_gray_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using shades of gray strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    base_hue = random.uniform(0, 1) # slight tint
-    for col in range(grid_cols):
-        for row in range(grid_rows):
-            shifted_hue = (base_hue + row_shifts[row] * 0.5 + hue_shifts[row]) % 1.0 # Less hue shift
-            saturation = 0.03 + random.random() * 0.03 # Very low saturation
-            value = 0.15 + (col / grid_cols) * 0.7 + (row / grid_rows) * 0.15 # Adjusted value range for rows and grid_cols
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
-
-def tetradic_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using tetradic strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    base_hue = random.random()
-    hue2 = (base_hue + 0.25) % 1.0 # Adjusted for tetradic (90 degrees)
-    hue3 = (base_hue + 0.5) % 1.0
-    hue4 = (base_hue + 0.75) % 1.0
-    hues = [base_hue] * (grid_cols // 4 + 1) + [hue2] * (grid_cols // 4) + [hue3] * (grid_cols // 4) + [hue4] * (grid_cols - 3*(grid_cols // 4 + 1)) # Four of each hue, adjusted for grid_cols
-    while len(hues) < grid_cols: # Ensure enough hues for grid_cols
-        hues.extend(hues[:])
-    hues = hues[:grid_cols]
-    random.shuffle(hues)
-
-    for col in range(grid_cols):
-        base_hue = hues[col]
-        for row in range(grid_rows):
-            shifted_hue = (base_hue + row_shifts[row] + hue_shifts[row]) % 1.0
-            saturation = 0.4 + row * (0.5 / grid_rows) + random.random() * 0.1 # Adjusted saturation range and row scaling
-            value = 0.85 - row * (0.5 / grid_rows) + random.random() * 0.1 # Adjusted value range and row scaling
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
-
-def rainbow_desaturated_rows_palette(grid_rows, grid_cols, row_shifts, hue_shifts):
-    """Generate palette using rainbow desaturated rows strategy."""
-    palette = create_empty_palette(grid_rows, grid_cols)
-    for col in range(grid_cols):
-        hue = col / float(grid_cols) # Hue from 0 to 1 across columns (rainbow)
-        for row in range(grid_rows):
-            # Decrease saturation with each row
-            saturation = 1.0 - (row * (0.6 / grid_rows)) # Saturation from 1.0 to lower value (adjust as needed)
-            value = 0.9 # Constant value (brightness)
-            shifted_hue = (hue + hue_shifts[row]) % 1.0 # Apply user hue shift
-            palette[row][col] = hsv_to_hex(shifted_hue, saturation, value)
-    return palette
-
-def mf_twister_palette(grid_rows, grid_cols, row_shifts: List[float], hue_shifts) -> List[List[str]]:
+def mf_twister_palette(grid_rows, grid_cols, row_shifts: List[float], hue_shifts, rng) -> List[List[str]]:
     """Generate palette using pre-selected 27 or 64 maximally distinct colors from JSON file."""
     palette = create_empty_palette(grid_rows, grid_cols)
-    global distinct_colors
-    if not distinct_colors or (len(distinct_colors) != 27 and len(distinct_colors) != 64):
+    if not mf_twister_colors_loaded(grid_rows, grid_cols):
         print("Error: 27 or 64 distinct RGB colors not loaded correctly for 'mf_twister' strategy.")
         return palette # Return empty palette in case of error
 
-    hex_colors = [hsv_to_hex(*colorsys.rgb_to_hsv(r/255.0, g/255.0, b/255.0)) for r, g, b in distinct_colors]
+    return palette_engine.rgb8_to_hex_grid(mf_twister_rgb(grid_rows, grid_cols))
 
-    color_index = 0
-    for col in range(grid_cols):
-        for row in range(grid_rows):
-            palette[row][col] = hex_colors[color_index]
-            color_index += 1
-    return palette
-
-strategy_functions = {
-    "distinct_hues": distinct_hues_palette,
-    "split_complementary": split_complementary_palette,
-    "triadic_variations": triadic_variations_palette,
-    "analogous_extended": analogous_extended_palette,
-    "monochromatic_columns": monochromatic_columns_palette,
-    "warm_cool_contrast": warm_cool_contrast_palette,
-    "pastel_dark_contrast": pastel_dark_contrast_palette,
-    "random_with_harmony": random_with_harmony_palette,
-    "complementary": complementary_palette,
-    "shades_of_gray": shades_of_gray_palette,
-    "tetradic": tetradic_palette,
-    "rainbow_desaturated_rows": rainbow_desaturated_rows_palette,
-    "mf_twister": mf_twister_palette
-}
-
-def generate_random_palette(grid_rows, grid_cols, strategy, hue_shifts):
-    """Generate a palette based on the chosen strategy."""
-    # Randomize the seed for truly different results each time
-    random.seed(datetime.datetime.now().timestamp())
-
-    # Generate row hue shifts (each row has a slight hue shift)
-    row_shifts = [0.0]  # First row has no shift
-    if grid_rows >= 2: row_shifts.append(random.uniform(0.02, 0.06))  # Second row shifts slightly (reduced shift)
-    if grid_rows >= 3: row_shifts.append(random.uniform(0.04, 0.10))  # Third row shifts more (adjusted range)
-    if grid_rows >= 4: row_shifts.append(random.uniform(0.06, 0.14))  # Fourth row shifts even more (new row)
-    while len(row_shifts) < grid_rows: # Pad with 0s if more rows than default shifts
-        row_shifts.append(0)
-    row_shifts = row_shifts[:grid_rows] # Truncate if less rows than default shifts
-
-    # Randomize shift direction
-    if random.choice([True, False]):
-        for i in range(1, grid_rows): # Apply to all shift rows
-            row_shifts[i] *= -1
-
-    if strategy in strategy_functions: # Check if strategy is in our dictionary
-        palette_function = strategy_functions[strategy]
-        palette = palette_function(grid_rows, grid_cols, row_shifts, hue_shifts) # Call the corresponding function
+def set_reference_image(path):
+    """Load the image the from_image strategy extracts palettes from; returns False (after saying why) if it can't be read."""
+    global _reference_image
+    try:
+        pixels = image_palette.load_pixels(path)
+    except (OSError, ValueError) as e:
+        print(f"Error: could not read image '{path}': {e}")
+        return False
+    _reference_image = (path, pixels)
+    return True
+
+def from_image_rgb(grid_rows, grid_cols, rng):
+    """The reference image's dominant colors as a (grid_rows, grid_cols, 3) uint8 array, or None if no image is loaded."""
+    if _reference_image is None:
+        return None
+    return image_palette.extract_palette(_reference_image[1], grid_rows, grid_cols, rng.getrandbits(64))
+
+def from_image_palette(grid_rows, grid_cols, row_shifts, hue_shifts, rng):
+    """Generate palette from the dominant colors of the reference image (hue shifts are not applied)."""
+    rgb = from_image_rgb(grid_rows, grid_cols, rng)
+    if rgb is None:
+        print("Error: no reference image loaded for 'from_image' strategy.")
+        return create_empty_palette(grid_rows, grid_cols)
+    return palette_engine.rgb8_to_hex_grid(rgb)
+
+_strategy_functions = {} # name -> palette function, resolved through strategy_registry on first use
+
+def get_strategy_function(strategy):
+    """The palette function fn(grid_rows, grid_cols, row_shifts, hue_shifts, rng) -> hex grid of a strategy, or None if unknown.
+
+    The strategy's module is imported the first time it is asked for; HSV strategies run through palette_engine.
+    """
+    function = _strategy_functions.get(strategy)
+    if function is None:
+        spec = strategy_registry.get(strategy)
+        if spec is None:
+            return None
+        if spec.kind == "hsv":
+            builder = spec.load()
+            def function(grid_rows, grid_cols, row_shifts, hue_shifts, rng):
+                return _engine_palette(builder, grid_rows, grid_cols, row_shifts, hue_shifts, rng)
+        else:
+            function = spec.load()
+        # Time every strategy call on its own when PALETTE_PROFILE is set (no-op otherwise)
+        function = _strategy_functions.setdefault(strategy, instrumented(f"strategy.{strategy}")(function))
+    return function
+
+@instrumented("generate_random_palette")
+def generate_random_palette(grid_rows, grid_cols, strategy, hue_shifts, seed=None):
+    """Generate a palette based on the chosen strategy, from its own RNG stream (fresh random seed if none is given)."""
+    if seed is None:
+        seed = palette_engine.new_seed()
+    rng = random.Random(seed)
+
+    # Generate row hue shifts (each row has a slight hue shift, random direction)
+    row_shifts = palette_engine.draw_row_shifts(rng, grid_rows)
+
+    palette_function = get_strategy_function(strategy)
+    if palette_function is not None:
+        palette = palette_function(grid_rows, grid_cols, row_shifts, hue_shifts, rng) # Call the corresponding function
         return palette, strategy
     else:
         # Handle cases where the strategy is not found (e.g., manual_input - although manual_input is handled outside this function now)
         return None, strategy # Or raise an exception if that's more appropriate for your error handling
 
+@instrumented("generate_packed_palette")
+def generate_packed_palette(grid_rows, grid_cols, strategy, hue_shifts, seed=None):
+    """Generate a palette as packed RGB bytes (row-major, 3 bytes per cell) for the chosen strategy.
+
+    Returns (rgb_bytes, strategy, seed); the same seed always regenerates the same palette.
+    """
+    if seed is None:
+        seed = palette_engine.new_seed()
+
+    stack = generate_palette_batch(grid_rows, grid_cols, strategy, hue_shifts, [seed])
+    if stack is None:
+        return None, strategy, seed
+    return stack[0].tobytes(), strategy, seed
+
+@instrumented("generate_palette_batch")
+def generate_palette_batch(grid_rows, grid_cols, strategy, hue_shifts, seeds, with_hsv=False):
+    """Generate one palette per seed as a (len(seeds), grid_rows, grid_cols, 3) uint8 array.
+
+    with_hsv=True returns (stack, raw HSV) instead, for quality scoring; the HSV is None for fixed-color strategies.
+    """
+    if strategy == "mf_twister":
+        if not mf_twister_colors_loaded(grid_rows, grid_cols):
+            print("Error: 27 or 64 distinct RGB colors not loaded correctly for 'mf_twister' strategy.")
+            return (None, None) if with_hsv else None
+        # Fixed colors: every seed gets the same precompiled grid
+        stack = np.repeat(mf_twister_rgb(grid_rows, grid_cols)[None], len(seeds), axis=0)
+        return (stack, None) if with_hsv else stack
+    if strategy == "from_image":
+        if _reference_image is None:
+            return (None, None) if with_hsv else None
+        # Same rng stream as generate_random_palette, so a seed gives the same palette through either path
+        rngs = [random.Random(seed) for seed in seeds]
+        for rng in rngs:
+            palette_engine.draw_row_shifts(rng, grid_rows)
+        stack = np.stack([from_image_rgb(grid_rows, grid_cols, rng) for rng in rngs])
+        return (stack, None) if with_hsv else stack
+    # HSV builders behind each random strategy generate the whole stack in one array pass
+    builder = strategy_registry.hsv_builder(strategy)
+    if builder is None:
+        return (None, None) if with_hsv else None
+    hsv = palette_engine.generate_hsv_batch(builder, seeds, grid_rows, grid_cols, hue_shifts)
+    stack = palette_engine.hsv_to_rgb8(*hsv)
+    return (stack, hsv) if with_hsv else stack
+
+def palette_metadata(strategy, seed, grid_rows, grid_cols, hue_shifts=None, **extra):
+    """Text metadata stored in each palette PNG so it can be regenerated from its seed."""
+    metadata = {"Strategy": strategy, "Seed": str(seed), "Grid": f"{grid_cols}x{grid_rows}"}
+    if hue_shifts and any(hue_shifts):
+        metadata["Hue Shifts"] = ",".join(f"{shift * 360:g}" for shift in hue_shifts)
+    metadata.update({key: str(value) for key, value in extra.items()})
+    return metadata
+
+@instrumented("generate_unique_filename")
 def generate_unique_filename(strategy_name="pixel_palette", extension=".png"):
     """Generate a unique filename based on strategy and persistent counter (no timestamp)."""
-    # timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S") # <-- Comment out or remove timestamp line
-
-    strategy_safe_name = strategy_name.replace("_", "-").lower()
-    counter_file = f"{strategy_safe_name}_counter.txt"
-
     try:
-        if os.path.exists(counter_file):
-            with open(counter_file, "r") as f:
-                try:
-                    counter = int(f.read())
-                except ValueError:
-                    counter = 1
-        else:
-            counter = 1
-    except Exception as e:
-        print(f"Error reading counter file for strategy '{strategy_name}': {e}. Resetting counter to 1.")
-        counter = 1
-
-    counter_str = str(counter).zfill(3)
-    base_name = f"{strategy_safe_name}_palette_{counter_str}"
-
+        return filename_allocator.allocate_filenames(strategy_name, 1, extension)[0]
+    except sqlite3.Error as e:
+        print(f"Error allocating a filename for strategy '{strategy_name}': {e}. Falling back to a timestamped name.")
+        strategy_safe_name = strategy_name.replace("_", "-").lower()
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return f"{strategy_safe_name}_palette_{timestamp}{extension}"
+
+def find_saved_duplicate(rgb, grid_rows, grid_cols, folder):
+    """Name under which an identical palette is saved in `folder`, or None (index errors never block saving)."""
     try:
-        with open(counter_file, "w") as f:
-            f.write(str(counter + 1))
-    except Exception as e:
-        print(f"Error writing to counter file for strategy '{strategy_name}': {e}. Counter persistence may not work for this strategy.")
+        return palette_dedup.find_duplicate(rgb, grid_rows, grid_cols, folder)
+    except sqlite3.Error as e:
+        print(f"Warning: could not check the duplicate index: {e}")
+        return None
 
-    # return f"{base_name}_{timestamp}{extension}" # <-- Original line with timestamp
-    return f"{base_name}{extension}" # <-- Modified line: Timestamp removed
+def record_saved_palette(rgb, grid_rows, grid_cols, strategy, filename, folder):
+    """Add a palette whose file has been written to the duplicate index."""
+    try:
+        palette_dedup.record_palette(rgb, grid_rows, grid_cols, strategy, filename, folder)
+    except sqlite3.Error as e:
+        print(f"Warning: could not update the duplicate index: {e}")
 
+@instrumented("prompt.save_location")
 def get_save_location_choice():
     """Asks the user for the output folder choice."""
     while True:
@@ -464,12 +320,9 @@ def get_strategy_choice(grid_cols, grid_rows, hue_shifts):
     """Presents a menu of palette generation strategies to the user with color previews and vertical spacing, and random algorithm option."""
     strategies = get_strategies()
     random_strategies = get_random_strategies()
-    print("\nChoose a palette generation strategy:")
-    max_name_length = get_max_name_length(strategies)
-    indentation = max_name_length + 4 # 4 spaces padding after longest name
-
-    for number, strategy_name in strategies.items():
-        display_strategy(grid_cols, grid_rows, indentation, number, strategy_name, hue_shifts)
+    # Previews are rendered once per grid size and written in one go
+    sys.stdout.write("\nChoose a palette generation strategy:\n" + get_strategy_menu(grid_cols, grid_rows, hue_shifts))
+    sys.stdout.flush()
 
     while True:
         choice = input("Enter the number of your choice: ")
@@ -490,14 +343,55 @@ def get_strategy_choice(grid_cols, grid_rows, hue_shifts):
             print("Invalid choice. Please enter a number from the menu.")
 
 
-def display_strategy(grid_cols, grid_rows, indentation, number, strategy_name, hue_shifts):
+def render_strategy(grid_cols, grid_rows, indentation, number, strategy_name, hue_shifts):
+    """Render one menu entry (name plus color preview) as text."""
     strategy_out = strategy_name.replace('_', ' ').title()
     prefix = f"{number:>2}. {strategy_out}"
     name_padding = " " * max(0, indentation - len(strategy_out))
     if strategy_name != "manual_input":
-        display_generated_strategy(grid_cols, grid_rows, prefix, name_padding, number, strategy_out, strategy_name, hue_shifts)
+        return render_generated_strategy(grid_cols, grid_rows, prefix, name_padding, number, strategy_out, strategy_name, hue_shifts)
     else:
-        print(f"\n{number:>2}. {strategy_out}\n")
+        return f"\n{number:>2}. {strategy_out}\n\n"
+
+def render_strategy_menu(grid_cols, grid_rows, hue_shifts):
+    """Render the whole strategy menu with previews as a single string."""
+    strategies = get_strategies()
+    max_name_length = get_max_name_length(strategies)
+    indentation = max_name_length + 4 # 4 spaces padding after longest name
+    return "".join(render_strategy(grid_cols, grid_rows, indentation, number, strategy_name, hue_shifts)
+                   for number, strategy_name in strategies.items())
+
+_strategy_menu_cache = {} # (grid_cols, grid_rows, hue_shifts) -> Future or rendered menu text
+_strategy_menu_lock = threading.Lock()
+_preview_executor = None
+
+def _strategy_menu_key(grid_cols, grid_rows, hue_shifts):
+    return grid_cols, grid_rows, tuple(hue_shifts)
+
+def prefetch_strategy_menus(grid_sizes, hue_shifts=None):
+    """Start rendering the strategy menus for the given (grid_cols, grid_rows) sizes in a background thread."""
+    global _preview_executor
+    with _strategy_menu_lock:
+        if _preview_executor is None:
+            _preview_executor = concurrent_futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="palette-preview")
+        for grid_cols, grid_rows in grid_sizes:
+            shifts = hue_shifts if hue_shifts is not None else [0] * grid_rows
+            key = _strategy_menu_key(grid_cols, grid_rows, shifts)
+            if key not in _strategy_menu_cache:
+                _strategy_menu_cache[key] = _preview_executor.submit(render_strategy_menu, grid_cols, grid_rows, shifts)
+
+def get_strategy_menu(grid_cols, grid_rows, hue_shifts):
+    """Return the rendered strategy menu for a grid size, generating it only the first time."""
+    key = _strategy_menu_key(grid_cols, grid_rows, hue_shifts)
+    with _strategy_menu_lock:
+        menu = _strategy_menu_cache.get(key)
+    if menu is None:
+        menu = render_strategy_menu(grid_cols, grid_rows, hue_shifts)
+    elif isinstance(menu, concurrent_futures.Future):
+        menu = menu.result() # Wait for the background render if it is still running
+    with _strategy_menu_lock:
+        _strategy_menu_cache[key] = menu
+    return menu
 
 def get_max_name_length(strategies):
     max_name_length = 0
@@ -506,103 +400,80 @@ def get_max_name_length(strategies):
     return max_name_length
 
 def get_strategies():
-    strategies = {
-        "0": "manual_input",
-        "1": "distinct_hues",
-        "2": "split_complementary",
-        "3": "triadic_variations",
-        "4": "analogous_extended",
-        "5": "monochromatic_columns",
-        "6": "warm_cool_contrast",
-        "7": "pastel_dark_contrast",
-        "8": "random_with_harmony",
-        "9": "complementary",
-        "10": "shades_of_gray",
-        "11": "tetradic",
-        "12": "rainbow_desaturated_rows",
-        "13": "mf_twister"
-    }
-    return strategies
+    """Menu numbers -> strategy names ("0" is manual input), including plugin strategies."""
+    return strategy_registry.menu()
 
 def get_random_strategies() -> List[str]:
-    strategies = [
-        "distinct_hues",
-        "split_complementary",
-        "triadic_variations",
-        "analogous_extended",
-        "monochromatic_columns",
-        "warm_cool_contrast",
-        "pastel_dark_contrast",
-        "random_with_harmony",
-        "complementary",
-        "shades_of_gray",
-        "tetradic",
-        "rainbow_desaturated_rows",
-        "mf_twister"
-    ]
-    return strategies
-
-def display_generated_strategy(grid_cols, grid_rows, prefix, name_padding, number, strategy_out, strategy_name, hue_shifts):
-    palette, _ = generate_random_palette(grid_rows, grid_cols, strategy_name, hue_shifts)
+    """Strategies a random pick chooses from."""
+    return strategy_registry.random_names()
+
+def render_generated_strategy(grid_cols, grid_rows, prefix, name_padding, number, strategy_out, strategy_name, hue_shifts):
+    """Render a menu entry with a freshly generated preview palette next to its name."""
+    if strategy_name == "mf_twister" and not mf_twister_colors_loaded(grid_rows, grid_cols):
+        return f"{number:>2}. {strategy_out}\n" # Not enough colors for this grid; calling it would print an error mid-menu
+    palette, _, _ = generate_packed_palette(grid_rows, grid_cols, strategy_name, hue_shifts)
     if palette:
-        grid_lines = []
-
-        for row_index in range(grid_rows):
-            grid_lines.append(get_grid_row(palette, grid_lines, row_index, grid_cols))
+        grid_lines = [get_grid_row(palette, row_index, grid_cols, PREVIEW_MAX_COLS) for row_index in range(min(grid_rows, PREVIEW_MAX_ROWS))]
+        indent = " " * len(f"{prefix}{name_padding}")
+        lines = [f"{prefix}{name_padding}{grid_lines[0]}"] + [indent + line for line in grid_lines[1:]]
+        return "\n".join(lines) + "\n\n"
+    else:  # Fallback for palette generation failure
+        return f"{number:>2}. {strategy_out}\n"  # Plain text
 
-        print(f"{prefix}{name_padding}{grid_lines[0]}")
-        indent = len(f"{prefix}{name_padding}")
-        for i in range(1, grid_rows):
-            make_indent = " " * indent
-            print(make_indent + grid_lines[i])
+def get_grid_row(palette, row_index, grid_cols, max_cols=None):
+    """ANSI preview blocks for one row of a packed RGB palette (its first max_cols cells, if given)."""
+    shown_cols = grid_cols if max_cols is None else min(grid_cols, max_cols)
+    row = palette[row_index * grid_cols * 3:(row_index * grid_cols + shown_cols) * 3]
+    return "".join(f"\033[48;2;{row[i]};{row[i + 1]};{row[i + 2]}m  \033[0m" for i in range(0, len(row), 3))  # 2-char blocks
 
-        print("")
-    else:  # Fallback for palette generation failure
-        print(f"{number:>2}. {strategy_out}")  # Plain text
-
-def get_grid_row(palette, grid_lines, row_index, grid_cols):
-    grid_row_line = ""
-    for col_index in range(grid_cols):
-        hex_color = palette[row_index][col_index]
-        r = int(hex_color[1:3], 16)
-        g = int(hex_color[3:5], 16)
-        b = int(hex_color[5:7], 16)
-        preview_block_ansi = f"\033[48;2;{r};{g};{b}m  \033[0m"  # 2-char block
-        grid_row_line += preview_block_ansi
-    return grid_row_line
+def parse_grid_size(text):
+    """Parse a custom 'COLSxROWS' grid size such as '32x8'; returns (grid_cols, grid_rows) or None if invalid."""
+    try:
+        grid_cols, grid_rows = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        return None
+    if not (1 <= grid_cols <= MAX_GRID_SIZE and 1 <= grid_rows <= MAX_GRID_SIZE):
+        return None
+    return grid_cols, grid_rows
 
 def get_grid_size_choice():
     """Asks the user to choose the grid size."""
     while True:
-        grid_choice = input("Choose grid size: '1' for 16x4 or '2' for 9x3 (default: 1): ")
+        grid_choice = input(f"Choose grid size: '1' for 16x4, '2' for 9x3, or a custom COLSxROWS size up to {MAX_GRID_SIZE}x{MAX_GRID_SIZE} (default: 1): ").strip()
         if grid_choice in ['1', '']:
             return 16, 4 # 16x4 grid
         elif grid_choice == '2':
             return 9, 3 # 9x3 grid
-        else:
-            print("Invalid choice. Please enter '1' or '2'.")
-
-def create_palette_image(hex_codes, strategy, grid_rows, grid_cols):
-    """Create and save an image from the palette hex codes, with folder choice and strategy for filename."""
-    # Image dimensions
-    image_width = grid_cols
-    image_height = grid_rows
-
-    # Create the image
-    image = Image.new("RGB", (image_width, image_height))
-    pixels = image.load()
-
-    # Set pixel colors
-    for row_index, row_codes in enumerate(hex_codes):
-        for col_index, hex_code in enumerate(row_codes):
-            r = int(hex_code[1:3], 16)
-            g = int(hex_code[3:5], 16)
-            b = int(hex_code[5:7], 16)
-            pixels[col_index, row_index] = (r, g, b) # type: ignore
+        custom_size = parse_grid_size(grid_choice)
+        if custom_size:
+            return custom_size
+        print(f"Invalid choice. Please enter '1', '2' or a size like 32x8 (at most {MAX_GRID_SIZE}x{MAX_GRID_SIZE}).")
+
+@instrumented("save_palette_png")
+def save_palette_png(rgb, grid_rows, grid_cols, filepath, use_pil=False, metadata=None):
+    """Write packed RGB bytes as a grid_cols x grid_rows PNG (with optional text metadata), directly or through PIL."""
+    if use_pil:
+        from PIL import Image
+        from PIL.PngImagePlugin import PngInfo
+        png_info = PngInfo()
+        for key, value in (metadata or {}).items():
+            png_info.add_text(key, value)
+        Image.frombytes("RGB", (grid_cols, grid_rows), bytes(rgb)).save(filepath, pnginfo=png_info)
+    else:
+        png_writer.write_png(filepath, rgb, grid_cols, grid_rows, text=metadata)
 
-    # Generate unique filename (now with strategy name)
-    # filename = generate_unique_filename(strategy, grid_rows, grid_cols)
-    filename = generate_unique_filename(strategy)
+@instrumented("create_palette_image")
+def create_palette_image(palette, strategy, grid_rows, grid_cols, metadata=None, show_hex=True):
+    """Create and save an image from the palette (packed RGB bytes or hex codes), with folder choice and strategy for filename.
+
+    show_hex=False skips the hex/ANSI dump of the palette (bulk runs stream through palette_stream instead).
+    """
+    # Work on packed RGB; hex grids (manual input) are packed once
+    if isinstance(palette, (bytes, bytearray, memoryview)):
+        rgb = palette
+    else:
+        with instrumentation.stage("create_palette_image.pack_hex"):
+            rgb = palette_engine.pack_hex_grid(palette)
 
     # Get user's folder choice
     save_location = get_save_location_choice()
@@ -616,11 +487,22 @@ def create_palette_image(hex_codes, strategy, grid_rows, grid_cols):
     else: # save_location == "script_folder"
         output_folder = base_folder
 
-    os.makedirs(output_folder, exist_ok=True) # Ensure folder exists
+    if SKIP_DUPLICATE_PALETTES:
+        duplicate = find_saved_duplicate(rgb, grid_rows, grid_cols, output_folder)
+        if duplicate:
+            print(f"An identical palette is already saved in {output_folder} as {duplicate}; not saving it again.")
+            return duplicate
+
+    # Generate unique filename (now with strategy name)
+    filename = generate_unique_filename(strategy)
     filepath = os.path.join(output_folder, filename)
 
-    # Save the image
-    image.save(filepath)
+    # Save the image before reporting it saved; only palettes that made it to disk are recorded
+    with instrumentation.stage("create_palette_image.makedirs"):
+        os.makedirs(output_folder, exist_ok=True) # Ensure folder exists
+    save_palette_png(rgb, grid_rows, grid_cols, filepath, use_pil=True, metadata=metadata)
+    if SKIP_DUPLICATE_PALETTES:
+        record_saved_palette(rgb, grid_rows, grid_cols, strategy, filename, output_folder)
 
     if save_location == "bitwig_palettes":
         print(f"Pixel palette image saved to Bitwig Color Palettes folder as: {filepath}")
@@ -631,15 +513,18 @@ def create_palette_image(hex_codes, strategy, grid_rows, grid_cols):
 
 
     # Print the palette for reference with color preview
-    print("\nHex color codes in this palette:")
-    for row in hex_codes:
-        for hex_code in row:
-            r = int(hex_code[1:3], 16)
-            g = int(hex_code[3:5], 16)
-            b = int(hex_code[5:7], 16)
-            color_preview = f"\033[48;2;{r};{g};{b}m  \033[0m" # ANSI color block
-            print(f"{color_preview} {hex_code}", end=" ") # Print preview and hex code
-        print() # New line for each row
+    if not show_hex:
+        return filename
+    with instrumentation.stage("create_palette_image.console_dump"):
+        print("\nHex color codes in this palette:")
+        rgb = bytes(rgb)
+        for row in range(grid_rows):
+            for col in range(grid_cols):
+                offset = (row * grid_cols + col) * 3
+                r, g, b = rgb[offset:offset + 3]
+                color_preview = f"\033[48;2;{r};{g};{b}m  \033[0m" # ANSI color block
+                print(f"{color_preview} #{rgb[offset:offset + 3].hex().upper()}", end=" ") # Print preview and hex code
+            print() # New line for each row
 
 
     return filename
@@ -651,6 +536,10 @@ def main():
 
     generate_another = True
 
+    if PREFETCH_PREVIEWS:
+        # Render the strategy previews while the user is still answering the grid size prompt
+        prefetch_strategy_menus([(16, 4), (9, 3)])
+
     while generate_another:
         # Get grid size choice
         grid_cols, grid_rows = get_grid_size_choice()
@@ -660,13 +549,22 @@ def main():
         # Get strategy choice from menu
         strategy = get_strategy_choice(grid_cols, grid_rows, [0] * grid_rows)
 
+        if strategy == "from_image" and not get_reference_image_input():
+            continue
+
         # Get hue shifts after strategy is chosen
-        hue_shifts = get_hue_shifts_input(grid_rows)
+        hue_shifts = [0] * grid_rows if strategy == "from_image" else get_hue_shifts_input(grid_rows) # Image colors are used as they are
 
         if strategy != "manual_input": # If not manual input, generate random
-            # Generate random palette with the chosen strategy
-            hex_codes, strategy = generate_random_palette(grid_rows, grid_cols, strategy, hue_shifts)
-            print(f"Palette generated using strategy: {strategy.replace('_', ' ').title()}") # Nicer display
+            # Generate random palette with the chosen strategy, as packed RGB bytes
+            palette, strategy, seed = generate_packed_palette(grid_rows, grid_cols, strategy, hue_shifts)
+            if palette is None:
+                print("Palette could not be generated with this strategy. Please choose another one.")
+                continue
+            print(f"Palette generated using strategy: {strategy.replace('_', ' ').title()} (seed {seed})") # Nicer display
+            metadata = palette_metadata(strategy, seed, grid_rows, grid_cols, hue_shifts)
+            if strategy == "from_image":
+                metadata["Source Image"] = os.path.basename(_reference_image[0])
         else: # Manual input selected
             # Initialize empty hex_codes list with the same structure
             hex_codes = [
@@ -681,8 +579,11 @@ def main():
                 for col in range(grid_cols): # Updated loop range
                     hex_codes[row][col] = get_color_input(row, col)
 
+            palette = hex_codes
+            metadata = {"Strategy": strategy, "Grid": f"{grid_cols}x{grid_rows}"}
+
         # Create and save the palette image
-        create_palette_image(hex_codes, strategy, grid_rows, grid_cols)
+        create_palette_image(palette, strategy, grid_rows, grid_cols, metadata)
 
         # Ask if user wants to generate another palette
         while True:
@@ -700,4 +601,6 @@ def main():
     print("Thank you for using the Color Palette Generator!")
 
 if __name__ == "__main__":
+    # Strategies registered as "palettegenv2:..." must resolve to this module, not a second copy of it
+    sys.modules.setdefault("palettegenv2", sys.modules[__name__])
     main()
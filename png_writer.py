@@ -0,0 +1,57 @@
+"""Minimal PNG encoder for packed RGB palettes (no PIL objects involved).
+
+Palettes are tiny (a 16x4 grid is 192 bytes of pixel data), so building the file directly from the
+packed buffer with zlib and CRC chunk framing is much cheaper than creating a PIL image per palette.
+"""
+import struct
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _chunk(chunk_type, data):
+    """Frame one PNG chunk: length, type, data, CRC over type + data."""
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)))
+
+
+def _text_chunk(key, value):
+    """tEXt chunk for a Latin-1 value, else an uncompressed iTXt chunk with the value in UTF-8 (as PIL's PngInfo does)."""
+    keyword = f"{key}".encode("latin-1") # PNG keywords are Latin-1 only
+    try:
+        return _chunk(b"tEXt", keyword + b"\x00" + f"{value}".encode("latin-1"))
+    except UnicodeEncodeError:
+        # keyword, compression flag and method, empty language tag and translated keyword, text
+        return _chunk(b"iTXt", keyword + b"\x00\x00\x00" + b"\x00" + b"\x00" + f"{value}".encode("utf-8"))
+
+
+def encode_png(rgb, width, height, text=None, compress_level=6):
+    """Encode packed 8-bit RGB bytes (row-major, 3 bytes per pixel) as a PNG file in memory.
+
+    `text` is an optional dict written as text chunks: tEXt where the value fits Latin-1, iTXt (UTF-8) otherwise.
+    Keys must be Latin-1.
+    """
+    rgb = memoryview(rgb).cast("B")
+    stride = width * 3
+    if len(rgb) != stride * height:
+        raise ValueError(f"Expected {stride * height} bytes of RGB data for {width}x{height}, got {len(rgb)}")
+
+    # Every scanline starts with filter type 0 (None)
+    raw = bytearray((stride + 1) * height)
+    for row in range(height):
+        raw[row * (stride + 1) + 1:(row + 1) * (stride + 1)] = rgb[row * stride:(row + 1) * stride]
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0) # 8-bit depth, color type 2 (RGB)
+    chunks = [PNG_SIGNATURE, _chunk(b"IHDR", header)]
+    for key, value in (text or {}).items():
+        chunks.append(_text_chunk(key, value))
+    chunks.append(_chunk(b"IDAT", zlib.compress(bytes(raw), compress_level)))
+    chunks.append(_chunk(b"IEND", b""))
+    return b"".join(chunks)
+
+
+def write_png(filepath, rgb, width, height, text=None, compress_level=6):
+    """Encode packed RGB bytes as PNG and write them to `filepath` in one call."""
+    data = encode_png(rgb, width, height, text, compress_level)
+    with open(filepath, "wb") as f:
+        f.write(data)
+    return len(data)
@@ -0,0 +1,147 @@
+"""Registry of palette generation strategies, shared by palettegenv2 and the legacy generator script.
+
+Strategies are known by metadata only: a name, the "module:attribute" that implements it, its kind and
+whether random picks may choose it. Nothing is imported until a strategy is first used, so listing or
+menu-numbering a large collection stays cheap.
+
+Kinds:
+    hsv      an HSV builder, fn(rng, grid_rows, grid_cols, row_shifts, hue_shifts) -> (hue, saturation, value)
+             arrays, like the builders in palette_engine; these work everywhere, including batch generation
+    palette  fn(grid_rows, grid_cols, row_shifts, hue_shifts, rng) -> hex grid, for strategies palettegenv2
+             generates itself (fixed colors, reference images)
+
+Third-party packages add HSV strategies through the ENTRY_POINT_GROUP entry point group, e.g. in pyproject.toml:
+    [project.entry-points."bitwig_palette.strategies"]
+    sunset_bands = "my_palettes.sunset:sunset_bands_hsv"
+Plugin strategies are listed after the built-in ones, sorted by name, and take part in random picks.
+"""
+import importlib
+import threading
+
+ENTRY_POINT_GROUP = "bitwig_palette.strategies"
+
+# (name, "module:attribute", kind, random pick); the order is the menu order
+BUILTIN_STRATEGIES = [
+    ("distinct_hues", "palette_engine:distinct_hues_hsv", "hsv", True),
+    ("split_complementary", "palette_engine:split_complementary_hsv", "hsv", True),
+    ("triadic_variations", "palette_engine:triadic_variations_hsv", "hsv", True),
+    ("analogous_extended", "palette_engine:analogous_extended_hsv", "hsv", True),
+    ("monochromatic_columns", "palette_engine:monochromatic_columns_hsv", "hsv", True),
+    ("warm_cool_contrast", "palette_engine:warm_cool_contrast_hsv", "hsv", True),
+    ("pastel_dark_contrast", "palette_engine:pastel_dark_contrast_hsv", "hsv", True),
+    ("random_with_harmony", "palette_engine:random_with_harmony_hsv", "hsv", True),
+    ("complementary", "palette_engine:complementary_hsv", "hsv", True),
+    ("shades_of_gray", "palette_engine:shades_of_gray_hsv", "hsv", True),
+    ("tetradic", "palette_engine:tetradic_hsv", "hsv", True),
+    ("rainbow_desaturated_rows", "palette_engine:rainbow_desaturated_rows_hsv", "hsv", True),
+    ("mf_twister", "palettegenv2:mf_twister_palette", "palette", True),
+    ("from_image", "palettegenv2:from_image_palette", "palette", False), # Needs a reference image
+]
+STRATEGY_KINDS = ("hsv", "palette")
+
+
+class Strategy:
+    """Metadata of one strategy; `load()` imports its implementation on first call."""
+    __slots__ = ("name", "target", "kind", "random", "_function")
+
+    def __init__(self, name, target, kind="hsv", random=True):
+        self.name = name
+        self.target = target
+        self.kind = kind
+        self.random = random
+        self._function = None
+
+    def load(self):
+        function = self._function
+        if function is None:
+            module_name, _, attribute = self.target.partition(":")
+            function = importlib.import_module(module_name)
+            for part in attribute.split("."):
+                function = getattr(function, part)
+            self._function = function
+        return function
+
+    def __repr__(self):
+        return f"Strategy({self.name!r}, {self.target!r}, {self.kind!r}, random={self.random})"
+
+
+_strategies = None # name -> Strategy, discovered on first use
+_lock = threading.Lock()
+
+
+def _plugin_entry_points():
+    """Entry points in ENTRY_POINT_GROUP (metadata only; nothing is imported)."""
+    from importlib import metadata
+    try:
+        return list(metadata.entry_points(group=ENTRY_POINT_GROUP))
+    except TypeError: # Python < 3.10: entry_points() returns a dict of groups
+        return list(metadata.entry_points().get(ENTRY_POINT_GROUP, []))
+
+
+def discover():
+    """Build the registry from the built-in table plus installed plugins."""
+    strategies = {name: Strategy(name, target, kind, random) for name, target, kind, random in BUILTIN_STRATEGIES}
+    plugins = {}
+    for entry_point in _plugin_entry_points():
+        if entry_point.name in strategies or entry_point.name == "manual_input":
+            print(f"Warning: ignoring plugin strategy '{entry_point.name}' ({entry_point.value}); the name is already taken.")
+            continue
+        plugins[entry_point.name] = Strategy(entry_point.name, entry_point.value)
+    for name in sorted(plugins):
+        strategies[name] = plugins[name]
+    return strategies
+
+
+def strategies():
+    """Every known strategy as {name: Strategy}, in menu order."""
+    global _strategies
+    if _strategies is None:
+        with _lock:
+            if _strategies is None:
+                _strategies = discover()
+    return _strategies
+
+
+def register(name, target, kind="hsv", random=True):
+    """Add (or replace) a strategy at run time; `target` is a "module:attribute" string or the function itself."""
+    global _strategies
+    if kind not in STRATEGY_KINDS:
+        raise ValueError(f"Unknown strategy kind '{kind}'; expected one of {', '.join(STRATEGY_KINDS)}.")
+    strategy = Strategy(name, target if isinstance(target, str) else f"{target.__module__}:{target.__qualname__}", kind, random)
+    if not isinstance(target, str):
+        strategy._function = target
+    with _lock:
+        registry = dict(_strategies if _strategies is not None else discover())
+        registry[name] = strategy
+        _strategies = registry # Swapped whole, so readers never see a half-updated dict
+    return strategy
+
+
+def get(name):
+    """The Strategy called `name`, or None."""
+    return strategies().get(name)
+
+
+def names():
+    return list(strategies())
+
+
+def random_names(kind=None):
+    """Names random picks choose from (only strategies of `kind`, if given)."""
+    return [name for name, strategy in strategies().items() if strategy.random and (kind is None or strategy.kind == kind)]
+
+
+def menu():
+    """Menu numbers -> strategy names; "0" is manual input, generated strategies follow in registry order."""
+    entries = {"0": "manual_input"}
+    for number, name in enumerate(strategies(), start=1):
+        entries[str(number)] = name
+    return entries
+
+
+def hsv_builder(name):
+    """The HSV builder behind strategy `name` (imported on first use), or None if it is not an HSV strategy."""
+    strategy = strategies().get(name)
+    if strategy is None or strategy.kind != "hsv":
+        return None
+    return strategy.load()
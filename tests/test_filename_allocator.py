@@ -0,0 +1,50 @@
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import filename_allocator
+
+
+def _allocate_many(db_path, rounds, block):
+    names = []
+    for _ in range(rounds):
+        names += filename_allocator.allocate_filenames("tetradic", block, db_path=db_path)
+    return names
+
+
+def test_names_are_unique_across_processes(tmp_path):
+    db_path = str(tmp_path / "counters.sqlite3")
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(_allocate_many, [db_path] * 8, [25] * 8, [3] * 8))
+    names = [name for result in results for name in result]
+    assert len(names) == 8 * 25 * 3
+    assert len(set(names)) == len(names)
+    assert filename_allocator.allocate_counters("tetradic", 1, db_path) == len(names) + 1
+
+
+def test_blocks_are_consecutive(tmp_path):
+    db_path = str(tmp_path / "counters.sqlite3")
+    assert filename_allocator.allocate_filenames("split_complementary", 2, db_path=db_path) == [
+        "split-complementary_palette_001.png", "split-complementary_palette_002.png"]
+    assert filename_allocator.allocate_filenames("split_complementary", 1, db_path=db_path) == ["split-complementary_palette_003.png"]
+
+
+def test_legacy_counter_is_migrated_then_removed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "tetradic_counter.txt").write_text("42")
+    assert filename_allocator.allocate_counters("tetradic", 2, "counters.sqlite3") == 42
+    assert not (tmp_path / "tetradic_counter.txt").exists()
+    assert filename_allocator.allocate_counters("tetradic", 1, "counters.sqlite3") == 44
+
+
+def test_legacy_counter_survives_a_failed_migration(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "tetradic_counter.txt").write_text("42")
+    connection = filename_allocator._connect("counters.sqlite3")
+    connection.execute("CREATE TRIGGER refuse BEFORE INSERT ON counters BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+    with pytest.raises(sqlite3.IntegrityError):
+        filename_allocator.allocate_counters("tetradic", 1, "counters.sqlite3")
+    assert (tmp_path / "tetradic_counter.txt").read_text() == "42"
+    connection.execute("DROP TRIGGER refuse")
+    assert filename_allocator.allocate_counters("tetradic", 1, "counters.sqlite3") == 42
@@ -0,0 +1,100 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import palette_archive
+
+GRID_ROWS, GRID_COLS = 4, 16
+
+
+def _palettes(count, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (count, GRID_ROWS, GRID_COLS, 3), dtype=np.uint8)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "palettes.bwpal")
+    stack = _palettes(5)
+    with palette_archive.ArchiveWriter(path, GRID_COLS, GRID_ROWS) as writer:
+        writer.append_batch(stack[:4], "tetradic", [10, 11, 12, 13], [f"tetradic_palette_{i}" for i in range(4)])
+        writer.append(stack[4].tobytes(), "complementary", 99, "complementary_palette_1")
+
+    archive = palette_archive.PaletteArchive(path)
+    assert len(archive) == 5
+    assert (archive.grid_cols, archive.grid_rows) == (GRID_COLS, GRID_ROWS)
+    assert np.array_equal(archive.records["rgb"], stack)
+    assert [archive.seed(i) for i in range(5)] == [10, 11, 12, 13, 99]
+    assert archive.strategy(4) == "complementary"
+    assert archive.name(2) == "tetradic_palette_2"
+    assert list(archive.select(strategy="tetradic", limit=2)) == [0, 1]
+
+
+def test_reopen_appends(tmp_path):
+    path = str(tmp_path / "palettes.bwpal")
+    stack = _palettes(3)
+    with palette_archive.ArchiveWriter(path, GRID_COLS, GRID_ROWS) as writer:
+        writer.append_batch(stack[:2], "tetradic", [1, 2], ["a", "b"])
+    with palette_archive.ArchiveWriter(path, GRID_COLS, GRID_ROWS) as writer:
+        writer.append_batch(stack[2:], "tetradic", [3], ["c"])
+    archive = palette_archive.PaletteArchive(path)
+    assert [archive.name(i) for i in range(3)] == ["a", "b", "c"]
+    assert np.array_equal(archive.records["rgb"], stack)
+
+
+def test_interrupted_writer_keeps_committed_records(tmp_path):
+    path = str(tmp_path / "palettes.bwpal")
+    stack = _palettes(4)
+    with palette_archive.ArchiveWriter(path, GRID_COLS, GRID_ROWS) as writer:
+        writer.append_batch(stack[:2], "tetradic", [1, 2], ["a", "b"])
+
+    # A second writer appends records and dies before close() commits the header count
+    script = ("import os, sys, numpy as np, palette_archive\n"
+              f"writer = palette_archive.ArchiveWriter({path!r}, {GRID_COLS}, {GRID_ROWS})\n"
+              f"writer.append_batch(np.zeros((3, {GRID_ROWS}, {GRID_COLS}, 3), np.uint8), 'tetradic', [7, 8, 9], ['x', 'y', 'z'])\n"
+              "writer._file.flush()\n"
+              "os._exit(1)\n")
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert subprocess.run([sys.executable, "-c", script], cwd=repo_root).returncode == 1
+    assert os.path.getsize(path) > palette_archive._HEADER.size + 2 * palette_archive.record_dtype(GRID_ROWS, GRID_COLS).itemsize
+
+    archive = palette_archive.PaletteArchive(path)
+    assert [archive.name(i) for i in range(len(archive))] == ["a", "b"]
+    del archive
+
+    # Reopening drops the uncommitted tail, so new records follow the committed ones
+    with palette_archive.ArchiveWriter(path, GRID_COLS, GRID_ROWS) as writer:
+        writer.append_batch(stack[2:3], "tetradic", [3], ["c"])
+    archive = palette_archive.PaletteArchive(path)
+    assert [archive.name(i) for i in range(len(archive))] == ["a", "b", "c"]
+    assert np.array_equal(archive.records["rgb"], stack[:3])
+    assert os.path.getsize(path) == palette_archive._HEADER.size + 3 * archive.dtype.itemsize
+
+
+def test_truncated_archive_is_rejected_not_extended(tmp_path):
+    path = str(tmp_path / "palettes.bwpal")
+    with palette_archive.ArchiveWriter(path, GRID_COLS, GRID_ROWS) as writer:
+        writer.append_batch(_palettes(3), "tetradic", [1, 2, 3], ["a", "b", "c"])
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f: # A copy cut off partway through the last record
+        f.truncate(size - 10)
+    with pytest.raises(palette_archive.ArchiveError):
+        palette_archive.ArchiveWriter(path, GRID_COLS, GRID_ROWS)
+    with pytest.raises(palette_archive.ArchiveError):
+        palette_archive.PaletteArchive(path)
+    assert os.path.getsize(path) == size - 10
+
+
+def test_grid_mismatch_is_rejected(tmp_path):
+    path = str(tmp_path / "palettes.bwpal")
+    palette_archive.ArchiveWriter(path, GRID_COLS, GRID_ROWS).close()
+    with pytest.raises(palette_archive.ArchiveError):
+        palette_archive.ArchiveWriter(path, 9, 3)
+
+
+def test_non_archive_is_rejected(tmp_path):
+    path = tmp_path / "not_an_archive.bwpal"
+    path.write_bytes(b"PNG? no." * 4)
+    with pytest.raises(palette_archive.ArchiveError):
+        palette_archive.PaletteArchive(str(path))
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+
+import bulk_generate
+import palette_archive
+import palette_dedup
+
+
+def _stack(*values):
+    return np.stack([np.full((4, 16, 3), value, dtype=np.uint8) for value in values])
+
+
+def test_claims_skip_duplicates_in_batch_and_index(tmp_path):
+    db_path = str(tmp_path / "hashes.sqlite3")
+    folder = tmp_path / "out"
+    folder.mkdir()
+    assert palette_dedup.claim_palettes(_stack(10, 20, 10), "tetradic", ["a.png", "b.png", "c.png"], str(folder), db_path=db_path) == [True, True, False]
+    for name in ("a.png", "b.png"):
+        (folder / name).write_bytes(b"")
+    assert palette_dedup.claim_palettes(_stack(20, 30), "tetradic", ["d.png", "e.png"], str(folder), db_path=db_path) == [False, True]
+
+
+def test_claims_are_scoped_to_the_folder(tmp_path):
+    db_path = str(tmp_path / "hashes.sqlite3")
+    assert palette_dedup.claim_palettes(_stack(10), "tetradic", ["a.png"], str(tmp_path / "one"), db_path=db_path) == [True]
+    assert palette_dedup.claim_palettes(_stack(10), "tetradic", ["a.png"], str(tmp_path / "two"), db_path=db_path) == [True]
+
+
+def test_missing_file_lapses_after_the_grace_period(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "hashes.sqlite3")
+    folder = str(tmp_path)
+    assert palette_dedup.claim_palettes(_stack(10), "tetradic", ["a.png"], folder, db_path=db_path) == [True]
+    # Still being written: the claim holds even though the file isn't there yet
+    assert palette_dedup.claim_palettes(_stack(10), "tetradic", ["b.png"], folder, db_path=db_path) == [False]
+    monkeypatch.setattr(palette_dedup, "CLAIM_GRACE_SECONDS", 0)
+    assert palette_dedup.claim_palettes(_stack(10), "tetradic", ["b.png"], folder, db_path=db_path) == [True]
+
+
+def test_recorded_palette_is_found_until_its_file_is_deleted(tmp_path):
+    db_path = str(tmp_path / "hashes.sqlite3")
+    rgb = _stack(40)[0].tobytes()
+    (tmp_path / "saved.png").write_bytes(b"")
+    palette_dedup.record_palette(rgb, 4, 16, "tetradic", "saved.png", str(tmp_path), db_path=db_path)
+    assert palette_dedup.find_duplicate(rgb, 4, 16, str(tmp_path), db_path=db_path) == "saved.png"
+    (tmp_path / "saved.png").unlink()
+    assert palette_dedup.find_duplicate(rgb, 4, 16, str(tmp_path), db_path=db_path) is None
+
+
+def test_archive_claims_hold_only_for_names_in_the_archive(tmp_path):
+    db_path = str(tmp_path / "hashes.sqlite3")
+    archive = str(tmp_path / "palettes.bwpal")
+    assert palette_dedup.claim_palettes(_stack(10, 10), "tetradic", ["a", "b"], archive, live_names=set(), db_path=db_path) == [True, False]
+    assert palette_dedup.claim_palettes(_stack(10), "tetradic", ["c"], archive, live_names={"a"}, db_path=db_path) == [False]
+    # "a" never made it into the archive (interrupted writer, deleted archive): the claim lapses
+    assert palette_dedup.claim_palettes(_stack(10), "tetradic", ["c"], archive, live_names=set(), db_path=db_path) == [True]
+
+
+def test_deleted_archive_is_regenerated_in_full(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # The index and filename counters live in the CWD
+    archive = str(tmp_path / "palettes.bwpal")
+    run = lambda: bulk_generate.run_archive_batch(6, ["rainbow_desaturated_rows"], (16, 4), archive, workers=1, master_seed=1)[0]
+    assert run() == 1 # A deterministic strategy: every copy after the first is a duplicate
+    assert run() == 0
+    os.remove(archive)
+    assert run() == 1
+    assert len(palette_archive.PaletteArchive(archive)) == 1
+
+
+def test_near_mode_matches_same_buckets_only(tmp_path):
+    db_path = str(tmp_path / "hashes.sqlite3")
+    folder = tmp_path
+    base = _stack(100)
+    nudged = base.copy()
+    nudged[0, 0, 0, 0] += 1 # Imperceptible change that stays inside its OKLab bucket
+    assert palette_dedup.perceptual_signatures(base) == palette_dedup.perceptual_signatures(nudged)
+    (folder / "a.png").write_bytes(b"")
+    assert palette_dedup.claim_palettes(base, "tetradic", ["a.png"], str(folder), near=True, db_path=db_path) == [True]
+    assert palette_dedup.claim_palettes(nudged, "tetradic", ["b.png"], str(folder), near=True, db_path=db_path) == [False]
+    assert palette_dedup.claim_palettes(nudged, "tetradic", ["b.png"], str(folder), near=False, db_path=db_path) == [True]
@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+import pytest
+
+import palette_archive
+import palette_sync
+import palettegenv2
+
+GRID_ROWS, GRID_COLS = 4, 16
+
+
+def _write_archive(path, count, seed=0, prefix="tetradic_palette_"):
+    stack = np.random.default_rng(seed).integers(0, 256, (count, GRID_ROWS, GRID_COLS, 3), dtype=np.uint8)
+    with palette_archive.ArchiveWriter(str(path), GRID_COLS, GRID_ROWS) as writer:
+        writer.append_batch(stack, "tetradic", list(range(count)), [f"{prefix}{i:03d}" for i in range(count)])
+    return str(path)
+
+
+def _write_png(path, value):
+    palettegenv2.save_palette_png(bytes([value]) * (GRID_ROWS * GRID_COLS * 3), GRID_ROWS, GRID_COLS, str(path))
+
+
+@pytest.fixture
+def library(tmp_path):
+    pngs = tmp_path / "pngs"
+    pngs.mkdir()
+    for i in range(3):
+        _write_png(pngs / f"own_{i}.png", 40 * i)
+    return [_write_archive(tmp_path / "palettes.bwpal", 10), str(pngs)], str(tmp_path / "target")
+
+
+def test_second_sync_writes_nothing(library):
+    sources, target = library
+    assert palette_sync.sync(sources, target)["written"] == 13
+    result = palette_sync.sync(sources, target)
+    assert (result["written"], result["unchanged"]) == (0, 13)
+    assert len(palette_sync.scan_pngs(target)) == 13
+
+
+def test_only_changed_palettes_are_rewritten(library):
+    sources, target = library
+    palette_sync.sync(sources, target)
+    _write_png(os.path.join(sources[1], "own_1.png"), 200)
+    os.remove(os.path.join(target, "tetradic_palette_004.png"))
+    result = palette_sync.sync(sources, target)
+    assert (result["written"], result["unchanged"]) == (2, 11)
+    with open(os.path.join(target, "own_1.png"), "rb") as synced, open(os.path.join(sources[1], "own_1.png"), "rb") as source:
+        assert synced.read() == source.read()
+
+
+def test_missing_source_is_an_error_and_prunes_nothing(library):
+    sources, target = library
+    palette_sync.sync(sources, target)
+    with pytest.raises(palette_sync.SyncError):
+        palette_sync.sync([sources[0] + "l"], target, prune=True)
+    assert len(palette_sync.scan_pngs(target)) == 13
+
+
+def test_unsupported_source_is_an_error(tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("not a palette")
+    with pytest.raises(palette_sync.SyncError):
+        palette_sync.sync([str(notes)], str(tmp_path / "target"))
+
+
+def test_prune_refuses_empty_library_without_force(library, tmp_path):
+    sources, target = library
+    palette_sync.sync(sources, target)
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    with pytest.raises(palette_sync.SyncError):
+        palette_sync.sync([str(empty)], target, prune=True)
+    assert len(palette_sync.scan_pngs(target)) == 13
+    assert palette_sync.sync([str(empty)], target, prune=True, force=True)["removed"] == 13
+    assert palette_sync.scan_pngs(target) == {}
+
+
+def test_prune_refuses_to_remove_most_of_the_library_without_force(library):
+    sources, target = library
+    palette_sync.sync(sources, target)
+    with pytest.raises(palette_sync.SyncError):
+        palette_sync.sync([sources[1]], target, prune=True) # Would remove the 10 archive palettes out of 13
+    assert len(palette_sync.scan_pngs(target)) == 13
+
+
+def test_orphans_are_kept_until_pruned(library, tmp_path):
+    sources, target = library
+    palette_sync.sync(sources, target)
+    smaller = _write_archive(tmp_path / "smaller.bwpal", 9)
+    result = palette_sync.sync([smaller, sources[1]], target)
+    assert result["orphans"] == 1
+    assert os.path.exists(os.path.join(target, "tetradic_palette_009.png"))
+    result = palette_sync.sync([smaller, sources[1]], target, prune=True)
+    assert result["removed"] == 1
+    assert not os.path.exists(os.path.join(target, "tetradic_palette_009.png"))
+
+
+def test_files_the_sync_did_not_write_are_never_touched(library):
+    sources, target = library
+    os.makedirs(target)
+    foreign = os.path.join(target, "tetradic_palette_002.png")
+    hand_made = os.path.join(target, "hand_made.png")
+    _write_png(foreign, 7)
+    _write_png(hand_made, 9)
+    with open(foreign, "rb") as f:
+        original = f.read()
+
+    result = palette_sync.sync(sources, target)
+    assert result["conflicts"] == ["tetradic_palette_002.png"]
+    assert result["written"] == 12
+    with open(foreign, "rb") as f:
+        assert f.read() == original
+
+    palette_sync.sync([sources[1]], target, prune=True, force=True)
+    assert os.path.exists(foreign) and os.path.exists(hand_made)
@@ -0,0 +1,149 @@
+"""Snap palette colors to the MIDI Fighter Twister's real LED colors through a precomputed 3D lookup table.
+
+The Twister shows one of 128 colors, selected by the CC value sent to it (the table in
+extract_mf_twister_colors.scala_code). The LUT holds, for every RGB bin, the index of the perceptually
+nearest LED color, so mapping a palette is one array lookup per cell instead of 128 distance computations.
+
+    python twister_lut.py build --bits 8                  # 256^3 table (16 MB), exact for every RGB color
+    python twister_lut.py map palette.png [more.png ...]  # print the LED index (CC value) of every cell
+
+The table is built once, saved as a .npy file in the CWD and memory-mapped afterwards. Its file name
+carries the bit depth, the distance space and a digest of the LED colors, so editing the table or the
+space simply builds a new file.
+"""
+import argparse
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+import color_spaces
+import extract_mf_twister_colors
+
+LUT_BITS = 6 # Bits per channel: 6 -> 64^3 entries (256 KB), 8 -> every RGB color (16 MB)
+LUT_VERSION = 1
+BUILD_CHUNK = 1 << 20 # RGB bins converted and matched per step
+
+_lut_memo = {} # (bits, space, directory) -> memory-mapped LUT
+
+
+def led_colors():
+    """The 128 Twister LED colors as a (128, 3) uint8 array, in CC value order."""
+    return np.asarray(extract_mf_twister_colors.get_scala_colors_rgb(), dtype=np.uint8)
+
+
+def bin_centers(bits):
+    """The RGB color at the middle of each of the (2^bits)^3 bins, as an (n, 3) float array in LUT order."""
+    shift = 8 - bits
+    levels = (np.arange(1 << bits) << shift) + ((1 << shift) - 1) / 2
+    red, green, blue = np.meshgrid(levels, levels, levels, indexing="ij")
+    return np.stack([red.ravel(), green.ravel(), blue.ravel()], axis=1)
+
+
+def build_lut(colors, bits=LUT_BITS, space=extract_mf_twister_colors.DISTANCE_SPACE):
+    """Index of the nearest of `colors` for every RGB bin, as a (2^bits, 2^bits, 2^bits) uint8 array."""
+    targets = color_spaces.convert_colors(colors, space)
+    centers = bin_centers(bits)
+    lut = np.empty(len(centers), dtype=np.uint8)
+    for start in range(0, len(centers), BUILD_CHUNK):
+        points = color_spaces.convert_colors(centers[start:start + BUILD_CHUNK], space).astype(np.float32)
+        best = np.full(len(points), np.inf, dtype=np.float32)
+        for index, target in enumerate(targets):
+            distances = color_spaces.squared_distances_to(points, target, space)
+            closer = distances < best # Ties keep the lower index
+            best[closer] = distances[closer]
+            lut[start:start + BUILD_CHUNK][closer] = index
+    return lut.reshape((1 << bits,) * 3)
+
+
+def lut_path(colors, bits=LUT_BITS, space=extract_mf_twister_colors.DISTANCE_SPACE, directory="."):
+    """File the LUT for these colors, bit depth and space is stored in."""
+    digest = hashlib.blake2b(np.asarray(colors, dtype=np.uint8).tobytes() + f"{space}:{LUT_VERSION}".encode(), digest_size=6).hexdigest()
+    return os.path.join(directory, f"twister_led_lut_{bits}bit_{space}_{digest}.npy")
+
+
+def load_lut(bits=LUT_BITS, space=extract_mf_twister_colors.DISTANCE_SPACE, directory="."):
+    """The LUT for the Twister LED colors, memory-mapped read-only; built and saved on first use."""
+    key = (bits, space, os.path.abspath(directory))
+    lut = _lut_memo.get(key)
+    if lut is not None:
+        return lut
+    colors = led_colors()
+    path = lut_path(colors, bits, space, directory)
+    try:
+        lut = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        lut = None
+    if lut is None or lut.shape != (1 << bits,) * 3 or lut.dtype != np.uint8:
+        lut = build_lut(colors, bits, space)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                np.save(f, lut)
+            os.replace(temp_path, path)
+            lut = np.load(path, mmap_mode="r")
+        except OSError: # Read-only folder: keep the table in memory for this run
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+    _lut_memo[key] = lut
+    return lut
+
+
+def led_indices(rgb, lut=None):
+    """LED index (the CC value to send) for every color of a (..., 3) uint8 array -> (...) uint8 array."""
+    lut = load_lut() if lut is None else lut
+    rgb = np.asarray(rgb, dtype=np.uint8)
+    shift = 8 - (len(lut).bit_length() - 1)
+    return lut[rgb[..., 0] >> shift, rgb[..., 1] >> shift, rgb[..., 2] >> shift]
+
+
+def snap_to_leds(rgb, lut=None):
+    """Replace every color of a (..., 3) uint8 array with the Twister LED color it maps to."""
+    return led_colors()[led_indices(rgb, lut)]
+
+
+def read_png_grid(path):
+    """Pixels of a palette PNG as a (rows, cols, 3) uint8 array."""
+    from PIL import Image
+    with Image.open(path) as image:
+        return np.asarray(image.convert("RGB"), dtype=np.uint8)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Map palette colors to MIDI Fighter Twister LED colors.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build (or rebuild) the lookup table file.")
+    build.add_argument("--bits", type=int, default=LUT_BITS, choices=range(4, 9), help=f"Bits per channel (default: {LUT_BITS}).")
+    mapping = subparsers.add_parser("map", help="Print the LED index of every cell of palette PNGs.")
+    mapping.add_argument("pngs", nargs="+")
+    mapping.add_argument("--bits", type=int, default=LUT_BITS, choices=range(4, 9), help=f"Bits per channel (default: {LUT_BITS}).")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        path = lut_path(led_colors(), args.bits)
+        if os.path.exists(path):
+            os.remove(path)
+        lut = load_lut(args.bits)
+        print(f"Built {path} ({lut.size:,} entries).")
+        return 0
+
+    lut = load_lut(args.bits)
+    status = 0
+    for path in args.pngs:
+        try:
+            grid = read_png_grid(path)
+        except OSError as e:
+            print(f"Error: could not read {path}: {e}")
+            status = 1
+            continue
+        print(f"{path}:")
+        for row in led_indices(grid, lut):
+            print("  " + " ".join(f"{index:3d}" for index in row))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
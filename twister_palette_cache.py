@@ -0,0 +1,107 @@
+"""Precompiled MIDI Fighter Twister colors for the 'mf_twister' strategy.
+
+The colors in mf_twister_colors.json never change between calls, so they are validated and converted
+to their final packed RGB form (the same HSV round-trip the strategy always applied) once. The result
+is persisted next to the JSON file as `<name>.packed`, keyed by the JSON file's mtime, size and SHA-256,
+so later runs only need a stat() to reuse it.
+"""
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+import palette_engine
+
+CACHE_MAGIC = b"MFTC"
+CACHE_VERSION = 1
+_HEADER = struct.Struct(">4sBQQ32sH") # magic, version, mtime_ns, size, sha256, color count
+VALID_COLOR_COUNTS = (27, 64)
+
+_packed_memo = {} # abspath -> (mtime_ns, size, packed bytes)
+_grid_memo = {} # (packed bytes, grid_rows, grid_cols) -> read-only (grid_rows, grid_cols, 3) uint8 array
+
+
+def cache_path_for(json_path):
+    """Path of the compiled cache that lives next to the JSON file."""
+    return os.path.splitext(json_path)[0] + ".packed"
+
+
+def compile_colors(colors_rgb):
+    """Validate 0-255 RGB triples and convert them to the packed bytes the strategy outputs."""
+    if len(colors_rgb) not in VALID_COLOR_COUNTS:
+        raise ValueError(f"Expected 27 or 64 colors, found {len(colors_rgb)}.")
+    for color in colors_rgb:
+        if len(color) != 3 or not all(isinstance(channel, int) and 0 <= channel <= 255 for channel in color):
+            raise ValueError(f"Invalid RGB color {color!r}; expected three integers from 0 to 255.")
+    rgb = np.asarray(colors_rgb, dtype=float) / 255.0
+    hsv = palette_engine.rgb_to_hsv(rgb[:, 0], rgb[:, 1], rgb[:, 2])
+    return palette_engine.hsv_to_rgb8(*hsv).tobytes()
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+        magic, version, mtime_ns, size, digest, count = _HEADER.unpack_from(data)
+    except (OSError, struct.error):
+        return None
+    if magic != CACHE_MAGIC or version != CACHE_VERSION or len(data) != _HEADER.size + count * 3:
+        return None
+    return mtime_ns, size, digest, data[_HEADER.size:]
+
+
+def _write_cache(cache_path, mtime_ns, size, digest, packed):
+    """Persist the compiled colors atomically; failures (e.g. read-only folder) only cost a recompile next time."""
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, mtime_ns, size, digest, len(packed) // 3) + packed)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def load_packed_colors(json_path):
+    """Return the compiled colors for `json_path` as packed RGB bytes (3 bytes per color).
+
+    Raises FileNotFoundError, json.JSONDecodeError or ValueError like loading the JSON directly would.
+    """
+    stat = os.stat(json_path)
+    key = os.path.abspath(json_path)
+    memo = _packed_memo.get(key)
+    if memo and memo[:2] == (stat.st_mtime_ns, stat.st_size):
+        return memo[2]
+
+    cache_path = cache_path_for(json_path)
+    cached = _read_cache(cache_path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        packed = cached[3] # Unchanged file: trust the stat key
+    else:
+        with open(json_path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).digest()
+        if cached and cached[2] == digest:
+            packed = cached[3] # Touched but identical content: just refresh the key
+        else:
+            packed = compile_colors([tuple(color) for color in json.loads(raw)])
+        _write_cache(cache_path, stat.st_mtime_ns, stat.st_size, digest, packed)
+
+    _packed_memo[key] = (stat.st_mtime_ns, stat.st_size, packed)
+    return packed
+
+
+def layout_grid(packed, grid_rows, grid_cols):
+    """Lay the packed colors out column by column as a read-only (grid_rows, grid_cols, 3) uint8 array."""
+    key = (packed, grid_rows, grid_cols)
+    grid = _grid_memo.get(key)
+    if grid is None:
+        colors = np.frombuffer(packed, dtype=np.uint8).reshape(-1, 3)[:grid_rows * grid_cols]
+        grid = np.ascontiguousarray(colors.reshape(grid_cols, grid_rows, 3).transpose(1, 0, 2))
+        grid.flags.writeable = False
+        _grid_memo[key] = grid
+    return grid